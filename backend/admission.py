@@ -0,0 +1,266 @@
+"""Per-route admission control and request deadlines.
+
+Each gated route runs at most ``limit`` requests at once in a worker process. Up to ``queue``
+more wait for a slot, until their deadline or ``max_wait`` passes. Anything beyond that is
+shed at once with 429, and a request that waited too long is shed with 503. Either way it is
+answered in microseconds instead of holding a thread. A slow route saturating its gate
+therefore cannot starve the cheap ones.
+
+The deadline of the request being handled is kept per thread. ``check_deadline()`` and the
+micro-batcher drop work whose deadline has passed before it reaches a model.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import Histogram
+
+QUEUE_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_local = threading.local()
+
+
+class Overloaded(Exception):
+    """Request shed without doing its work; ``status`` is 429 or 503, ``retry_after`` in seconds."""
+
+    def __init__(self, message, status=503, retry_after=1, reason='overloaded'):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class DeadlineExceeded(Overloaded):
+    def __init__(self, message='Request deadline exceeded', retry_after=1):
+        super().__init__(message, 503, retry_after, 'deadline')
+
+
+def current_deadline():
+    """Monotonic deadline of the request on this thread, or None."""
+    return getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Makes ``deadline`` the current one on this thread for the block, e.g. while a streamed body is generated."""
+    previous = current_deadline()
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def check_deadline():
+    current = current_deadline()
+    if current is not None and time.monotonic() >= current:
+        raise DeadlineExceeded()
+
+
+def request_deadline(timeout_ms=None, request_start=None, default_timeout_ms=30000, max_timeout_ms=60000):
+    """Monotonic deadline from a client timeout header (ms) and a proxy's X-Request-Start.
+
+    X-Request-Start (``t=<epoch>`` in s, ms or us, as set by Heroku/Render routers or nginx)
+    moves the deadline back by the time the request spent queued before a worker accepted it.
+    Malformed values are ignored.
+    """
+    budget = default_timeout_ms
+    if timeout_ms:
+        try:
+            budget = min(float(timeout_ms), max_timeout_ms)
+        except ValueError:
+            pass
+    if not budget or budget <= 0:
+        return None
+    queued = 0.0
+    if request_start:
+        try:
+            started = float(request_start.strip().lstrip('t='))
+            started /= 1e6 if started > 1e14 else 1e3 if started > 1e11 else 1
+            queued = max(0.0, time.time() - started)
+        except ValueError:
+            pass
+    return time.monotonic() + budget / 1000.0 - queued
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdmissionGate:
+    def __init__(self, name, limit, queue, max_wait=5.0):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.queue = max(0, int(queue))
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = Counter()
+        self.queue_wait = Histogram(QUEUE_WAIT_BUCKETS)
+        # Moving average of how long an admitted request holds its slot, for Retry-After
+        self.service_time = None
+        self._cond = threading.Condition()
+        # Futures of coroutines queued in acquire_async, woken on release like the threads on _cond
+        self._async_waiters = deque()
+
+    def retry_after(self):
+        service_time = self.service_time or 1.0
+        return max(1, math.ceil(service_time * (self.waiting + 1) / self.limit))
+
+    def _reject(self, reason, status, message):
+        self.rejected[reason] += 1
+        return Overloaded(message, status, self.retry_after(), reason)
+
+    def _timed_out(self, deadline, wait_until):
+        if deadline is not None and wait_until == deadline:
+            self.rejected['deadline'] += 1
+            return DeadlineExceeded(retry_after=self.retry_after())
+        return self._reject('queue_timeout', 503, f'Timed out waiting for a {self.name} slot')
+
+    def _enqueue(self, arrived, deadline):
+        # Called with _cond held on a full gate; returns the time the queued request gives up
+        if self.waiting >= self.queue:
+            raise self._reject('queue_full', 429, f'Too many {self.name} requests queued')
+        return arrived + self.max_wait if deadline is None else min(arrived + self.max_wait, deadline)
+
+    def _admit(self, arrived):
+        # Called with _cond held
+        self.active += 1
+        self.admitted += 1
+        admitted = time.monotonic()
+        self.queue_wait.observe(admitted - arrived)
+        return admitted
+
+    def acquire(self, deadline=None):
+        """Takes a slot, waiting in the queue if needed; raises Overloaded instead of waiting past the deadline."""
+        arrived = time.monotonic()
+        with self._cond:
+            if deadline is not None and deadline <= arrived:
+                self.rejected['deadline'] += 1
+                raise DeadlineExceeded(retry_after=self.retry_after())
+            if self.active >= self.limit:
+                wait_until = self._enqueue(arrived, deadline)
+                self.waiting += 1
+                try:
+                    while self.active >= self.limit:
+                        remaining = wait_until - time.monotonic()
+                        if remaining <= 0:
+                            raise self._timed_out(deadline, wait_until)
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            return self._admit(arrived)
+
+    async def acquire_async(self, deadline=None):
+        """``acquire`` for coroutines: a queued request waits on the event loop instead of blocking its thread."""
+        loop = asyncio.get_running_loop()
+        arrived = time.monotonic()
+        with self._cond:
+            if deadline is not None and deadline <= arrived:
+                self.rejected['deadline'] += 1
+                raise DeadlineExceeded(retry_after=self.retry_after())
+            if self.active < self.limit:
+                return self._admit(arrived)
+            wait_until = self._enqueue(arrived, deadline)
+            self.waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    if self.active < self.limit:
+                        return self._admit(arrived)
+                    remaining = wait_until - time.monotonic()
+                    if remaining <= 0:
+                        raise self._timed_out(deadline, wait_until)
+                    waiter = loop.create_future()
+                    self._async_waiters.append(waiter)
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._cond:
+                        if waiter in self._async_waiters:
+                            self._async_waiters.remove(waiter)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def release(self, admitted):
+        held = time.monotonic() - admitted
+        with self._cond:
+            self.active -= 1
+            self.service_time = held if self.service_time is None else 0.8 * self.service_time + 0.2 * held
+            self._cond.notify()
+            if self._async_waiters:
+                waiter = self._async_waiters.popleft()
+                waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def stats(self):
+        return {
+            'limit': self.limit,
+            'queue': self.queue,
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'rejected': dict(self.rejected),
+            'service_seconds': round(self.service_time, 6) if self.service_time is not None else None,
+            'queue_wait_seconds': self.queue_wait.snapshot()
+        }
+
+
+def parse_limits(value):
+    """``"route=limit:queue,..."`` -> {route: (limit, queue)}; the queue part is optional."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        route, _, sizes = item.partition('=')
+        limit, _, queue = sizes.partition(':')
+        limits[route.strip()] = (int(limit), int(queue) if queue else int(limit))
+    return limits
+
+
+class AdmissionControl:
+    """One gate per configured route, plus the deadline of the request on each thread."""
+
+    def __init__(self, limits, max_wait=5.0, enabled=True):
+        self.enabled = enabled
+        self.gates = {route: AdmissionGate(route, limit, queue, max_wait) for route, (limit, queue) in limits.items()}
+
+    @contextmanager
+    def admit(self, route, deadline=None):
+        gate = self.gates.get(route) if self.enabled else None
+        admitted = None
+        if gate is not None:
+            admitted = gate.acquire(deadline)
+        elif deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded()
+        try:
+            with deadline_scope(deadline):
+                yield
+        finally:
+            if gate is not None:
+                gate.release(admitted)
+
+    @asynccontextmanager
+    async def admit_async(self, route, deadline=None):
+        """``admit`` for async routes. The deadline is not made thread-current, since the event
+        loop's thread serves other requests; the route enforces it itself (e.g. ``asyncio.wait_for``).
+        """
+        gate = self.gates.get(route) if self.enabled else None
+        admitted = None
+        if gate is not None:
+            admitted = await gate.acquire_async(deadline)
+        elif deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded()
+        try:
+            yield
+        finally:
+            if gate is not None:
+                gate.release(admitted)
+
+    def stats(self):
+        return {'enabled': self.enabled, 'routes': {route: gate.stats() for route, gate in self.gates.items()}}
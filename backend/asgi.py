@@ -0,0 +1,116 @@
+# uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""ASGI entry point: the Flask routes behind a bounded thread pool, network-bound routes async.
+
+``/hospitals`` runs on the event loop with a non-blocking HTTP client, so slow Overpass or
+Nominatim calls hold no thread. It goes through the same ``find_hospitals`` admission gate and
+request deadline as the Flask view, waiting for a slot on the loop. Every other route is the
+unchanged Flask view, run through a WSGI adapter on at most ``ASGI_WSGI_WORKERS`` threads; that
+pool is what bounds concurrent ``model.predict`` work, and hospital searches wait upstream beside it.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import server
+from admission import DeadlineExceeded, Overloaded, request_deadline
+from hospitals import HospitalSearchError
+
+ASGI_WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', 8))
+
+logger = logging.getLogger(__name__)
+# httpx logs every upstream request at INFO
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+async def find_hospitals(request):
+    # Counted under the Flask view's route name, so /metrics reads the same in both modes
+    started = time.perf_counter()
+    server.metrics.inc('requests_in_flight', route='find_hospitals')
+    try:
+        response = await search_hospitals(request)
+    finally:
+        server.metrics.inc('requests_in_flight', -1, route='find_hospitals')
+    server.metrics.histogram('request_seconds', route='find_hospitals', method='POST',
+                             status=str(response.status_code)).observe(time.perf_counter() - started)
+    return response
+
+
+def shed_response(error):
+    # Same body and headers as server.shed_response
+    logger.warning(f"Shed find_hospitals request ({error.reason}): {str(error)}")
+    return JSONResponse({'error': str(error), 'reason': error.reason}, status_code=error.status,
+                        headers={'Retry-After': str(error.retry_after)})
+
+
+async def search_hospitals(request):
+    # Gated like the Flask view under server.admission; the deadline bounds the whole search
+    deadline = request_deadline(request.headers.get('X-Request-Timeout-Ms'), request.headers.get('X-Request-Start'),
+                                server.REQUEST_TIMEOUT_MS, server.REQUEST_MAX_TIMEOUT_MS)
+    try:
+        async with server.admission_control.admit_async('find_hospitals', deadline):
+            if deadline is None:
+                return await run_hospital_search(request)
+            return await asyncio.wait_for(run_hospital_search(request), deadline - time.monotonic())
+    except asyncio.TimeoutError:
+        return shed_response(DeadlineExceeded())
+    except Overloaded as e:
+        return shed_response(e)
+
+
+async def run_hospital_search(request):
+    # Same contract as server.find_hospitals
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        query, error = server.hospital_query(data)
+        if error:
+            return JSONResponse({'error': error}, status_code=400)
+
+        hospital_list, source = await server.hospital_finder.search_async(*query)
+        logger.info(f"Found {len(hospital_list)} valid hospitals ({source})")
+        return JSONResponse({'hospitals': hospital_list}, headers=server.hospital_headers(source))
+    except HospitalSearchError as e:
+        logger.error(f"Hospital search failed: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=503)
+    except Exception as e:
+        logger.error(f"Hospital search failed: {str(e)}", exc_info=True)
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+# With hospital search disabled, /hospitals falls through to Flask, which answers 404
+routes = [Route('/hospitals', find_hospitals, methods=['POST'])] if 'hospitals' in server.SUBSYSTEMS else []
+
+@asynccontextmanager
+async def lifespan(app):
+    # Runs under `uvicorn asgi:app` as well as `python asgi.py`. With PRELOAD_MODELS, server.py
+    # skipped init_worker at import (it expects a fork), so the watcher and warm-up start here.
+    if server.PRELOADED_MODELS:
+        server.init_worker()
+    inference_processes = server.InferencePool(server.INFERENCE_PROCESSES).start() if server.INFERENCE_PROCESSES else None
+    try:
+        yield
+    finally:
+        if inference_processes is not None:
+            inference_processes.stop()
+
+
+app = Starlette(
+    routes=routes + [Mount('/', app=WSGIMiddleware(server.app, workers=ASGI_WSGI_WORKERS))],
+    middleware=[Middleware(CORSMiddleware, allow_origins=server.CORS_ORIGINS, allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5001)))
@@ -0,0 +1,192 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import numpy as np
+
+from admission import DeadlineExceeded
+from metrics import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+_Pending = namedtuple('_Pending', ['row', 'future', 'enqueued', 'deadline'])
+# Queued by close(); the worker runs what was queued before it and exits
+_CLOSE = object()
+# Wakes the worker to re-check whether rows outside its batch are still in flight
+_WAKE = object()
+
+
+class MicroBatcher:
+    """Collects single-row predictions from concurrent requests into one batched forward pass.
+
+    A row submitted while nothing else is queued or running has no one to batch with and runs
+    at once in the caller's thread, so a lone request (e.g. a sync worker with one thread)
+    never waits. Rows that arrive while others are in flight are queued. The first queued row
+    opens a window of ``max_wait_ms``; everything that arrives before the window closes (or
+    until ``max_batch_size`` rows are queued) is stacked and passed to ``predict_fn`` in a
+    single call. The window closes early once every row in flight is in the batch. Each caller
+    gets back its own output row. Rows whose monotonic ``deadline`` has passed by then fail
+    with DeadlineExceeded instead of running.
+    """
+
+    def __init__(self, name, predict_fn, max_batch_size=32, max_wait_ms=5.0, enabled=True, reuse_buffer=False):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.enabled = enabled
+        # Stack rows into one preallocated array owned by the worker thread instead of a new
+        # array per batch; predict_fn must not keep a reference to the batch it is given
+        self.reuse_buffer = reuse_buffer
+        self._batch_buffer = None
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait = Histogram(QUEUE_WAIT_BUCKETS)
+        self.expired = 0
+        self.immediate = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self._closed = False
+        # Rows submitted and not yet answered, whether queued or running in a caller's thread
+        self._in_flight = 0
+
+    def _ensure_worker(self):
+        # Called with self._lock held
+        if self._pid != os.getpid():
+            # Threads do not survive a fork, so each gunicorn worker gets its own queue
+            self._queue = queue.Queue()
+            self._worker = None
+            self._pid = os.getpid()
+            self._in_flight = 0
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=f'batcher-{self.name}', daemon=True)
+            self._worker.start()
+
+    def submit(self, row, deadline=None):
+        future = Future()
+        item = _Pending(np.asarray(row), future, time.monotonic(), deadline)
+        counted = False
+        if self.enabled:
+            with self._lock:
+                # Closed: a request still held the retired bundle; its row runs unbatched below
+                if not self._closed:
+                    self._ensure_worker()
+                    self._in_flight += 1
+                    counted = True
+                    if self._in_flight > 1:
+                        self._queue.put(item)
+                        return future
+                    self.immediate += 1
+        # Unbatched, or nothing else in flight: run in the caller
+        try:
+            future.set_running_or_notify_cancel()
+            live = self._unexpired([item])
+            if live:
+                self._execute_rows(live)
+        finally:
+            if counted:
+                with self._lock:
+                    self._in_flight -= 1
+                    if self._in_flight:
+                        self._queue.put(_WAKE)
+        return future
+
+    def predict(self, row, timeout=None, deadline=None):
+        return self.submit(row, deadline).result(timeout=timeout)
+
+    def _unexpired(self, items):
+        now = time.monotonic()
+        live = []
+        for item in items:
+            if item.deadline is not None and item.deadline <= now:
+                self.expired += 1
+                item.future.set_exception(DeadlineExceeded('Request deadline passed before inference'))
+            else:
+                live.append(item)
+        return live
+
+    def close(self, timeout=5.0):
+        """Stops the worker thread once the rows already queued have run; later rows run unbatched.
+
+        The registry calls this when a bundle is retired, since the thread holds ``predict_fn``
+        and with it the model.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker if self._pid == os.getpid() else None
+            if worker is not None:
+                self._queue.put(_CLOSE)
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+        self._batch_buffer = None
+
+    def _run(self):
+        closing = False
+        while not closing:
+            first = self._queue.get()
+            if first is _CLOSE:
+                return
+            if first is _WAKE:
+                continue
+            batch = [first]
+            deadline = first.enqueued + self.max_wait
+            # Wait only while rows outside this batch are in flight; nobody else can join it otherwise
+            while len(batch) < self.max_batch_size and self._in_flight > len(batch):
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                if item is not _WAKE:
+                    batch.append(item)
+            try:
+                live = self._unexpired([item for item in batch if item.future.set_running_or_notify_cancel()])
+                if live:
+                    self._execute_rows(live, self.reuse_buffer)
+            finally:
+                with self._lock:
+                    self._in_flight -= len(batch)
+
+    def _stack(self, rows):
+        first = rows[0]
+        buf = self._batch_buffer
+        if buf is None or buf.shape[1:] != first.shape or buf.dtype != first.dtype:
+            buf = self._batch_buffer = np.empty((self.max_batch_size,) + first.shape, dtype=first.dtype)
+        return np.stack(rows, out=buf[:len(rows)])
+
+    def _execute_rows(self, items, reuse_buffer=False):
+        started = time.monotonic()
+        for item in items:
+            self.queue_wait.observe(started - item.enqueued)
+        self.batch_sizes.observe(len(items))
+        try:
+            rows = [item.row for item in items]
+            outputs = self.predict_fn(self._stack(rows) if reuse_buffer else np.stack(rows))
+        except Exception as e:
+            for item in items:
+                item.future.set_exception(e)
+            return
+        for item, output in zip(items, outputs):
+            item.future.set_result(output)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled and not self._closed,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'expired': self.expired,
+            'immediate': self.immediate,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_seconds': self.queue_wait.snapshot(),
+        }
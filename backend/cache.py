@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from admission import DeadlineExceeded, check_deadline, current_deadline
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class LookupTable:
+    """Precomputed model outputs for every input in a small, enumerable input space.
+
+    Keyed on the raw bytes of the encoded row, so lookups go through the same encoder as
+    predictions and a row the table was not built for is simply a miss.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, row):
+        value = self.entries.get(row.tobytes())
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class PredictionCache:
+    """Content-addressed cache of model outputs, keyed on the encoded input row and model version.
+
+    Lookups go to an in-process ``TTLCache`` first and then, when ``url`` is set, to a Redis
+    server shared by every worker; shared hits are copied into the local cache. Redis errors
+    never fail a prediction: the shared tier is skipped for ``retry_seconds`` and the model runs.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600.0, url=None, retry_seconds=30.0):
+        self.local = TTLCache(max_entries, ttl)
+        self.url = url
+        self.retry_seconds = retry_seconds
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+        self._client = None
+        self._client_pid = None
+        self._retry_at = 0.0
+
+    @staticmethod
+    def key(model, version, row):
+        # Adding 0 turns -0.0 into 0.0, so equal rows always hash the same
+        row = np.ascontiguousarray(row, dtype=np.float32) + np.float32(0)
+        return f'prediction:{model}:{version}:{hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest()}'
+
+    def shared(self):
+        if not self.url or time.monotonic() < self._retry_at:
+            return None
+        if self._client_pid != os.getpid():
+            # Connections are per process, never inherited across a fork
+            try:
+                import redis
+            except ImportError:
+                logger.error("A shared prediction cache URL is set but the redis package is not installed")
+                self.url = None
+                return None
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.05, socket_connect_timeout=0.2)
+            self._client_pid = os.getpid()
+        return self._client
+
+    def _shared_failed(self, e):
+        self.shared_errors += 1
+        self._retry_at = time.monotonic() + self.retry_seconds
+        logger.warning(f"Shared prediction cache unavailable, retrying in {self.retry_seconds}s: {str(e)}")
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        client = self.shared()
+        if client is None:
+            return None
+        try:
+            raw = client.get(key)
+        except Exception as e:
+            self._shared_failed(e)
+            return None
+        if raw is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        value = json.loads(raw)
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        client = self.shared()
+        if client is None:
+            return
+        try:
+            client.set(key, json.dumps(value), px=int(self.local.ttl * 1000))
+        except Exception as e:
+            self._shared_failed(e)
+
+    def stats(self):
+        local = self.local.stats()
+        return {
+            'local': local,
+            'shared': {
+                'url': self.url.split('@')[-1] if self.url else None,
+                'hits': self.shared_hits,
+                'misses': self.shared_misses,
+                'errors': self.shared_errors
+            } if self.url else None,
+            'hit_ratio': round((local['hits'] + self.shared_hits) / (local['hits'] + local['misses']), 4)
+            if local['hits'] + local['misses'] else None
+        }
+
+
+class SingleFlight:
+    """Coalesces identical concurrent work: while a call for a key is in flight, callers with the
+    same key wait for its result (or exception) instead of running it again.
+
+    Nothing is kept once the call finishes; pair it with a cache for results that should last.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        """Runs ``fn(*args)``, or waits for the identical call already in flight.
+
+        A follower waits no longer than its own request deadline. A DeadlineExceeded from the
+        leader is the leader's deadline, not the follower's: a follower with time left runs the
+        call again (or joins a newer flight) instead of failing with it.
+        """
+        while True:
+            with self._lock:
+                future = self._flights.get(key)
+                leader = future is None
+                if leader:
+                    future = self._flights[key] = Future()
+                    self.executed += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            deadline = current_deadline()
+            try:
+                return future.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                if future.done():
+                    # The leader's own TimeoutError, not this caller running out of time
+                    raise
+                raise DeadlineExceeded()
+            except DeadlineExceeded:
+                check_deadline()
+        # The key is released before the outcome is published, so a retrying follower starts a new flight
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._forget(key, future)
+            future.set_exception(e)
+            raise
+        self._forget(key, future)
+        future.set_result(result)
+        return result
+
+    def future(self, key, start):
+        """Returns the future already in flight for ``key``, or the one ``start()`` creates.
+
+        Works with ``concurrent.futures`` futures and asyncio tasks alike; the key is released
+        when the future completes.
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self._flights[key] = start()
+            self.executed += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            calls = self.executed + self.coalesced
+            return {
+                'in_flight': len(self._flights),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'coalesced_ratio': round(self.coalesced / calls, 4) if calls else None
+            }
@@ -0,0 +1,86 @@
+"""Per-worker CPU layout: thread pools for TensorFlow, XGBoost and TFLite, oneDNN and core pinning.
+
+Imported by server.py before TensorFlow: oneDNN and the OpenMP/TF pool sizes are read when
+the library loads. Settings come from the environment or the backend's .env file.
+"""
+import logging
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus():
+    # Cores this process may run on, which respects container cpusets unlike os.cpu_count()
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+CPUS = available_cpus()
+WORKERS = max(1, int(os.getenv('WEB_CONCURRENCY', 2)))
+# Threads each worker's inference may use; by default the node's cores split evenly across workers
+CPU_THREADS = int(os.getenv('CPU_THREADS', 0)) or max(1, len(CPUS) // WORKERS)
+TF_INTRA_OP_THREADS = int(os.getenv('TF_INTRA_OP_THREADS', 0)) or CPU_THREADS
+# Inference graphs here are sequential, so a second inter-op thread rarely helps
+TF_INTER_OP_THREADS = int(os.getenv('TF_INTER_OP_THREADS', 0)) or min(2, CPU_THREADS)
+XGBOOST_NTHREAD = int(os.getenv('XGBOOST_NTHREAD', 0)) or CPU_THREADS
+TFLITE_NUM_THREADS = int(os.getenv('TFLITE_NUM_THREADS', 0)) or CPU_THREADS
+ONEDNN_ENABLED = os.getenv('ONEDNN_ENABLED', '1') == '1'
+# Pin each gunicorn worker to its own CPU_THREADS cores
+CPU_AFFINITY = os.getenv('CPU_AFFINITY', '0') == '1'
+
+
+def configure_environment():
+    """Must run before TensorFlow is imported. Explicit OMP_*/TF_* variables win."""
+    os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '1' if ONEDNN_ENABLED else '0')
+    os.environ.setdefault('OMP_NUM_THREADS', str(TF_INTRA_OP_THREADS))
+    os.environ.setdefault('TF_NUM_INTRAOP_THREADS', str(TF_INTRA_OP_THREADS))
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', str(TF_INTER_OP_THREADS))
+
+
+def configure_tensorflow(tf):
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_OP_THREADS)
+        tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_OP_THREADS)
+    except RuntimeError as e:
+        # The runtime is already initialized; the TF_NUM_* variables set earlier still apply
+        logger.warning(f"TensorFlow thread pools already initialized: {str(e)}")
+
+
+def configure_xgboost(booster):
+    booster.set_param({'nthread': XGBOOST_NTHREAD})
+    return booster
+
+
+def pin_worker(slot):
+    """Restrict this process to the ``slot``-th group of CPU_THREADS cores, wrapping around.
+
+    gunicorn.conf.py hands out the lowest slot no live worker holds, so a respawned worker
+    takes over the cores of the one it replaces.
+    """
+    if not CPU_AFFINITY or not hasattr(os, 'sched_setaffinity'):
+        return None
+    groups = max(1, len(CPUS) // CPU_THREADS)
+    start = (slot % groups) * CPU_THREADS
+    cores = CPUS[start:start + CPU_THREADS]
+    os.sched_setaffinity(0, cores)
+    logger.info(f"Worker {os.getpid()} pinned to CPUs {cores}")
+    return cores
+
+
+def layout():
+    return {
+        'cpus': len(CPUS),
+        'workers': WORKERS,
+        'cpu_threads': CPU_THREADS,
+        'tf_intra_op_threads': TF_INTRA_OP_THREADS,
+        'tf_inter_op_threads': TF_INTER_OP_THREADS,
+        'xgboost_nthread': XGBOOST_NTHREAD,
+        'tflite_num_threads': TFLITE_NUM_THREADS,
+        'onednn': ONEDNN_ENABLED,
+        'affinity': sorted(os.sched_getaffinity(0)) if CPU_AFFINITY and hasattr(os, 'sched_getaffinity') else None
+    }
@@ -0,0 +1,267 @@
+import threading
+
+import numpy as np
+
+
+class InvalidInput(ValueError):
+    pass
+
+
+# Map frontend symptoms to model feature names
+SYMPTOM_MAPPING = {
+    'fever': 'fever',
+    'headache': 'headache',
+    'cough': 'cough',
+    'diarrhea': 'diarrhea',
+    'vomiting': 'vomiting',
+    'shortnessofbreath': 'shortness_of_breath',
+    'painchest': 'pain_chest',
+    'fatigue': 'asthenia',
+    'chills': 'chill',
+    'soretotouch': 'sore_to_touch'
+}
+
+CHEST_PAIN_MAPPING = {
+    'Typical Angina': 1.0,
+    'Atypical Angina': 2.0,
+    'Non-anginal Pain': 3.0,
+    'Asymptomatic': 4.0
+}
+
+DIABETES_FIELDS = ['age', 'bmi', 'skin_thickness', 'glucose', 'physical_activity']
+HEART_DISEASE_FIELDS = ['age', 'blood_pressure', 'smoking', 'bmi', 'chest_pain']
+MENTAL_HEALTH_FIELDS = ['age', 'sleep_quality', 'mood_frequency', 'social_activity', 'mental_health_history']
+
+
+def label_lookup(label_encoder):
+    # LabelEncoder codes are positions in classes_
+    return {value: code for code, value in enumerate(label_encoder.classes_.tolist())}
+
+
+def missing_fields(record, required_fields):
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidInput('Record must be a JSON object')
+    return [field for field in required_fields if field not in record]
+
+
+def parse_float(record, field, default):
+    try:
+        return float(record.get(field, default))
+    except (TypeError, ValueError) as e:
+        raise InvalidInput(f'Invalid numeric input: {str(e)}')
+
+
+def lookup_code(table, value, message):
+    try:
+        return table[value]
+    except (KeyError, TypeError):
+        raise InvalidInput(message)
+
+
+class TabularEncoder:
+    """Turns request records into scaled float32 model rows without going through pandas.
+
+    Built once per model from the fitted scaler and label encoders: the column order,
+    the scaler ``mean_``/``scale_`` vectors and plain dict lookups for the categoricals.
+    Subclasses implement ``fill_row`` for their model's request fields.
+    """
+
+    columns = []
+    scaled_columns = []
+
+    def __init__(self, scaler):
+        scaled_columns = list(getattr(scaler, 'feature_names_in_', self.scaled_columns))
+        self.width = len(self.columns)
+        self.scaled_idx = np.array([self.columns.index(column) for column in scaled_columns])
+        mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(len(scaled_columns))
+        scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(len(scaled_columns))
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self._local = threading.local()
+
+    def buffer(self, n):
+        # Per-thread scratch matrix, reused across requests; grows to the largest chunk seen
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None or buf.shape[0] < n:
+            buf = np.empty((max(n, 1), self.width), dtype=np.float32)
+            self._local.buffer = buf
+        return buf[:n]
+
+    def fill_row(self, record, row):
+        raise NotImplementedError
+
+    def encode(self, records, out=None):
+        # Returns (matrix, errors). Without ``out`` the matrix is the thread's scratch
+        # buffer and is only valid until the next encode() call on the same thread.
+        matrix, errors = self.fill(records, out)
+        self.scale_rows(matrix)
+        return matrix, errors
+
+    def fill(self, records, out=None):
+        # Unscaled rows with the categoricals looked up; encode() is fill() then scale_rows()
+        matrix = self.buffer(len(records)) if out is None else out
+        errors = [None] * len(records)
+        for i, record in enumerate(records):
+            try:
+                self.fill_row(record, matrix[i])
+            except InvalidInput as e:
+                errors[i] = str(e)
+                matrix[i] = 0
+        return matrix, errors
+
+    def scale_rows(self, matrix):
+        if len(matrix):
+            matrix[:, self.scaled_idx] = (matrix[:, self.scaled_idx] - self.mean) / self.scale
+        return matrix
+
+
+class DiabetesEncoder(TabularEncoder):
+    columns = ['Age', 'BMI', 'SkinThickness', 'FamilyHistory', 'PhysicalActivity']
+    scaled_columns = ['Age', 'BMI', 'SkinThickness']
+
+    def __init__(self, scaler, label_encoder):
+        super().__init__(scaler)
+        self.physical_activity_codes = label_lookup(label_encoder)
+
+    def fill_row(self, record, row):
+        if missing_fields(record, DIABETES_FIELDS):
+            raise InvalidInput('Missing required fields')
+        row[0] = parse_float(record, 'age', 0)
+        row[1] = parse_float(record, 'bmi', 0)
+        row[2] = parse_float(record, 'skin_thickness', 0)
+        row[3] = 1 if parse_float(record, 'glucose', 0) > 120 else 0
+        row[4] = lookup_code(self.physical_activity_codes, record.get('physical_activity', 'Moderate'),
+                             'Invalid physical_activity value')
+
+
+class HeartDiseaseEncoder(TabularEncoder):
+    columns = ['Age', 'BloodPressure', 'Smoking', 'FamilyHistory', 'BMI', 'ChestPain']
+    scaled_columns = ['Age', 'BloodPressure', 'BMI']
+
+    def __init__(self, scaler, label_encoder):
+        super().__init__(scaler)
+        self.valid_chest_pains = label_encoder.classes_.tolist()
+        codes = label_lookup(label_encoder)
+        # None marks a frontend label whose numeric value the encoder was not fitted on
+        self.chest_pain_codes = {label: codes.get(numeric) for label, numeric in CHEST_PAIN_MAPPING.items()}
+
+    def fill_row(self, record, row):
+        missing = missing_fields(record, HEART_DISEASE_FIELDS)
+        if missing:
+            raise InvalidInput(f'Missing required fields: {missing}')
+        row[0] = parse_float(record, 'age', 0)
+        blood_pressure = parse_float(record, 'blood_pressure', 120)
+        row[1] = blood_pressure
+        row[2] = parse_float(record, 'smoking', 0)
+        row[3] = 1 if blood_pressure > 140 else 0
+        row[4] = parse_float(record, 'bmi', 27)
+        chest_pain = record.get('chest_pain', 'Typical Angina')
+        valid_values = list(CHEST_PAIN_MAPPING.keys())
+        code = lookup_code(self.chest_pain_codes, chest_pain,
+                           f'Invalid chest_pain value: {chest_pain}. Valid values: {valid_values}')
+        if code is None:
+            raise InvalidInput(f'Invalid encoded chest_pain value: {CHEST_PAIN_MAPPING[chest_pain]}. '
+                               f'Valid values: {self.valid_chest_pains}')
+        row[5] = code
+
+
+class MentalHealthEncoder(TabularEncoder):
+    columns = ['Age', 'SleepQuality', 'MoodFrequency', 'SocialActivity', 'MentalHealthHistory']
+    scaled_columns = ['Age']
+
+    def __init__(self, scaler, label_encoders):
+        super().__init__(scaler)
+        self.category_codes = {key: label_lookup(encoder) for key, encoder in label_encoders.items()}
+
+    def fill_row(self, record, row):
+        if missing_fields(record, MENTAL_HEALTH_FIELDS):
+            raise InvalidInput('Missing required fields')
+        row[0] = parse_float(record, 'age', 0)
+        for column, key, field, default in [(1, 'sleep', 'sleep_quality', 'Fair'),
+                                            (2, 'mood', 'mood_frequency', 'Rarely'),
+                                            (3, 'social', 'social_activity', 'Moderate')]:
+            row[column] = lookup_code(self.category_codes.get(key, {}), record.get(field, default),
+                                      'Invalid categorical value')
+        row[4] = parse_float(record, 'mental_health_history', 0)
+
+    def input_grid(self, ages=range(0, 121), histories=(0, 1)):
+        # Every record of whole-year ages and 0/1 history over the fitted categories: small
+        # enough (a few thousand rows) to precompute, and covers what the Diagnostics form sends
+        fields = [('sleep', 'sleep_quality'), ('mood', 'mood_frequency'), ('social', 'social_activity')]
+        records = [{'age': age, 'mental_health_history': history} for age in ages for history in histories]
+        for key, field in fields:
+            records = [{**record, field: value} for record in records for value in self.category_codes.get(key, {})]
+        return records
+
+
+class SymptomEncoder:
+    """One-hot encodes symptom lists in the column order the booster was trained with.
+
+    ``feature_names`` must be the booster's own order so rows can be passed to
+    ``inplace_predict`` without feature-name validation. With ``sparse_input`` the rows
+    come back as CSR; note that XGBoost treats absent CSR entries as missing rather than 0,
+    so only enable it for models trained on sparse input.
+    """
+
+    def __init__(self, feature_names, symptom_mapping, sparse_input=False):
+        self.feature_names = list(feature_names)
+        self.width = len(self.feature_names)
+        self.sparse_input = sparse_input
+        self.column_index = {feature: idx for idx, feature in enumerate(self.feature_names)}
+        for symptom, feature in symptom_mapping.items():
+            if feature in self.column_index:
+                self.column_index[symptom] = self.column_index[feature]
+            else:
+                self.column_index.pop(symptom, None)
+        self._local = threading.local()
+
+    def symptoms(self, record):
+        if isinstance(record, Exception):
+            raise record
+        if isinstance(record, dict):
+            record = record.get('symptoms', record)
+        if not isinstance(record, (list, dict)):
+            raise InvalidInput('Record must be a list of symptoms or a JSON object')
+        return record
+
+    def columns(self, record, unknown):
+        columns = set()
+        for symptom in self.symptoms(record):
+            idx = self.column_index.get(symptom) if isinstance(symptom, str) else None
+            if idx is None:
+                unknown.append(symptom)
+            else:
+                columns.add(idx)
+        return sorted(columns)
+
+    def encode(self, records):
+        # Returns (matrix, errors, unknown symptoms). The dense matrix is a per-thread
+        # scratch buffer, valid until the next encode() call on the same thread.
+        errors = [None] * len(records)
+        unknown = []
+        indptr = [0]
+        indices = []
+        for i, record in enumerate(records):
+            try:
+                indices.extend(self.columns(record, unknown))
+            except InvalidInput as e:
+                errors[i] = str(e)
+            indptr.append(len(indices))
+
+        if self.sparse_input:
+            from scipy import sparse
+            data = np.ones(len(indices), dtype=np.float32)
+            matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(records), self.width))
+            return matrix, errors, unknown
+
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None or buf.shape[0] < len(records):
+            buf = np.empty((max(len(records), 1), self.width), dtype=np.float32)
+            self._local.buffer = buf
+        matrix = buf[:len(records)]
+        matrix.fill(0)
+        rows = np.repeat(np.arange(len(records)), np.diff(indptr))
+        matrix[rows, indices] = 1
+        return matrix, errors, unknown
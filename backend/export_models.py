@@ -0,0 +1,136 @@
+"""Convert the Keras .h5 models to TFLite for INFERENCE_BACKEND=tflite.
+
+    python export_models.py                       # every model, float32
+    python export_models.py --quantize float16    # or dynamic / int8
+    python export_models.py --models diabetes heart_disease --tolerance 0.01
+
+Each model is written next to its .h5 as <name>.tflite, but only if its predictions on
+random inputs stay within --tolerance of the original model and no sample farther than that
+from the 0.5 threshold changes label. The parity report is printed as JSON.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+import tensorflow as tf
+from keras.models import load_model
+
+from inference import TFLiteModel
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(BASE_DIR, 'models'))
+
+# Model files and the kind of input they take; tabular inputs are standard-scaled rows
+MODELS = {
+    'diabetes': ('diabetes_best_model.h5', 'tabular'),
+    'heart_disease': ('heart_disease_best_model.h5', 'tabular'),
+    'mental_health': ('mental_health_best_model.h5', 'tabular'),
+    'chest_xray': ('chest_xray_model.h5', 'image'),
+    'skin_lesion': ('skin_lesion_inceptionv3_model.h5', 'image')
+}
+
+
+def tflite_filename(filename):
+    return os.path.splitext(filename)[0] + '.tflite'
+
+
+def sample_inputs(kind, shape, n, seed=0):
+    rng = np.random.default_rng(seed)
+    if kind == 'image':
+        return rng.random((n,) + shape, dtype=np.float32)
+    return rng.standard_normal((n,) + shape, dtype=np.float32)
+
+
+def convert(model, kind, shape, quantize):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantize == 'int8':
+        # Full integer kernels calibrated on synthetic inputs; the float32 interface is kept
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        calibration = sample_inputs(kind, shape, 100, seed=1)
+        converter.representative_dataset = lambda: ([row[None]] for row in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def parity(model, tflite_model, kind, shape, samples, tolerance):
+    inputs = sample_inputs(kind, shape, samples)
+    expected = np.asarray(model.predict_on_batch(inputs))
+    actual = np.asarray(tflite_model.predict_on_batch(inputs))
+    return {
+        'samples': samples,
+        'max_abs_diff': float(np.max(np.abs(expected - actual))),
+        'mean_abs_diff': float(np.mean(np.abs(expected - actual))),
+        'label_agreement': float(np.mean((expected > 0.5) == (actual > 0.5))),
+        # Label changes on samples that are not within the tolerance of the threshold anyway
+        'label_flips': int(np.sum(((expected > 0.5) != (actual > 0.5)) & (np.abs(expected - 0.5) > tolerance)))
+    }
+
+
+def export_model(name, model_dir, quantize, samples, tolerance):
+    filename, kind = MODELS[name]
+    source = os.path.join(model_dir, filename)
+    target = os.path.join(model_dir, tflite_filename(filename))
+    model = load_model(source, compile=False)
+    shape = tuple(model.input_shape[1:])
+
+    started = time.perf_counter()
+    content = convert(model, kind, shape, quantize)
+    convert_seconds = round(time.perf_counter() - started, 2)
+
+    # Check the converted file before it replaces a served one
+    staging = target + '.tmp'
+    with open(staging, 'wb') as f:
+        f.write(content)
+    report = parity(model, TFLiteModel(staging), kind, shape, samples, tolerance)
+    report.update({
+        'model': name, 'source': filename, 'target': os.path.basename(target), 'quantize': quantize,
+        'h5_bytes': os.path.getsize(source), 'tflite_bytes': len(content), 'convert_seconds': convert_seconds
+    })
+    report['passed'] = report['max_abs_diff'] <= tolerance and report['label_flips'] == 0
+    if report['passed']:
+        os.replace(staging, target)
+        logger.info(f"Exported {name} to {target}")
+    else:
+        os.remove(staging)
+        logger.error(f"{name} failed the parity check (max diff {report['max_abs_diff']:.5f}), not written")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the Keras models to TFLite with a parity check.')
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=list(MODELS))
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--quantize', choices=['none', 'float16', 'dynamic', 'int8'], default='none')
+    parser.add_argument('--samples', type=int, default=64, help='random inputs for the parity check')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='max absolute difference in predicted probability (default 1e-4, 0.02 when quantized)')
+    args = parser.parse_args(argv)
+    tolerance = args.tolerance if args.tolerance is not None else (1e-4 if args.quantize == 'none' else 0.02)
+
+    reports = []
+    for name in args.models:
+        try:
+            reports.append(export_model(name, args.model_dir, args.quantize, args.samples, tolerance))
+        except Exception as e:
+            logger.error(f"Failed to export {name}: {str(e)}", exc_info=True)
+            reports.append({'model': name, 'passed': False, 'error': str(e)})
+    print(json.dumps(reports, indent=2))
+    return 0 if all(report['passed'] for report in reports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
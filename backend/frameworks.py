@@ -0,0 +1,62 @@
+"""Heavy ML frameworks, imported on first use instead of when the server starts.
+
+TensorFlow/Keras and XGBoost take seconds to import. A worker that only serves hospital
+search, or only the disease booster, never pays for the frameworks it does not use.
+``IMPORT_SECONDS`` records how long each deferred import took.
+"""
+import importlib
+import logging
+import sys
+import threading
+import time
+
+import cpu
+
+logger = logging.getLogger(__name__)
+
+HEAVY_MODULES = ['tensorflow', 'keras', 'xgboost', 'sklearn', 'pandas', 'joblib', 'groq', 'cv2']
+IMPORT_SECONDS = {}
+
+_tf_lock = threading.Lock()
+_tf_configured = False
+
+
+def load(module):
+    """``importlib.import_module`` that records the time of the first import in this module."""
+    if module in IMPORT_SECONDS:
+        return importlib.import_module(module)
+    started = time.perf_counter()
+    imported = importlib.import_module(module)
+    elapsed = time.perf_counter() - started
+    if IMPORT_SECONDS.setdefault(module, round(elapsed, 3)) >= 0.1:
+        logger.info(f"Imported {module} in {elapsed:.2f}s")
+    return imported
+
+
+def tensorflow():
+    global _tf_configured
+    tf = load('tensorflow')
+    with _tf_lock:
+        if not _tf_configured:
+            tf.get_logger().setLevel('ERROR')
+            cpu.configure_tensorflow(tf)
+            _tf_configured = True
+    return tf
+
+
+def keras_load_model(path, **kwargs):
+    tensorflow()
+    return load('keras.models').load_model(path, **kwargs)
+
+
+def xgboost():
+    return load('xgboost')
+
+
+def joblib():
+    return load('joblib')
+
+
+def loaded():
+    """Heavy modules present in this process, whoever imported them."""
+    return [module for module in HEAVY_MODULES if module in sys.modules]
@@ -0,0 +1,91 @@
+# gunicorn -c gunicorn.conf.py server:app
+import gc
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import cpu  # noqa: E402
+# In the master, before inference_pool pulls in NumPy: preloaded models and the forked workers
+# get the thread pool sizes and oneDNN setting from the environment set here
+cpu.configure_environment()
+from inference_pool import INFERENCE_PROCESSES, start_supervisor  # noqa: E402
+from metrics import process_memory  # noqa: E402
+from subsystems import PRELOADED_MODELS  # noqa: E402
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+# Threaded workers, so concurrent requests share a micro-batch and the admission gates (sized to
+# GUNICORN_THREADS in server.py) can fill and shed
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+# When PRELOAD_MODELS names a family that can be preloaded, server.py loads it while the
+# master imports the app, and every worker forked afterwards shares those pages copy-on-write.
+# Otherwise the master never imports the app, so its warm-up threads never start before fork.
+preload_app = bool(PRELOADED_MODELS)
+
+# Seconds between per-worker memory reports from the master (0 disables)
+MEMORY_REPORT_INTERVAL = float(os.getenv('MEMORY_REPORT_INTERVAL', 0))
+
+logger = logging.getLogger('gunicorn.error')
+
+
+def report_memory(server):
+    while True:
+        time.sleep(MEMORY_REPORT_INTERVAL)
+        master = process_memory()
+        per_worker = {pid: process_memory(pid) for pid in list(server.WORKERS)}
+        total_pss = master.get('Pss', 0) + sum(memory.get('Pss', 0) for memory in per_worker.values())
+        total_rss = master.get('VmRSS', 0) + sum(memory.get('VmRSS', 0) for memory in per_worker.values())
+        for pid, memory in per_worker.items():
+            logger.info(f"Worker {pid} memory (KiB): {memory}")
+        logger.info(f"Total memory (KiB): RSS {total_rss}, PSS {total_pss}")
+
+
+# Supervisor of the inference processes for the INFERENCE_PROCESSES families, shared by every worker on the node
+inference_supervisor = None
+
+
+def on_starting(server):
+    # Before any worker forks, so they inherit the pool's INFERENCE_AUTHKEY
+    global inference_supervisor
+    if INFERENCE_PROCESSES:
+        inference_supervisor = start_supervisor(INFERENCE_PROCESSES)
+
+
+def on_exit(server):
+    if inference_supervisor is not None:
+        inference_supervisor.terminate()
+        inference_supervisor.wait(timeout=15)
+
+
+def when_ready(server):
+    if MEMORY_REPORT_INTERVAL > 0:
+        threading.Thread(target=report_memory, args=(server,), name='memory-report', daemon=True).start()
+
+
+def pre_fork(server, worker):
+    # Core group for the new worker: the lowest slot no live worker holds. The master drops an
+    # exited worker from server.WORKERS (before child_exit) and only then spawns its replacement,
+    # so the replacement gets the freed slot instead of one a running worker is pinned to.
+    taken = {getattr(other, 'cpu_slot', None) for other in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in itertools.count() if slot not in taken)
+    # Move everything loaded so far out of the collector's reach, so GC passes in the
+    # workers do not write to (and un-share) the preloaded objects
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    cores = cpu.pin_worker(worker.cpu_slot)
+    if cores is not None:
+        logger.info(f"Worker {worker.pid} pinned to CPUs {cores} (slot {worker.cpu_slot})")
+    if preload_app:
+        # The app was imported (and skipped init_worker) in the master
+        import server as app_module
+        app_module.init_worker()
@@ -0,0 +1,576 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import SingleFlight
+from metrics import Histogram
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Upstream endpoints; point them at tools/mock_osm.py for local runs and tests
+OVERPASS_URL = os.getenv('OVERPASS_URL', 'https://overpass-api.de/api/interpreter')
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/search')
+HOSPITAL_TIMEOUT = float(os.getenv('HOSPITAL_TIMEOUT', 10))
+HOSPITAL_CONNECT_TIMEOUT = float(os.getenv('HOSPITAL_CONNECT_TIMEOUT', 3.05))
+# Providers are queried in parallel; a search returns what it has once this many seconds pass
+HOSPITAL_LATENCY_BUDGET = float(os.getenv('HOSPITAL_LATENCY_BUDGET', 5))
+# Keep-alive connections per upstream host, and threads per provider for the parallel calls
+HOSPITAL_POOL_SIZE = int(os.getenv('HOSPITAL_POOL_SIZE', 8))
+# Open upstream connections for the async search (ASGI server), where waiting holds no thread
+HOSPITAL_ASYNC_CONNECTIONS = int(os.getenv('HOSPITAL_ASYNC_CONNECTIONS', 256))
+# Consecutive failures before a provider is skipped, and how long until it is tried again
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 3))
+CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', 30))
+# Candidates are cached per grid cell of this many degrees (0.01 is about 1.1 km)
+HOSPITAL_CELL_DEGREES = float(os.getenv('HOSPITAL_CELL_DEGREES', 0.01))
+HOSPITAL_CACHE_TTL = float(os.getenv('HOSPITAL_CACHE_TTL', 6 * 3600))
+HOSPITAL_CACHE_SIZE = int(os.getenv('HOSPITAL_CACHE_SIZE', 4096))
+# Overpass JSON extract of hospital nodes; when set, searches never call upstream
+HOSPITALS_OFFLINE_FILE = os.getenv('HOSPITALS_OFFLINE_FILE')
+
+SEARCH_RADIUS_KM = 5.0
+SEARCH_LIMIT = 5
+# Upper bounds for the radius/limit request parameters
+HOSPITAL_MAX_RADIUS_KM = float(os.getenv('HOSPITAL_MAX_RADIUS_KM', 50))
+HOSPITAL_MAX_LIMIT = int(os.getenv('HOSPITAL_MAX_LIMIT', 100))
+# Upstream queries are made for the smallest tier covering the requested radius, so cells
+# are cached for a handful of radii instead of every value callers send
+RADIUS_TIERS_KM = (5.0, 10.0, 25.0, 50.0)
+NOMINATIM_BOX_DEGREES = 0.05
+EARTH_RADIUS_KM = 6371.0088
+PROVIDER_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def haversine_km(lat, lon, lats, lons):
+    # Great-circle distance from one point to arrays of points, in one vectorized pass
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def top_k(distances, k):
+    # Indices of the k smallest distances, nearest first, without sorting the whole array
+    if k < len(distances):
+        idx = np.argpartition(distances, k)[:k]
+    else:
+        idx = np.arange(len(distances))
+    return idx[np.argsort(distances[idx], kind='stable')]
+
+
+def radius_tier(radius_km):
+    for tier in RADIUS_TIERS_KM:
+        if radius_km <= tier:
+            return tier
+    return radius_km
+
+
+def nominatim_box(radius_km):
+    return max(NOMINATIM_BOX_DEGREES, radius_km / 111.32)
+
+
+def dedup_key(candidate):
+    return ' '.join(candidate['name'].casefold().split())
+
+
+class Candidates:
+    """Hospitals from one upstream answer, with coordinates as arrays for vectorized ranking."""
+
+    def __init__(self, records):
+        self.records = records
+        # Normalized names, hashed once per answer for de-duplication across providers
+        self.keys = [dedup_key(record) for record in records]
+        self.lat = np.array([c['lat'] for c in self.records], dtype=np.float64)
+        self.lon = np.array([c['lon'] for c in self.records], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.records)
+
+
+def parse_overpass(elements):
+    # Only hospitals with both an address and a phone number are listed
+    candidates = []
+    for h in elements:
+        if 'lat' not in h or 'lon' not in h:
+            continue
+        tags = h.get('tags', {})
+        address = tags.get('addr:street', '') or tags.get('addr:full', '')
+        phone = tags.get('phone', '') or tags.get('contact:phone', '')
+        if address and address != 'No address' and phone and phone != 'No phone':
+            candidates.append({
+                'name': tags.get('name', 'Unknown'),
+                'address': address,
+                'phone': phone,
+                'lat': float(h['lat']),
+                'lon': float(h['lon'])
+            })
+    return Candidates(candidates)
+
+
+def parse_nominatim(places):
+    candidates = []
+    for h in places:
+        address = h.get('display_name', '')
+        phone = h.get('phone', 'Not listed')
+        if not address or phone == 'Not listed':
+            continue
+        candidates.append({
+            'name': address.split(',')[0],
+            'address': address,
+            'phone': phone,
+            'lat': float(h.get('lat')),
+            'lon': float(h.get('lon'))
+        })
+    return Candidates(candidates)
+
+
+def to_unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+class HospitalSearchError(RuntimeError):
+    pass
+
+
+_http_session = None
+_http_session_pid = None
+_lock = threading.Lock()
+
+
+def http_session():
+    # Keep-alive session shared by every request in this worker; sockets must not be shared
+    # with a forked parent, so each process builds its own
+    global _http_session, _http_session_pid
+    if _http_session_pid != os.getpid():
+        with _lock:
+            if _http_session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HOSPITAL_POOL_SIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+                _http_session_pid = os.getpid()
+    return _http_session
+
+
+class CircuitBreaker:
+    """Skips a provider after ``failure_threshold`` consecutive failures.
+
+    After ``reset_seconds`` one trial call is let through (half-open); success closes the
+    circuit again, failure re-opens it for another ``reset_seconds``.
+    """
+
+    def __init__(self, failure_threshold=3, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.trial_running or time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial_running and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class Provider:
+    """One upstream: ``build(cell, radius_km)`` returns ``(url, params, headers)`` and
+    ``parse(payload)`` turns the JSON answer into ``Candidates``, so the blocking and the
+    async search send identical queries."""
+
+    def __init__(self, name, build, parse):
+        self.name = name
+        self.build = build
+        self.parse = parse
+        self._executor = None
+        self._executor_pid = None
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        self.latency = Histogram(PROVIDER_LATENCY_BUCKETS)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.skipped = 0
+
+    def executor(self):
+        # One pool per provider, so a slow provider cannot take the threads the others need
+        if self._executor_pid != os.getpid():
+            with _lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=HOSPITAL_POOL_SIZE,
+                                                        thread_name_prefix=f'hospital-{self.name}')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def record(self, seconds, error=None, timed_out=False):
+        self.latency.observe(seconds)
+        self.calls += 1
+        if error is None:
+            self.breaker.record_success()
+            return
+        self.errors += 1
+        if timed_out:
+            self.timeouts += 1
+        self.breaker.record_failure()
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'skipped': self.skipped,
+            'circuit': self.breaker.state,
+            'latency_seconds': self.latency.snapshot()
+        }
+
+
+class HospitalIndex:
+    """In-memory KD-tree over hospital coordinates, for offline nearest-hospital queries.
+
+    Points are stored as unit vectors, so Euclidean (chord) distance orders neighbours
+    exactly like great-circle distance and the radius maps to a chord length.
+    """
+
+    def __init__(self, candidates):
+        from scipy.spatial import cKDTree
+        self.candidates = candidates
+        self.tree = cKDTree(to_unit_vectors(candidates.lat, candidates.lon)) if len(candidates) else None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        elements = data.get('elements', []) if isinstance(data, dict) else data
+        index = cls(parse_overpass(elements))
+        logger.info(f"Loaded {len(index.candidates)} hospitals from {path}")
+        return index
+
+    def nearest(self, lat, lon, radius_km, k):
+        # Returns [(candidate, distance_km)], nearest first
+        if self.tree is None:
+            return []
+        chord = 2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2)
+        k = min(k, len(self.candidates))
+        chords, idx = self.tree.query(to_unit_vectors(lat, lon)[0], k=k, distance_upper_bound=chord)
+        found = np.atleast_1d(idx) < len(self.candidates)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.atleast_1d(chords)[found] / 2, 1.0))
+        return [(self.candidates.records[i], d) for i, d in zip(np.atleast_1d(idx)[found], distances)]
+
+
+class HospitalFinder:
+    """Nearest-hospital search over Overpass (with a Nominatim fallback) or an offline index.
+
+    Upstream results are cached per grid cell rather than per coordinate: a cell's query is
+    centred on the cell and widened by its half-diagonal, so the cached candidates cover a
+    full search from any point inside it and neighbours share one upstream call.
+    """
+
+    def __init__(self, cell_degrees=HOSPITAL_CELL_DEGREES, cache_size=HOSPITAL_CACHE_SIZE,
+                 cache_ttl=HOSPITAL_CACHE_TTL, offline_file=HOSPITALS_OFFLINE_FILE,
+                 latency_budget=HOSPITAL_LATENCY_BUDGET):
+        self.cell_degrees = cell_degrees
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.index = HospitalIndex.from_file(offline_file) if offline_file else None
+        self.latency_budget = latency_budget
+        # In merge priority order
+        self.providers = [
+            Provider('overpass', self.overpass_request, lambda payload: parse_overpass(payload.get('elements', []))),
+            Provider('nominatim', self.nominatim_request, parse_nominatim)
+        ]
+        # Searches from nearby users land in the same cell; only one upstream call per cell is in flight
+        self.flights = SingleFlight()
+        self.async_flights = SingleFlight()
+        self._async_client = None
+        self._async_loop = None
+        self._background = set()
+
+    def cell(self, lat, lon):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def cell_center(self, cell):
+        return (cell[0] + 0.5) * self.cell_degrees, (cell[1] + 0.5) * self.cell_degrees
+
+    def cell_margin_km(self):
+        # Half-diagonal of a cell; longitude degrees shrink with latitude, so the equator is the worst case
+        return math.hypot(self.cell_degrees, self.cell_degrees) / 2 * 111.32
+
+    def overpass_request(self, cell, radius_km):
+        lat, lon = self.cell_center(cell)
+        radius_m = int(math.ceil((radius_km + self.cell_margin_km()) * 1000))
+        params = {'data': f'[out:json][timeout:25];node["amenity"="hospital"](around:{radius_m},{lat},{lon});out body;'}
+        return OVERPASS_URL, params, {}
+
+    def nominatim_request(self, cell, radius_km):
+        lat, lon = self.cell_center(cell)
+        box = nominatim_box(radius_km) + self.cell_degrees / 2
+        params = {
+            'q': 'hospital',
+            'format': 'json',
+            'limit': 50,
+            'viewbox': f'{lon-box},{lat+box},{lon+box},{lat-box}',
+            'bounded': 1
+        }
+        return NOMINATIM_URL, params, {'User-Agent': 'HealthBot/1.0'}
+
+    def fetch_cell(self, provider, cell, tier):
+        # Runs on the fetch pool; finishes and fills the cache even if the request stopped waiting
+        started = time.perf_counter()
+        try:
+            url, params, headers = provider.build(cell, tier)
+            response = http_session().get(url, params=params, headers=headers,
+                                          timeout=(HOSPITAL_CONNECT_TIMEOUT, HOSPITAL_TIMEOUT))
+            response.raise_for_status()
+            candidates = provider.parse(response.json())
+        except Exception as e:
+            provider.record(time.perf_counter() - started, e, isinstance(e, requests.exceptions.Timeout))
+            raise
+        provider.record(time.perf_counter() - started)
+        self.cache.set((provider.name, cell, tier), candidates)
+        return candidates
+
+    def async_client(self):
+        # httpx is only needed by the ASGI server; one pooled client per event loop
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            import httpx
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(HOSPITAL_TIMEOUT, connect=HOSPITAL_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=HOSPITAL_ASYNC_CONNECTIONS)
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def fetch_cell_async(self, provider, cell, tier):
+        import httpx
+        started = time.perf_counter()
+        try:
+            url, params, headers = provider.build(cell, tier)
+            response = await self.async_client().get(url, params=params, headers=headers)
+            response.raise_for_status()
+            candidates = provider.parse(response.json())
+        except Exception as e:
+            provider.record(time.perf_counter() - started, e, isinstance(e, httpx.TimeoutException))
+            raise
+        provider.record(time.perf_counter() - started)
+        self.cache.set((provider.name, cell, tier), candidates)
+        return candidates
+
+    def cached(self, provider, cell, tier):
+        # A cell cached for a wider radius also answers narrower searches
+        for cached_tier in [t for t in RADIUS_TIERS_KM if t >= tier] or [tier]:
+            candidates = self.cache.get((provider.name, cell, cached_tier))
+            if candidates is not None:
+                return candidates
+        return None
+
+    def merge(self, lat, lon, results, radius_km, limit):
+        # Overpass hospitals within the radius first, then Nominatim places fill the remaining slots
+        chosen = []
+        seen = set()
+        overpass = results.get('overpass')
+        if overpass is not None and len(overpass):
+            distances = haversine_km(lat, lon, overpass.lat, overpass.lon)
+            in_range = np.flatnonzero(distances <= radius_km)
+            for i in in_range[top_k(distances[in_range], limit)]:
+                chosen.append((overpass.records[i], distances[i]))
+                seen.add(overpass.keys[i])
+        nominatim = results.get('nominatim')
+        if len(chosen) < limit and nominatim is not None and len(nominatim):
+            distances = haversine_km(lat, lon, nominatim.lat, nominatim.lon)
+            in_range = np.flatnonzero(distances <= radius_km)
+            # At most len(seen) of the nearest places are repeats of Overpass hospitals
+            for i in in_range[top_k(distances[in_range], limit - len(chosen) + len(seen))]:
+                if len(chosen) >= limit:
+                    break
+                if nominatim.keys[i] not in seen:
+                    seen.add(nominatim.keys[i])
+                    chosen.append((nominatim.records[i], distances[i]))
+            chosen.sort(key=lambda item: item[1])
+        return [self.result(candidate, distance) for candidate, distance in chosen]
+
+    def settled(self, results, hospital_list, limit, pending):
+        # The list is full and no provider still pending outranks the ones that filled it
+        if len(hospital_list) < limit:
+            return False
+        for provider in self.providers:
+            if provider.name in results:
+                return True
+            if provider.name in pending:
+                return False
+        return True
+
+    def lookup(self, lat, lon, radius_km, limit):
+        """First phase of a search: offline index and cache.
+
+        Returns ``(answer, state)``; ``answer`` is ``(hospitals, source)`` when no upstream call
+        is needed, otherwise ``state`` carries what the upstream phase continues from.
+        """
+        if self.index is not None:
+            nearest = self.index.nearest(lat, lon, radius_km, limit)
+            return ([self.result(candidate, distance) for candidate, distance in nearest], 'offline'), None
+
+        cell = self.cell(lat, lon)
+        tier = radius_tier(radius_km)
+        results = {}
+        for provider in self.providers:
+            candidates = self.cached(provider, cell, tier)
+            if candidates is not None:
+                results[provider.name] = candidates
+        hospital_list = self.merge(lat, lon, results, radius_km, limit)
+        missing = {provider.name for provider in self.providers if provider.name not in results}
+        if not missing or self.settled(results, hospital_list, limit, missing):
+            return (hospital_list, 'cache'), None
+        return None, (cell, tier, results, hospital_list)
+
+    def callable_providers(self, results):
+        # Providers to query upstream: not answered from the cache and not behind an open circuit
+        providers = []
+        for provider in self.providers:
+            if provider.name in results:
+                continue
+            if not provider.breaker.allow():
+                provider.skipped += 1
+                continue
+            providers.append(provider)
+        return providers
+
+    def finish(self, results, hospital_list, errors, fetched):
+        for error in errors:
+            logger.warning(f"Hospital provider failed: {error}")
+        if not results:
+            raise HospitalSearchError('; '.join(errors) or 'All hospital providers are unavailable')
+        return hospital_list, 'upstream' if fetched else 'cache'
+
+    def search(self, lat, lon, radius_km=SEARCH_RADIUS_KM, limit=SEARCH_LIMIT):
+        """Returns ``(hospitals, source)`` with source 'offline', 'cache' or 'upstream'.
+
+        Providers missing from the cache are queried in parallel. The search returns as soon as
+        the results so far fill the list and no higher-priority provider is still pending, or
+        when ``HOSPITAL_LATENCY_BUDGET`` runs out, with whatever arrived; providers whose
+        circuit is open are skipped.
+        """
+        answer, state = self.lookup(lat, lon, radius_km, limit)
+        if answer is not None:
+            return answer
+        cell, tier, results, hospital_list = state
+
+        pending = {}
+        for provider in self.callable_providers(results):
+            future = self.flights.future(
+                (provider.name, cell, tier),
+                lambda provider=provider: provider.executor().submit(self.fetch_cell, provider, cell, tier)
+            )
+            pending[future] = provider
+        fetched = bool(pending)
+        errors = []
+        deadline = time.monotonic() + self.latency_budget
+        while pending and not self.settled(results, hospital_list, limit, {p.name for p in pending.values()}):
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                errors.extend(f"{provider.name} exceeded the {self.latency_budget}s budget" for provider in pending.values())
+                break
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    results[provider.name] = future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {str(e)}")
+            hospital_list = self.merge(lat, lon, results, radius_km, limit)
+        return self.finish(results, hospital_list, errors, fetched)
+
+    def start_fetch(self, provider, cell, tier):
+        task = asyncio.ensure_future(self.fetch_cell_async(provider, cell, tier))
+        # Late answers still fill the cache; keep the task referenced until it finishes
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def search_async(self, lat, lon, radius_km=SEARCH_RADIUS_KM, limit=SEARCH_LIMIT):
+        """``search`` for an event loop: upstream calls go through a non-blocking client, so
+        waiting on them holds no thread."""
+        answer, state = self.lookup(lat, lon, radius_km, limit)
+        if answer is not None:
+            return answer
+        cell, tier, results, hospital_list = state
+
+        pending = {}
+        for provider in self.callable_providers(results):
+            task = self.async_flights.future((provider.name, cell, tier),
+                                             lambda provider=provider: self.start_fetch(provider, cell, tier))
+            pending[task] = provider
+        fetched = bool(pending)
+        errors = []
+        deadline = time.monotonic() + self.latency_budget
+        while pending and not self.settled(results, hospital_list, limit, {p.name for p in pending.values()}):
+            done, _ = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                errors.extend(f"{provider.name} exceeded the {self.latency_budget}s budget" for provider in pending.values())
+                break
+            for task in done:
+                provider = pending.pop(task)
+                try:
+                    results[provider.name] = task.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {str(e)}")
+            hospital_list = self.merge(lat, lon, results, radius_km, limit)
+        for task in pending:
+            # Retrieved here so an abandoned failure is not reported as never retrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self.finish(results, hospital_list, errors, fetched)
+
+    def result(self, candidate, distance):
+        return {
+            'name': candidate['name'],
+            'address': candidate['address'],
+            'phone': candidate['phone'],
+            'distance': round(float(distance), 2)
+        }
+
+    def stats(self):
+        return {
+            'mode': 'offline' if self.index is not None else 'online',
+            'offline_hospitals': len(self.index.candidates) if self.index is not None else None,
+            'cell_degrees': self.cell_degrees,
+            'latency_budget_seconds': self.latency_budget,
+            'cache': self.cache.stats(),
+            'coalescing': {'threads': self.flights.stats(), 'async': self.async_flights.stats()},
+            'providers': {provider.name: provider.stats() for provider in self.providers}
+        }
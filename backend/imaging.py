@@ -0,0 +1,252 @@
+import io
+import os
+import tarfile
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from admission import check_deadline
+from batching import MicroBatcher
+
+IMAGE_SIZE = (224, 224)
+# 'pil' decodes straight from the upload stream (JPEG via draft mode); 'opencv' reads the
+# upload once and uses cv2.imdecode/cv2.resize
+IMAGE_DECODER = os.getenv('IMAGE_DECODER', 'pil')
+# Keras load_img defaults to nearest-neighbour, which the models were served with so far
+IMAGE_RESAMPLE = os.getenv('IMAGE_RESAMPLE', 'nearest')
+IMAGE_JPEG_DRAFT = os.getenv('IMAGE_JPEG_DRAFT', '1') == '1'
+# Multi-image studies: decode threads, and limits on what one upload or archive may contain
+IMAGE_DECODE_WORKERS = int(os.getenv('IMAGE_DECODE_WORKERS', 4))
+STUDY_MAX_IMAGES = int(os.getenv('STUDY_MAX_IMAGES', 64))
+STUDY_MAX_IMAGE_BYTES = int(os.getenv('STUDY_MAX_IMAGE_BYTES', 20 * 1024 * 1024))
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+ARCHIVE_CONTENT_TYPES = ('application/zip', 'application/x-zip-compressed', 'application/x-tar',
+                         'application/gzip', 'application/x-gzip', 'application/x-gtar')
+# Archive members are studied if their name or their first bytes say image; READMEs, reports
+# and the like that come along in an export are skipped instead of failing as invalid images
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+IMAGE_SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'BM', b'GIF87a', b'GIF89a', b'II*\x00', b'MM\x00*')
+
+PIL_RESAMPLE = {
+    'nearest': Image.NEAREST,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+    'box': Image.BOX
+}
+
+# float32 scale applied in place, so uint8 pixels never go through a float64 temporary
+PIXEL_SCALE = np.float32(1.0 / 255.0)
+
+
+def decode_with_pil(stream, size):
+    img = Image.open(stream)
+    if IMAGE_JPEG_DRAFT and img.format == 'JPEG':
+        # Let libjpeg downscale by 1/2, 1/4 or 1/8 while decoding; keeps the result >= size
+        img.draft('RGB', size)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if img.size != size:
+        img = img.resize(size, PIL_RESAMPLE.get(IMAGE_RESAMPLE, Image.NEAREST))
+    return np.asarray(img, dtype=np.uint8)
+
+
+def decode_with_opencv(stream, size):
+    import cv2
+
+    data = np.frombuffer(stream.read(), dtype=np.uint8)
+    img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError('Cannot decode image')
+    if img.shape[1::-1] != size:
+        interpolation = cv2.INTER_NEAREST if IMAGE_RESAMPLE == 'nearest' else cv2.INTER_AREA
+        img = cv2.resize(img, size, interpolation=interpolation)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+
+
+def decode_image(stream, size=IMAGE_SIZE):
+    # Returns an (H, W, 3) uint8 array; normalization happens later on the whole batch
+    if IMAGE_DECODER == 'opencv':
+        return decode_with_opencv(stream, size)
+    return decode_with_pil(stream, size)
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+_decode_executor = None
+_decode_executor_pid = None
+_decode_executor_lock = threading.Lock()
+
+
+def decode_executor():
+    # Created on first use in each worker process; pool threads do not survive a fork
+    global _decode_executor, _decode_executor_pid
+    with _decode_executor_lock:
+        if _decode_executor is None or _decode_executor_pid != os.getpid():
+            _decode_executor = ThreadPoolExecutor(max_workers=IMAGE_DECODE_WORKERS, thread_name_prefix='image-decode')
+            _decode_executor_pid = os.getpid()
+        return _decode_executor
+
+
+def is_archive(filename='', content_type=''):
+    return (filename or '').lower().endswith(ARCHIVE_EXTENSIONS) or \
+        (content_type or '').split(';')[0].strip().lower() in ARCHIVE_CONTENT_TYPES
+
+
+def is_image_member(name):
+    base = os.path.basename(name)
+    return bool(base) and not base.startswith('.') and '__MACOSX' not in name
+
+
+def is_image_data(name, data):
+    # Extensionless or misnamed members (common in scanner exports) are sniffed by magic bytes
+    if name.lower().endswith(IMAGE_EXTENSIONS):
+        return True
+    return data.startswith(IMAGE_SIGNATURES) or (data[:4] == b'RIFF' and data[8:12] == b'WEBP')
+
+
+def iter_zip_images(fileobj):
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise InvalidUpload(f'Invalid zip archive: {str(e)}')
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not is_image_member(info.filename):
+                continue
+            if info.file_size > STUDY_MAX_IMAGE_BYTES:
+                raise InvalidUpload(f'{info.filename} exceeds {STUDY_MAX_IMAGE_BYTES} bytes')
+            data = archive.read(info)
+            if is_image_data(info.filename, data):
+                yield info.filename, io.BytesIO(data)
+
+
+def iter_tar_images(fileobj):
+    # Stream mode reads members in order without seeking, so a tar body is never buffered whole
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode='r|*')
+    except tarfile.TarError as e:
+        raise InvalidUpload(f'Invalid tar archive: {str(e)}')
+    with archive:
+        try:
+            for member in archive:
+                if not member.isfile() or not is_image_member(member.name):
+                    continue
+                if member.size > STUDY_MAX_IMAGE_BYTES:
+                    raise InvalidUpload(f'{member.name} exceeds {STUDY_MAX_IMAGE_BYTES} bytes')
+                data = archive.extractfile(member).read()
+                if is_image_data(member.name, data):
+                    yield member.name, io.BytesIO(data)
+        except tarfile.TarError as e:
+            raise InvalidUpload(f'Invalid tar archive: {str(e)}')
+
+
+def iter_archive_images(stream, filename='', content_type=''):
+    zip_type = (content_type or '').split(';')[0].strip().lower() in ('application/zip', 'application/x-zip-compressed')
+    if filename.lower().endswith('.zip') or zip_type:
+        # Zip keeps its index at the end, so spool the body (to disk past 16 MB) before reading it
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as spooled:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                spooled.write(chunk)
+            spooled.seek(0)
+            yield from iter_zip_images(spooled)
+    else:
+        yield from iter_tar_images(stream)
+
+
+def iter_study_images(uploads):
+    # uploads: (filename, content_type, stream) triples; archives are expanded in place
+    count = 0
+    for filename, content_type, stream in uploads:
+        members = iter_archive_images(stream, filename, content_type) \
+            if is_archive(filename, content_type) else [(filename, stream)]
+        for name, image_stream in members:
+            count += 1
+            if count > STUDY_MAX_IMAGES:
+                raise InvalidUpload(f'A study may contain at most {STUDY_MAX_IMAGES} images')
+            yield name, image_stream
+
+
+def safe_decode(stream, size):
+    try:
+        return decode_image(stream, size), None
+    except (UnidentifiedImageError, ValueError, OSError):
+        return None, 'Invalid image file'
+
+
+class ImagePipeline:
+    """Decode uploads to uint8 and run concurrent requests through the CNN as one batch.
+
+    The batcher stacks uint8 images into a reused batch array; they are converted and scaled
+    to [0, 1] in a single pass into a pooled float32 buffer right before the forward pass.
+    """
+
+    def __init__(self, name, model, max_batch_size=8, max_wait_ms=10.0, enabled=True, size=IMAGE_SIZE):
+        self.model = model
+        self.size = size
+        self.batcher = MicroBatcher(
+            name, self.predict_batch,
+            max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, enabled=enabled, reuse_buffer=True
+        )
+        self._local = threading.local()
+
+    def float_buffer(self, shape):
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None or buf.shape[0] < shape[0] or buf.shape[1:] != shape[1:]:
+            buf = np.empty(shape, dtype=np.float32)
+            self._local.buffer = buf
+        return buf[:shape[0]]
+
+    def predict_batch(self, images):
+        batch = self.float_buffer(images.shape)
+        np.multiply(images, PIXEL_SCALE, out=batch)
+        return self.model.predict_on_batch(batch)
+
+    def predict(self, stream):
+        return self.batcher.predict(decode_image(stream, self.size))
+
+    def predict_study(self, images):
+        """Score ``(name, stream)`` pairs; returns ``(name, confidence, error)`` in input order.
+
+        Decoding runs on the shared decode pool while the calling thread runs the CNN on
+        whatever is already decoded, one ``max_batch_size`` chunk at a time. The study goes
+        straight to the model rather than through the batcher queue, since it already is a batch.
+        The request deadline is checked before each chunk; once it passes, the decodes still
+        queued are cancelled and DeadlineExceeded is raised.
+        """
+        executor = decode_executor()
+        batch_size = self.batcher.max_batch_size
+        pending = deque()
+        results = []
+        try:
+            for name, stream in images:
+                pending.append((name, executor.submit(safe_decode, stream, self.size)))
+                # Keep about two batches of decodes in flight ahead of the model
+                if len(pending) >= 2 * batch_size:
+                    results.extend(self._predict_decoded(pending, batch_size))
+            while pending:
+                results.extend(self._predict_decoded(pending, batch_size))
+        except BaseException:
+            for _, future in pending:
+                future.cancel()
+            raise
+        return results
+
+    def _predict_decoded(self, pending, batch_size):
+        check_deadline()
+        chunk = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+        decoded = [(name, future.result()) for name, future in chunk]
+        valid = [image for _, (image, error) in decoded if error is None]
+        confidences = iter(self.predict_batch(np.stack(valid)) if valid else [])
+        return [(name, None, error) if error else (name, float(next(confidences)[0]), None)
+                for name, (image, error) in decoded]
@@ -0,0 +1,67 @@
+import os
+import threading
+
+import numpy as np
+
+
+def interpreter_class():
+    # LiteRT is the standalone TFLite runtime; tf.lite.Interpreter is the fallback bundled with TensorFlow
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """Serves a converted ``.tflite`` model behind the ``predict_on_batch`` call the endpoints use.
+
+    The flatbuffer is memory-mapped from ``path``, so gunicorn workers on one node share its
+    pages. Interpreters are not thread-safe and keep per-shape tensor arenas, so each thread
+    gets its own, resized when the batch size changes. Quantized int8 inputs/outputs are
+    (de)quantized here, so callers always pass and get float32.
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.num_threads = num_threads
+        self._interpreter_class = interpreter_class()
+        # Validate the file and read the signature once at load time
+        interpreter = self._interpreter_class(model_path=path)
+        self.input_details = interpreter.get_input_details()[0]
+        self.output_details = interpreter.get_output_details()[0]
+        self.input_shape = tuple(self.input_details['shape_signature'])
+        self._local = threading.local()
+
+    def _interpreter(self, shape):
+        interpreter = getattr(self._local, 'interpreter', None)
+        if interpreter is None or self._local.pid != os.getpid():
+            # Also covers the main thread of a forked worker, which inherits the parent's locals
+            interpreter = self._interpreter_class(model_path=self.path, num_threads=self.num_threads)
+            self._local.pid = os.getpid()
+            self._local.shape = None
+        if self._local.shape != shape:
+            interpreter.resize_tensor_input(self.input_details['index'], shape)
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+            self._local.shape = shape
+        return interpreter
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch)
+        interpreter = self._interpreter(batch.shape)
+        dtype = self.input_details['dtype']
+        if dtype in (np.int8, np.uint8):
+            scale, zero_point = self.input_details['quantization']
+            info = np.iinfo(dtype)
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+        elif batch.dtype != dtype:
+            batch = batch.astype(dtype)
+        interpreter.set_tensor(self.input_details['index'], batch)
+        interpreter.invoke()
+        output = interpreter.get_tensor(self.output_details['index'])
+        if self.output_details['dtype'] in (np.int8, np.uint8):
+            scale, zero_point = self.output_details['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
@@ -0,0 +1,381 @@
+"""Out-of-process inference: model families hosted by dedicated processes on the same node.
+
+    INFERENCE_PROCESSES=chest_xray,skin_lesion gunicorn -c gunicorn.conf.py server:app
+    python inference_pool.py --families chest_xray,skin_lesion      # standalone supervisor
+
+Each family in INFERENCE_PROCESSES gets one inference process, listening on a Unix socket in
+INFERENCE_SOCKET_DIR. The web workers keep decoding, encoding and batching. Only the forward
+pass goes to the inference process, through ``RemoteModel``, which has the same
+``predict_on_batch`` as the Keras and TFLite models. Input batches are written to a shared
+memory segment owned by the calling thread, and only its name, shape and dtype cross the
+socket. Outputs are a few floats per row and come back over it. A crash or out-of-memory
+kill in an inference process fails only the requests it was running (503). The supervisor
+restarts the process, and the model loads again on its next request.
+"""
+import argparse
+import atexit
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import cpu
+cpu.configure_environment()  # Before NumPy: an inference process runs this file as its main module
+import numpy as np  # noqa: E402
+
+from admission import Overloaded  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_PROCESSES = [name.strip() for name in os.getenv('INFERENCE_PROCESSES', '').split(',') if name.strip()]
+INFERENCE_SOCKET_DIR = os.getenv('INFERENCE_SOCKET_DIR', os.path.join(tempfile.gettempdir(), 'healthbot-inference'))
+# Threads for TensorFlow/TFLite in each inference process; 0 splits the node's cores across the families
+INFERENCE_PROCESS_THREADS = int(os.getenv('INFERENCE_PROCESS_THREADS', 0))
+# How long a web worker keeps trying to reach an inference process that is (re)starting
+INFERENCE_CONNECT_TIMEOUT = float(os.getenv('INFERENCE_CONNECT_TIMEOUT', 10))
+# Model versions an inference process keeps loaded, so a rollback does not reload
+INFERENCE_MAX_MODELS = int(os.getenv('INFERENCE_MAX_MODELS', 2))
+
+
+class InferenceUnavailable(Overloaded):
+    def __init__(self, message):
+        super().__init__(message, 503, 2, 'inference_unavailable')
+
+
+def socket_path(family, socket_dir=INFERENCE_SOCKET_DIR):
+    return os.path.join(socket_dir, f'{family}.sock')
+
+
+def authkey():
+    # Set by the supervisor before gunicorn forks the workers; set it explicitly for a standalone pool
+    key = os.environ.get('INFERENCE_AUTHKEY')
+    if not key:
+        raise OSError('INFERENCE_AUTHKEY is not set; the inference pool has not started')
+    return key.encode()
+
+
+def attach(name):
+    segment = SharedMemory(name=name)
+    # The web worker created the segment and its resource tracker unlinks it; without this,
+    # the tracker of this process would unlink it too when the process exits
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+_remote_models = weakref.WeakSet()
+
+
+@atexit.register
+def _close_remote_models():
+    # Segments of threads that already ended (warm-up, retired batchers) are only reachable from
+    # here; unlinking them on exit keeps the resource tracker from reporting them as leaked
+    for model in list(_remote_models):
+        model.close()
+
+
+class RemoteModel:
+    """Client for a model served by the inference process of ``family``.
+
+    Each thread has its own connection and shared memory segment, created on first use and
+    grown when a larger batch comes along, and again after a fork. A connection found dead
+    (the inference process restarted since it was opened) is replaced and the call retried once.
+    """
+
+    def __init__(self, family, path, connect_timeout=INFERENCE_CONNECT_TIMEOUT):
+        self.family = family
+        self.path = path
+        self.address = socket_path(family)
+        self.connect_timeout = connect_timeout
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.reconnects = 0
+        self._local = threading.local()
+        # Bumped by close(), so threads drop the connections and segments it released
+        self._generation = 0
+        # Every thread's connection and segment, so close() can release those of threads it is not running on
+        self._open = set()
+        self._open_pid = os.getpid()
+        self._open_lock = threading.Lock()
+        _remote_models.add(self)
+
+    def _track(self, resource, add=True):
+        with self._open_lock:
+            if self._open_pid != os.getpid():
+                self._open_pid = os.getpid()
+                self._open = set()
+            if add:
+                self._open.add(resource)
+            else:
+                self._open.discard(resource)
+
+    def _channel(self):
+        owner = (os.getpid(), self._generation)
+        if getattr(self._local, 'owner', None) != owner:
+            # A forked worker inherits the parent's locals but must not share its socket or segment
+            self._local.owner = owner
+            self._local.conn = None
+            self._local.segment = None
+        if self._local.conn is None:
+            deadline = time.monotonic() + self.connect_timeout
+            while True:
+                try:
+                    self._local.conn = Client(self.address, family='AF_UNIX', authkey=authkey())
+                    break
+                except (OSError, EOFError) as e:
+                    if time.monotonic() >= deadline:
+                        raise InferenceUnavailable(f'{self.family} inference process unavailable: {str(e)}')
+                    time.sleep(0.1)
+            self._track(self._local.conn)
+            self.reconnects += 1
+        return self._local.conn
+
+    def _segment(self, nbytes):
+        segment = self._local.segment
+        if segment is None or segment.size < nbytes:
+            if segment is not None:
+                self._release(segment)
+            segment = self._local.segment = SharedMemory(create=True, size=max(nbytes, 1))
+            self._track(segment)
+        return segment
+
+    def _release(self, resource):
+        self._track(resource, add=False)
+        resource.close()
+        if isinstance(resource, SharedMemory):
+            resource.unlink()
+
+    def _disconnect(self):
+        # The next connection may reach a new process; it gets a fresh segment too
+        conn, self._local.conn = self._local.conn, None
+        segment, self._local.segment = self._local.segment, None
+        for resource in (conn, segment):
+            if resource is not None:
+                self._release(resource)
+
+    def predict_on_batch(self, batch):
+        batch = np.ascontiguousarray(batch)
+        self.calls += 1
+        for attempt in range(2):
+            conn = self._channel()
+            segment = self._segment(batch.nbytes)
+            np.ndarray(batch.shape, dtype=batch.dtype, buffer=segment.buf)[...] = batch
+            try:
+                conn.send((self.path, segment.name, batch.shape, batch.dtype.str))
+                status, result = conn.recv()
+                break
+            except (BrokenPipeError, ConnectionResetError, EOFError) as e:
+                # Stale after a restart, or the process died mid-call: reconnect (waiting for
+                # the supervisor to bring it back) and retry once
+                self._disconnect()
+                if attempt:
+                    self.errors += 1
+                    raise InferenceUnavailable(f'{self.family} inference process failed: {str(e) or type(e).__name__}')
+                self.retries += 1
+            except OSError as e:
+                self.errors += 1
+                self._disconnect()
+                raise InferenceUnavailable(f'{self.family} inference process failed: {str(e) or type(e).__name__}')
+        if status != 'ok':
+            self.errors += 1
+            raise RuntimeError(result)
+        return result
+
+    def close(self):
+        """Closes every thread's connection and unlinks its segment; the registry calls it on a retired bundle."""
+        with self._open_lock:
+            self._generation += 1
+            resources = self._open if self._open_pid == os.getpid() else set()
+            self._open = set()
+        for resource in resources:
+            try:
+                resource.close()
+                if isinstance(resource, SharedMemory):
+                    resource.unlink()
+            except (OSError, BufferError):
+                pass
+
+    def stats(self):
+        return {'family': self.family, 'path': self.path, 'calls': self.calls, 'errors': self.errors,
+                'retries': self.retries, 'connections': self.reconnects}
+
+
+def serve(family, address):
+    """Entry point of an inference process: load models on request and answer forward passes."""
+    import frameworks
+    from inference import TFLiteModel
+
+    models = OrderedDict()
+    lock = threading.Lock()
+
+    def model_for(path):
+        with lock:
+            if path not in models:
+                logger.info(f"Loading {os.path.basename(path)} for {family}")
+                models[path] = TFLiteModel(path, num_threads=cpu.TFLITE_NUM_THREADS) if path.endswith('.tflite') \
+                    else frameworks.keras_load_model(path, compile=False)
+                while len(models) > INFERENCE_MAX_MODELS:
+                    models.popitem(last=False)
+            models.move_to_end(path)
+            return models[path]
+
+    def handle(conn):
+        segment = None
+        try:
+            while True:
+                try:
+                    path, name, shape, dtype = conn.recv()
+                except EOFError:
+                    break
+                try:
+                    if segment is None or segment.name != name:
+                        if segment is not None:
+                            segment.close()
+                        segment = attach(name)
+                    batch = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+                    try:
+                        output = np.asarray(model_for(path).predict_on_batch(batch))
+                    finally:
+                        # A live view of the buffer would keep the segment from closing
+                        del batch
+                    conn.send(('ok', output))
+                except Exception as e:
+                    logger.error(f"{family} inference failed: {str(e)}", exc_info=True)
+                    conn.send(('error', f'{type(e).__name__}: {str(e)}'))
+        finally:
+            conn.close()
+            if segment is not None:
+                segment.close()
+
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family='AF_UNIX', authkey=authkey())
+    os.chmod(address, 0o600)
+    logger.info(f"Inference process {os.getpid()} serving {family} on {address}")
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            # A failed handshake (wrong authkey) must not stop the process
+            logger.warning(f"Rejected inference connection: {str(e)}")
+            continue
+        threading.Thread(target=handle, args=(conn,), name=f'inference-{family}', daemon=True).start()
+
+
+class InferencePool:
+    """Starts one inference process per family and restarts any that exit."""
+
+    def __init__(self, families, socket_dir=INFERENCE_SOCKET_DIR, threads=INFERENCE_PROCESS_THREADS):
+        self.families = list(families)
+        self.socket_dir = socket_dir
+        self.threads = threads or max(1, len(cpu.CPUS) // max(1, len(self.families)))
+        self.processes = {}
+        self.started_at = {}
+        self.restarts = {family: 0 for family in self.families}
+        self._stop = threading.Event()
+        self._monitor = None
+
+    def _spawn(self, family):
+        # The process sizes its own thread pools; drop the ones a web worker parent may have set
+        env = {key: value for key, value in os.environ.items()
+               if key not in ('OMP_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS')}
+        env.update(CPU_THREADS=str(self.threads), WEB_CONCURRENCY='1')
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', family, '--socket-dir', self.socket_dir],
+            env=env
+        )
+        self.processes[family] = process
+        self.started_at[family] = time.monotonic()
+        logger.info(f"Started {family} inference process {process.pid}")
+
+    def start(self):
+        os.makedirs(self.socket_dir, mode=0o700, exist_ok=True)
+        os.environ.setdefault('INFERENCE_AUTHKEY', secrets.token_hex(16))
+        for family in self.families:
+            self._spawn(family)
+        self._monitor = threading.Thread(target=self._watch, name='inference-pool', daemon=True)
+        self._monitor.start()
+        return self
+
+    def _watch(self):
+        backoff = {family: 0.5 for family in self.families}
+        while not self._stop.wait(0.5):
+            for family, process in list(self.processes.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+                uptime = time.monotonic() - self.started_at[family]
+                # Back off on a crash loop; a process that ran for a minute restarts at once
+                backoff[family] = 0.5 if uptime > 60 else min(backoff[family] * 2, 30.0)
+                logger.error(f"{family} inference process {process.pid} exited with code {code} "
+                             f"after {uptime:.1f}s; restarting in {backoff[family]:.1f}s")
+                if self._stop.wait(backoff[family]):
+                    return
+                self.restarts[family] += 1
+                self._spawn(family)
+
+    def stop(self):
+        self._stop.set()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def stats(self):
+        return {
+            family: {'pid': process.pid, 'alive': process.poll() is None, 'restarts': self.restarts[family],
+                     'uptime_seconds': round(time.monotonic() - self.started_at[family], 1)}
+            for family, process in self.processes.items()
+        }
+
+
+def start_supervisor(families):
+    """Runs the pool in a process of its own. The gunicorn master reaps every child that exits,
+    so a pool inside it could restart the inference processes but not see their exit codes."""
+    os.environ.setdefault('INFERENCE_AUTHKEY', secrets.token_hex(16))
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), '--families', ','.join(families)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the inference processes for out-of-process model families.')
+    parser.add_argument('--families', default=','.join(INFERENCE_PROCESSES))
+    parser.add_argument('--socket-dir', default=INFERENCE_SOCKET_DIR)
+    parser.add_argument('--threads', type=int, default=INFERENCE_PROCESS_THREADS)
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.serve:
+        serve(args.serve, socket_path(args.serve, args.socket_dir))
+        return
+    families = [name.strip() for name in args.families.split(',') if name.strip()]
+    if not families:
+        parser.error('no families given (--families or INFERENCE_PROCESSES)')
+    if 'INFERENCE_AUTHKEY' not in os.environ:
+        parser.error('set INFERENCE_AUTHKEY to the same value here and in the web workers')
+    pool = InferencePool(families, args.socket_dir, args.threads).start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            count = self._count
+        # Cumulative "less than or equal" buckets, Prometheus style
+        buckets = {}
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+        return {'buckets': buckets, 'sum': total, 'count': count}
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+class Metrics:
+    """Per-process histograms, counters and gauges with labels, rendered in the Prometheus
+    text format.
+
+    Collectors registered with ``add_collector`` are called at scrape time and yield
+    ``(name, kind, help, labels, value)`` for numbers other components already keep (cache
+    counters, provider histograms); ``value`` is a number or a ``Histogram``.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._series = {}
+        self._meta = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(labels.items()))
+        histogram = self._series.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._series.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def bind(self, route):
+        # Stages timed on this thread are attributed to ``route`` until the next bind
+        self._local.route = route
+
+    @contextmanager
+    def stage(self, name):
+        route = getattr(self._local, 'route', None)
+        if route is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram('stage_seconds', route=route, stage=name).observe(time.perf_counter() - started)
+
+    def samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        for (name, labels), value in series:
+            kind, help_text = self._meta.get(name, ('histogram' if isinstance(value, Histogram) else 'gauge', ''))
+            yield name, kind, help_text, dict(labels), value
+        for collector in self._collectors:
+            yield from collector()
+
+    def render(self):
+        families = {}
+        for name, kind, help_text, labels, value in self.samples():
+            families.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+        lines = []
+        for name, (kind, help_text, samples) in sorted(families.items()):
+            full_name = f'{self.prefix}_{name}'
+            if help_text:
+                lines.append(f'# HELP {full_name} {help_text}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            for labels, value in samples:
+                if isinstance(value, Histogram):
+                    snapshot = value.snapshot()
+                    for bound, count in snapshot['buckets'].items():
+                        lines.append(f'{full_name}_bucket{format_labels({**labels, "le": bound})} {count}')
+                    lines.append(f'{full_name}_sum{format_labels(labels)} {snapshot["sum"]}')
+                    lines.append(f'{full_name}_count{format_labels(labels)} {snapshot["count"]}')
+                elif value is not None:
+                    lines.append(f'{full_name}{format_labels(labels)} {float(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def process_memory(pid='self'):
+    # Resident and proportional set sizes in KiB from /proc. Pss splits shared pages between the
+    # processes mapping them, so summing Pss over gunicorn workers gives the real footprint.
+    memory = {}
+    for path, fields in ((f'/proc/{pid}/status', ('VmRSS', 'VmHWM')),
+                         (f'/proc/{pid}/smaps_rollup', ('Pss', 'Shared_Clean', 'Shared_Dirty',
+                                                         'Private_Clean', 'Private_Dirty'))):
+        try:
+            with open(path) as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    if key in fields:
+                        memory[key] = int(value.split()[0])
+        except (OSError, ValueError):
+            continue
+    return memory
@@ -0,0 +1,83 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's Python stack from a background thread.
+
+    Costs nothing until started and roughly one stack walk per thread per ``interval`` while
+    running, so it can be switched on in a live worker. Samples are kept as collapsed stacks
+    (``outer;inner count``), the input format of flamegraph.pl and speedscope. A run stops by
+    itself after ``max_seconds``.
+    """
+
+    def __init__(self, max_seconds=300.0):
+        self.max_seconds = max_seconds
+        self.samples = Counter()
+        self.interval = None
+        self.started_at = None
+        self.stopped_at = None
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.01, seconds=None):
+        with self._lock:
+            if self.running:
+                return False
+            self.samples = Counter()
+            self.sample_count = 0
+            self.interval = interval
+            self.started_at = time.time()
+            self.stopped_at = None
+            self._stop.clear()
+            seconds = min(seconds or self.max_seconds, self.max_seconds)
+            self._thread = threading.Thread(target=self._run, args=(seconds,), name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return self.folded()
+
+    def _run(self, seconds):
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+            self.sample_count += 1
+        self.stopped_at = time.time()
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common()) + '\n'
+
+    def status(self):
+        return {
+            'running': self.running,
+            'pid': os.getpid(),
+            'interval_seconds': self.interval,
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at,
+            'samples': self.sample_count,
+            'stacks': len(self.samples),
+            'max_seconds': self.max_seconds
+        }
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ModelBundle:
+    """Everything one endpoint needs from a single model version (model, encoders, batcher...)."""
+
+    def __init__(self, name, version, components, signature, source=None):
+        self.name = name
+        self.version = version
+        self.source = source
+        self.signature = signature
+        self.loaded_at = time.time()
+        for key, value in components.items():
+            setattr(self, key, value)
+
+    def close(self):
+        # The batcher thread references the model; stop it so a retired bundle can be freed,
+        # then release what the model holds open (RemoteModel connections and segments)
+        for component in (getattr(self, 'batcher', None), getattr(self, 'model', None)):
+            if component is not None and hasattr(component, 'close'):
+                component.close()
+
+
+class ModelFamily:
+    def __init__(self, name, files, loader, smoke=None):
+        self.name = name
+        self.files = files
+        self.loader = loader
+        self.smoke = smoke
+        self.current = None
+        self.previous = None
+        self.source = None
+        self.held_signature = None
+        self.failed_source = None
+        self.lock = threading.Lock()
+        self.status = {
+            'state': 'pending', 'version': None, 'previous_version': None,
+            'load_seconds': None, 'warmup_seconds': None, 'error': None
+        }
+
+
+class ModelRegistry:
+    """Versioned model bundles that can be reloaded and swapped without restarting workers.
+
+    A version is a directory under ``versions_dir``; files it does not contain fall back to
+    ``base_dir``. A new bundle is loaded and smoke-tested next to the serving one and only
+    then swapped in, so requests already holding the old bundle finish on it. The replaced
+    bundle is kept for ``rollback``; the one it replaced is closed.
+    """
+
+    def __init__(self, base_dir, versions_dir=None, base_version=None):
+        self.base_dir = base_dir
+        self.versions_dir = versions_dir or os.path.join(base_dir, 'versions')
+        self.base_version = base_version
+        self.active_versions_path = os.path.join(self.versions_dir, 'active.json')
+        self.families = {}
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='model-reload')
+        self._watcher = None
+        self._watcher_pid = None
+
+    def register(self, name, files, loader, smoke=None):
+        self.families[name] = ModelFamily(name, files, loader, smoke)
+
+    def resolve(self, filename, version=None):
+        dirs = [os.path.join(self.versions_dir, version), self.base_dir] if version else [self.base_dir]
+        for model_dir in dirs:
+            path = os.path.join(model_dir, filename)
+            if os.path.exists(path):
+                return path
+        path = os.path.join(dirs[0], filename)
+        logger.error(f"Missing file: {path}")
+        raise FileNotFoundError(f"Missing file: {path}")
+
+    def signature(self, family, version=None):
+        parts = []
+        for filename in family.files:
+            try:
+                stat = os.stat(self.resolve(filename, version))
+                parts.append(f'{filename}:{stat.st_mtime_ns}:{stat.st_size}')
+            except FileNotFoundError:
+                parts.append(f'{filename}:missing')
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def version_label(self, version, signature):
+        if version:
+            return version
+        return self.base_version or f'base-{signature[:8]}'
+
+    def _load(self, family, version, smoke=True):
+        if version and not os.path.isdir(os.path.join(self.versions_dir, version)):
+            raise FileNotFoundError(f"Unknown model version: {version}")
+        signature = self.signature(family, version)
+        started = time.perf_counter()
+        components = family.loader(lambda filename: self.resolve(filename, version))
+        bundle = ModelBundle(family.name, self.version_label(version, signature), components, signature, version)
+        load_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        if family.smoke and smoke:
+            if family.current is None:
+                family.status['state'] = 'warming'
+            try:
+                family.smoke(bundle)
+            except Exception:
+                bundle.close()
+                raise
+        warmup_seconds = round(time.perf_counter() - started, 3) if family.smoke and smoke else None
+        return bundle, round(load_seconds, 3), warmup_seconds
+
+    def _swap(self, family, bundle, version, load_seconds, warmup_seconds):
+        # Single reference assignment: readers see either the old or the new bundle, never a mix
+        retired = family.previous
+        family.previous = family.current
+        family.current = bundle
+        family.source = version
+        if retired is not None and retired is not family.previous and retired is not bundle:
+            retired.close()
+        family.status.update({
+            'state': 'ready', 'version': bundle.version,
+            'previous_version': family.previous.version if family.previous else None,
+            'load_seconds': load_seconds, 'warmup_seconds': warmup_seconds, 'error': None
+        })
+        logger.info(f"Model {family.name} serving version {bundle.version} "
+                    f"(load {load_seconds}s, warm-up {warmup_seconds}s)")
+
+    def get(self, name):
+        family = self.families[name]
+        bundle = family.current
+        if bundle is not None:
+            return bundle
+        with family.lock:
+            if family.current is None:
+                family.status['state'] = 'loading'
+                version = self.active_versions().get(name)
+                try:
+                    self._swap_loaded(family, version)
+                except Exception as e:
+                    family.status.update({'state': 'failed', 'error': str(e)})
+                    raise
+            return family.current
+
+    def _swap_loaded(self, family, version, smoke=True):
+        bundle, load_seconds, warmup_seconds = self._load(family, version, smoke)
+        self._swap(family, bundle, version, load_seconds, warmup_seconds)
+        family.held_signature = None
+
+    def preload(self, name):
+        # Load without the smoke pass, for a parent process that forks workers afterwards:
+        # running inference here would start framework thread pools that do not survive fork
+        family = self.families[name]
+        with family.lock:
+            if family.current is None:
+                version = self.active_versions().get(name)
+                try:
+                    self._swap_loaded(family, version, smoke=False)
+                except Exception as e:
+                    family.status.update({'state': 'failed', 'error': str(e)})
+                    raise
+            return family.current
+
+    def warm(self, name):
+        # Smoke pass for a bundle that was preloaded, or load it if it is not there yet
+        family = self.families[name]
+        bundle = self.get(name)
+        if family.smoke and family.status['warmup_seconds'] is None:
+            started = time.perf_counter()
+            family.smoke(bundle)
+            family.status['warmup_seconds'] = round(time.perf_counter() - started, 3)
+        return bundle
+
+    def reload(self, name, version=None):
+        family = self.families[name]
+        with family.lock:
+            try:
+                self._swap_loaded(family, version)
+            except Exception as e:
+                logger.error(f"Reload of {name} (version {version or 'base'}) failed: {str(e)}", exc_info=True)
+                family.status['error'] = str(e)
+                if family.current is None:
+                    family.status['state'] = 'failed'
+                raise
+            return family.current
+
+    def reload_async(self, name, version=None):
+        return self._executor.submit(self.reload, name, version)
+
+    def rollback(self, name):
+        family = self.families[name]
+        with family.lock:
+            if family.previous is None:
+                raise LookupError(f"No previous version of {name} to roll back to")
+            family.current, family.previous = family.previous, family.current
+            family.source = family.current.source
+            # Keep the watcher from re-loading the files we just rolled back from
+            family.held_signature = self.signature(family, family.source)
+            family.status.update({
+                'state': 'ready', 'version': family.current.version,
+                'previous_version': family.previous.version, 'error': None
+            })
+            logger.info(f"Model {name} rolled back to version {family.current.version}")
+            return family.current
+
+    def status(self):
+        return {name: dict(family.status) for name, family in self.families.items()}
+
+    def active_versions(self):
+        # Optional {"family": "version"} pin file, shared by every worker on the node
+        try:
+            with open(self.active_versions_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning(f"Ignoring malformed {self.active_versions_path}: {str(e)}")
+            return {}
+
+    def check_for_updates(self):
+        active = self.active_versions()
+        for name, family in self.families.items():
+            if family.current is None:
+                continue
+            version = active.get(name, family.source)
+            signature = self.signature(family, version)
+            if version == family.source and signature in (family.current.signature, family.held_signature):
+                continue
+            if family.failed_source == (version, signature):
+                continue
+            logger.info(f"Detected new files for {name} (version {version or 'base'}), reloading")
+            try:
+                self.reload(name, version)
+                family.failed_source = None
+            except Exception:
+                # Already logged by reload(); keep serving the current bundle until the files change again
+                family.failed_source = (version, signature)
+
+    def start_watcher(self, interval):
+        if interval <= 0:
+            return
+        if self._watcher is not None and self._watcher.is_alive() and self._watcher_pid == os.getpid():
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                self.check_for_updates()
+
+        self._watcher_pid = os.getpid()
+        self._watcher = threading.Thread(target=watch, name='model-watcher', daemon=True)
+        self._watcher.start()
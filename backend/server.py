@@ -1,31 +1,55 @@
 import os
+import functools
+import hashlib
+import json
 import logging
+import math
+import threading
+import time
+from contextlib import ExitStack
+SERVER_IMPORT_STARTED = time.perf_counter()
+import cpu
+cpu.configure_environment()  # Thread pools and oneDNN are fixed when NumPy/TensorFlow load
 import numpy as np
-import pandas as pd
-import tensorflow as tf
 import warnings
-import xgboost as xgb
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 import pickle
-import joblib
-import requests
-from groq import Groq
 from dotenv import load_dotenv
-from keras.models import load_model
-from keras.preprocessing.image import img_to_array, load_img
-from functools import lru_cache
+from PIL import UnidentifiedImageError
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
+import frameworks
+from admission import (
+    AdmissionControl, Overloaded, check_deadline, current_deadline, deadline_scope, parse_limits, request_deadline
+)
+from batching import MicroBatcher
+from cache import LookupTable, PredictionCache, SingleFlight
+from metrics import Metrics, process_memory
+from profiler import SamplingProfiler
+from registry import ModelRegistry
+from inference import TFLiteModel
+from inference_pool import INFERENCE_PROCESSES, InferencePool, RemoteModel
+from subsystems import INFERENCE_BACKEND, MODEL_SUBSYSTEMS, PRELOADED_MODELS, SUBSYSTEMS
+from hospitals import (
+    HOSPITAL_CACHE_TTL, HOSPITAL_MAX_LIMIT, HOSPITAL_MAX_RADIUS_KM, SEARCH_LIMIT, SEARCH_RADIUS_KM, HospitalFinder,
+    HospitalSearchError
+)
+from imaging import ImagePipeline, InvalidUpload, decode_image, is_archive, iter_study_images
+from encoders import (
+    SYMPTOM_MAPPING, DiabetesEncoder, HeartDiseaseEncoder, InvalidInput, MentalHealthEncoder, SymptomEncoder
+)
 
-# Suppress TensorFlow warnings
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+# Suppress TensorFlow warnings; TensorFlow itself is imported by the first Keras model load
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-tf.get_logger().setLevel('ERROR')
 warnings.filterwarnings('ignore', category=UserWarning, module='tensorflow')
 
 # Initialize Flask app
 app = Flask(__name__)
 # Update with your actual Netlify URL
-CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "https://healthbot007.netlify.app"]}})
+CORS_ORIGINS = ["http://localhost:3000", "https://healthbot007.netlify.app"]
+CORS(app, resources={r"/*": {"origins": CORS_ORIGINS}})
 
 # Setup logging
 logging.basicConfig(
@@ -37,159 +61,369 @@ logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
+
+# Subsystem of each gated view; SUBSYSTEMS and the model families are resolved in subsystems.py
+ROUTE_SUBSYSTEMS = {
+    'predict_disease': 'disease',
+    'predict_diabetes': 'tabular',
+    'predict_heart_disease': 'tabular',
+    'predict_mental_health': 'tabular',
+    'predict_chest_disease': 'images',
+    'predict_cancer': 'images',
+    'find_hospitals': 'hospitals',
+    'hospital_stats': 'hospitals'
+}
+
 GROQ_API_KEY = os.getenv('REACT_APP_GROQ_API_KEY')  # Fix: Use GROQ_API_KEY, not REACT_APP_GROQ_API_KEY
-if not GROQ_API_KEY:
-    logger.error("GROQ_API_KEY not found")
-    raise ValueError("GROQ_API_KEY is required")
-client = Groq(api_key=GROQ_API_KEY)
+if 'llm' in SUBSYSTEMS and not GROQ_API_KEY:
+    logger.warning("GROQ_API_KEY not found; the Groq client is unavailable")
+_groq_client = None
+
+def groq_client():
+    # Created on first use: the SDK import costs a few hundred milliseconds and no route needs it yet
+    global _groq_client
+    if 'llm' not in SUBSYSTEMS or not GROQ_API_KEY:
+        raise RuntimeError("The Groq client needs SUBSYSTEMS to include llm and GROQ_API_KEY to be set")
+    if _groq_client is None:
+        _groq_client = frameworks.load('groq').Groq(api_key=GROQ_API_KEY)
+    return _groq_client
 
 # Define directories
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_DIR = os.path.join(BASE_DIR, 'models')
+MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(BASE_DIR, 'models'))
+
+# Micro-batching for the tabular risk models
+BATCHING_ENABLED = os.getenv('BATCHING_ENABLED', '1') == '1'
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 32))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', 5))
+# Concurrent image uploads share one CNN call per window
+IMAGE_BATCH_MAX_SIZE = int(os.getenv('IMAGE_BATCH_MAX_SIZE', 8))
+IMAGE_BATCH_MAX_WAIT_MS = float(os.getenv('IMAGE_BATCH_MAX_WAIT_MS', 10))
+# Rows per vectorized chunk on the /predict/<model>/batch endpoints
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', 512))
+# Only for disease models trained on sparse input: XGBoost reads absent CSR entries as missing, not 0
+DISEASE_SPARSE_INPUT = os.getenv('DISEASE_SPARSE_INPUT', '0') == '1'
+
+TFLITE_NUM_THREADS = cpu.TFLITE_NUM_THREADS
+
+# Result cache for the tabular risk models, keyed on the encoded row and model version;
+# PREDICTION_CACHE_URL (redis://host:6379/0) adds a tier shared by all workers
+PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', '1') == '1'
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 10000))
+PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 3600))
+PREDICTION_CACHE_URL = os.getenv('PREDICTION_CACHE_URL')
+# Precompute mental health predictions for every whole-year age and category combination at load
+MENTAL_HEALTH_LOOKUP_TABLE = os.getenv('MENTAL_HEALTH_LOOKUP_TABLE', '1') == '1'
+LOOKUP_TABLE_BATCH = 4096
 
 # Symptom list aligned with frontend
 SYMPTOM_FILES = ['fever', 'headache', 'cough', 'diarrhea', 'vomiting', 'shortnessofbreath', 'painchest', 'fatigue', 'chills', 'soretotouch']
 
-# Lazy load models and preprocessors
-@lru_cache(maxsize=1)
-def load_xgb_model():
-    model_path = os.path.join(MODEL_DIR, 'xgb_model_streamlined.pkl')
-    if not os.path.exists(model_path):
-        logger.error(f"Missing file: {model_path}")
-        raise FileNotFoundError(f"Missing file: {model_path}")
-    with open(model_path, 'rb') as f:
-        logger.info("Loading XGBoost model")
-        return pickle.load(f)
+# Load the whole model set in a thread pool at startup instead of on first request
+EAGER_LOAD = os.getenv('EAGER_LOAD', '0') == '1'
+WARMUP_WORKERS = int(os.getenv('WARMUP_WORKERS', 4))
+# Seconds between checks of the model files for hot reload (0 disables the watcher)
+MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', 0))
+# Token for the /admin/models endpoints; they are disabled when unset
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Longest a sampling profiler run may last before it stops by itself
+PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 300))
+
+# Admission control, per worker process: at most <concurrent> requests of a route run at once and
+# <queued> more wait up to ADMISSION_MAX_WAIT_MS; the rest get 429/503 with Retry-After.
+# ADMISSION_LIMITS overrides entries by view name, e.g. "predict_cancer=1:2,find_hospitals=64:256"
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1') == '1'
+ADMISSION_MAX_WAIT_MS = float(os.getenv('ADMISSION_MAX_WAIT_MS', 5000))
+# Threads serving requests in a worker: gunicorn's gthread pool (GUNICORN_THREADS) or the ASGI
+# adapter's (ASGI_WSGI_WORKERS), 8 by default. The default limits are sized to it, so the gates of
+# the slow routes fill while the cheap routes still have threads left.
+REQUEST_THREADS = max(1, int(os.getenv('GUNICORN_THREADS', os.getenv('ASGI_WSGI_WORKERS', 8))))
+DEFAULT_ADMISSION_LIMITS = {
+    'predict_disease': (REQUEST_THREADS, REQUEST_THREADS),
+    'predict_diabetes': (REQUEST_THREADS, REQUEST_THREADS),
+    'predict_heart_disease': (REQUEST_THREADS, REQUEST_THREADS),
+    'predict_mental_health': (REQUEST_THREADS, REQUEST_THREADS),
+    'predict_batch': (max(1, REQUEST_THREADS // 4), max(1, REQUEST_THREADS // 4)),
+    'predict_chest_disease': (max(1, min(IMAGE_BATCH_MAX_SIZE, REQUEST_THREADS // 2)), max(1, REQUEST_THREADS // 4)),
+    'predict_cancer': (max(1, min(IMAGE_BATCH_MAX_SIZE, REQUEST_THREADS // 2)), max(1, REQUEST_THREADS // 4)),
+    # The async route in ASGI mode waits for a slot on the event loop, not on a thread
+    'find_hospitals': (REQUEST_THREADS, 4 * REQUEST_THREADS)
+}
+# Deadline of a gated request unless the client sends X-Request-Timeout-Ms (capped at the maximum);
+# work still queued for a model when it passes is dropped
+REQUEST_TIMEOUT_MS = float(os.getenv('REQUEST_TIMEOUT_MS', 30000))
+REQUEST_MAX_TIMEOUT_MS = float(os.getenv('REQUEST_MAX_TIMEOUT_MS', 60000))
+
+# Request, stage and component metrics for GET /metrics (per worker process)
+metrics = Metrics('healthbot')
+stage = metrics.stage
+metrics.describe('request_seconds', 'histogram', 'Request latency by route, method and status.')
+metrics.describe('requests_in_flight', 'gauge', 'Requests being handled by this worker.')
+metrics.describe('stage_seconds', 'histogram', 'Time in each pipeline stage of a route.')
+profiler = SamplingProfiler(PROFILER_MAX_SECONDS)
+admission_control = AdmissionControl(
+    {**DEFAULT_ADMISSION_LIMITS, **parse_limits(os.getenv('ADMISSION_LIMITS'))},
+    max_wait=ADMISSION_MAX_WAIT_MS / 1000.0,
+    enabled=ADMISSION_ENABLED
+)
+
+def shed_response(error):
+    logger.warning(f"Shed {request.endpoint} request ({error.reason}): {str(error)}")
+    response = jsonify({'error': str(error), 'reason': error.reason})
+    response.status_code = error.status
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def admission(view):
+    """Runs the view under its route's admission gate and the request's deadline.
 
-@lru_cache(maxsize=1)
-def load_label_encoder():
-    le_path = os.path.join(MODEL_DIR, 'label_encoder.pkl')
-    if not os.path.exists(le_path):
-        logger.error(f"Missing file: {le_path}")
-        raise FileNotFoundError(f"Missing file: {le_path}")
-    with open(le_path, 'rb') as f:
-        logger.info("Loading label encoder")
+    A streamed response keeps its slot until the server closes it, since its body does the
+    work; the generator re-enters the deadline with ``deadline_scope``.
+    """
+    @functools.wraps(view)
+    def admitted_view(*args, **kwargs):
+        deadline = request_deadline(request.headers.get('X-Request-Timeout-Ms'), request.headers.get('X-Request-Start'),
+                                    REQUEST_TIMEOUT_MS, REQUEST_MAX_TIMEOUT_MS)
+        slot = ExitStack()
+        try:
+            slot.enter_context(admission_control.admit(request.endpoint, deadline))
+            response = view(*args, **kwargs)
+        except Overloaded as e:
+            slot.close()
+            return shed_response(e)
+        except BaseException:
+            slot.close()
+            raise
+        if isinstance(response, Response) and response.is_streamed:
+            response.call_on_close(slot.close)
+        else:
+            slot.close()
+        return response
+    return admitted_view
+
+def load_keras_file(path):
+    # Inference only: no optimizer or loss, so the training stack is never compiled
+    logger.info(f"Loading Keras model {os.path.basename(path)}")
+    return frameworks.keras_load_model(path, compile=False)
+
+def served_model_file(filename):
+    if INFERENCE_BACKEND == 'tflite':
+        return os.path.splitext(filename)[0] + '.tflite'
+    return filename
+
+def load_inference_model(path, family=None):
+    if family in INFERENCE_PROCESSES:
+        logger.info(f"Serving {os.path.basename(path)} from the {family} inference process")
+        return RemoteModel(family, path)
+    if path.endswith('.tflite'):
+        logger.info(f"Loading TFLite model {os.path.basename(path)}")
+        return TFLiteModel(path, num_threads=TFLITE_NUM_THREADS)
+    return load_keras_file(path)
+
+def load_pickle_file(path):
+    logger.info(f"Loading {os.path.basename(path)}")
+    with open(path, 'rb') as f:
         return pickle.load(f)
 
-@lru_cache(maxsize=1)
-def load_top_features():
-    features_path = os.path.join(MODEL_DIR, 'top_features.pkl')
-    if not os.path.exists(features_path):
-        logger.error(f"Missing file: {features_path}")
-        raise FileNotFoundError(f"Missing file: {features_path}")
-    with open(features_path, 'rb') as f:
-        top_features = pickle.load(f)
-        logger.info(f"Loading top features: {top_features}")
-        return top_features.tolist() if isinstance(top_features, np.ndarray) else top_features
-
-@lru_cache(maxsize=1)
-def load_diabetes_model():
-    diabetes_model_path = os.path.join(MODEL_DIR, 'diabetes_best_model.h5')
-    if not os.path.exists(diabetes_model_path):
-        logger.error(f"Missing file: {diabetes_model_path}")
-        raise FileNotFoundError(f"Missing file: {diabetes_model_path}")
-    logger.info("Loading diabetes model")
-    model = load_model(diabetes_model_path, compile=False)
-    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
-    return model
-
-@lru_cache(maxsize=1)
-def load_diabetes_scaler():
-    diabetes_scaler_path = os.path.join(MODEL_DIR, 'diabetes_scaler.pkl')
-    if not os.path.exists(diabetes_scaler_path):
-        logger.error(f"Missing file: {diabetes_scaler_path}")
-        raise FileNotFoundError(f"Missing file: {diabetes_scaler_path}")
-    logger.info("Loading diabetes scaler")
-    return joblib.load(diabetes_scaler_path)
-
-@lru_cache(maxsize=1)
-def load_diabetes_label_encoder():
-    diabetes_le_path = os.path.join(MODEL_DIR, 'diabetes_label_encoder.pkl')
-    if not os.path.exists(diabetes_le_path):
-        logger.error(f"Missing file: {diabetes_le_path}")
-        raise FileNotFoundError(f"Missing file: {diabetes_le_path}")
-    logger.info("Loading diabetes label encoder")
-    return joblib.load(diabetes_le_path)
-
-@lru_cache(maxsize=1)
-def load_heart_disease_model():
-    heart_model_path = os.path.join(MODEL_DIR, 'heart_disease_best_model.h5')
-    if not os.path.exists(heart_model_path):
-        logger.error(f"Missing file: {heart_model_path}")
-        raise FileNotFoundError(f"Missing file: {heart_model_path}")
-    logger.info("Loading heart disease model")
-    model = load_model(heart_model_path, compile=False)
-    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
-    return model
-
-@lru_cache(maxsize=1)
-def load_heart_disease_scaler():
-    heart_scaler_path = os.path.join(MODEL_DIR, 'heart_disease_scaler.pkl')
-    if not os.path.exists(heart_scaler_path):
-        logger.error(f"Missing file: {heart_scaler_path}")
-        raise FileNotFoundError(f"Missing file: {heart_scaler_path}")
-    logger.info("Loading heart disease scaler")
-    return joblib.load(heart_scaler_path)
-
-@lru_cache(maxsize=1)
-def load_heart_disease_label_encoder():
-    heart_le_path = os.path.join(MODEL_DIR, 'heart_disease_label_encoder.pkl')
-    if not os.path.exists(heart_le_path):
-        logger.error(f"Missing file: {heart_le_path}")
-        raise FileNotFoundError(f"Missing file: {heart_le_path}")
-    logger.info("Loading heart disease label encoder")
-    return joblib.load(heart_le_path)
-
-@lru_cache(maxsize=1)
-def load_mental_health_model():
-    mental_model_path = os.path.join(MODEL_DIR, 'mental_health_best_model.h5')
-    if not os.path.exists(mental_model_path):
-        logger.error(f"Missing file: {mental_model_path}")
-        raise FileNotFoundError(f"Missing file: {mental_model_path}")
-    logger.info("Loading mental health model")
-    model = load_model(mental_model_path, compile=False)
-    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
-    return model
-
-@lru_cache(maxsize=1)
-def load_mental_health_scaler():
-    mental_scaler_path = os.path.join(MODEL_DIR, 'mental_health_scaler.pkl')
-    if not os.path.exists(mental_scaler_path):
-        logger.error(f"Missing file: {mental_scaler_path}")
-        raise FileNotFoundError(f"Missing file: {mental_scaler_path}")
-    logger.info("Loading mental health scaler")
-    return joblib.load(mental_scaler_path)
-
-@lru_cache(maxsize=1)
-def load_mental_health_label_encoders():
-    mental_les_path = os.path.join(MODEL_DIR, 'mental_health_label_encoders.pkl')
-    if not os.path.exists(mental_les_path):
-        logger.error(f"Missing file: {mental_les_path}")
-        raise FileNotFoundError(f"Missing file: {mental_les_path}")
-    logger.info("Loading mental health label encoders")
-    return joblib.load(mental_les_path)
-
-@lru_cache(maxsize=1)
-def load_skin_lesion_model():
-    skin_model_path = os.path.join(MODEL_DIR, 'skin_lesion_inceptionv3_model.h5')
-    if not os.path.exists(skin_model_path):
-        logger.error(f"Missing file: {skin_model_path}")
-        raise FileNotFoundError(f"Missing file: {skin_model_path}")
-    logger.info("Loading skin lesion model")
-    model = load_model(skin_model_path, compile=False)
-    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
-    return model
-
-@lru_cache(maxsize=1)
-def load_chest_xray_model():
-    chest_model_path = os.path.join(MODEL_DIR, 'chest_xray_model.h5')
-    if not os.path.exists(chest_model_path):
-        logger.error(f"Missing file: {chest_model_path}")
-        raise FileNotFoundError(f"Missing file: {chest_model_path}")
-    logger.info("Loading chest x-ray model")
-    model = load_model(chest_model_path, compile=False)
-    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
-    return model
+def load_joblib_file(path):
+    logger.info(f"Loading {os.path.basename(path)}")
+    return frameworks.joblib().load(path)
+
+def predict_symptoms(booster, encoder, matrix):
+    # Rows are already in the booster's column order, so feature-name validation is skipped
+    try:
+        return booster.inplace_predict(matrix, validate_features=False)
+    except (AttributeError, TypeError, frameworks.xgboost().core.XGBoostError):
+        dmatrix = frameworks.xgboost().DMatrix(matrix, feature_names=encoder.feature_names)
+        return booster.predict(dmatrix, validate_features=False)
+
+def make_risk_batcher(name, model):
+    return MicroBatcher(
+        name,
+        model.predict_on_batch,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        enabled=BATCHING_ENABLED
+    )
+
+# Lazy load models and preprocessors. Each loader builds one version of everything an
+# endpoint needs, so a model is never served with a scaler or encoder from another version.
+def load_disease_bundle(resolve):
+    frameworks.xgboost()  # Unpickling would import it anyway; this way the import is timed
+    model = load_pickle_file(resolve('xgb_model_streamlined.pkl'))
+    booster = cpu.configure_xgboost(model.get_booster() if hasattr(model, 'get_booster') else model)
+    top_features = load_pickle_file(resolve('top_features.pkl'))
+    top_features = top_features.tolist() if isinstance(top_features, np.ndarray) else top_features
+    logger.info(f"Loaded top features: {top_features}")
+    feature_names = booster.feature_names or top_features
+    if set(feature_names) != set(top_features):
+        logger.warning("top_features.pkl does not match the booster's feature names; using the booster's")
+    return {
+        'booster': booster,
+        'label_encoder': load_pickle_file(resolve('label_encoder.pkl')),
+        'encoder': SymptomEncoder(feature_names, SYMPTOM_MAPPING, sparse_input=DISEASE_SPARSE_INPUT)
+    }
+
+def build_lookup_table(model, encoder, records):
+    matrix, errors = encoder.encode(records, out=np.empty((len(records), encoder.width), dtype=np.float32))
+    confidences = np.concatenate([
+        np.asarray(model.predict_on_batch(matrix[start:start + LOOKUP_TABLE_BATCH]))
+        for start in range(0, len(records), LOOKUP_TABLE_BATCH)
+    ])
+    return LookupTable({
+        row.tobytes(): float(confidence[0])
+        for row, confidence, error in zip(matrix, confidences, errors) if error is None
+    })
+
+def make_risk_bundle_loader(name, model_file, scaler_file, label_encoder_file, encoder_class, lookup_table=False):
+    def load_bundle(resolve):
+        model = load_inference_model(resolve(model_file), name)
+        encoder = encoder_class(load_joblib_file(resolve(scaler_file)), load_joblib_file(resolve(label_encoder_file)))
+        lookup = None
+        if lookup_table and hasattr(encoder, 'input_grid'):
+            started = time.perf_counter()
+            lookup = build_lookup_table(model, encoder, encoder.input_grid())
+            logger.info(f"Built {name} lookup table with {len(lookup.entries)} entries "
+                        f"in {time.perf_counter() - started:.2f}s")
+        return {'model': model, 'encoder': encoder, 'batcher': make_risk_batcher(name, model), 'lookup': lookup}
+    return load_bundle
+
+def make_image_bundle_loader(name, model_file):
+    def load_bundle(resolve):
+        model = load_inference_model(resolve(model_file), name)
+        pipeline = ImagePipeline(
+            name, model,
+            max_batch_size=IMAGE_BATCH_MAX_SIZE,
+            max_wait_ms=IMAGE_BATCH_MAX_WAIT_MS,
+            enabled=BATCHING_ENABLED
+        )
+        return {'model': model, 'pipeline': pipeline, 'batcher': pipeline.batcher}
+    return load_bundle
+
+# Smoke predictions: run on every new version before it is swapped in, and double as the
+# warm-up pass that triggers graph tracing before the first real request
+def smoke_disease(bundle):
+    prediction = predict_symptoms(bundle.booster, bundle.encoder, bundle.encoder.encode([[]])[0])
+    if np.shape(prediction)[-1] != len(bundle.label_encoder.classes_):
+        raise ValueError(f"Disease model returns {np.shape(prediction)[-1]} classes, "
+                         f"label encoder has {len(bundle.label_encoder.classes_)}")
+
+def smoke_risk(bundle):
+    output = bundle.model.predict_on_batch(np.zeros((1, bundle.encoder.width), dtype=np.float32))
+    if np.shape(output) != (1, 1):
+        raise ValueError(f"Risk model returned shape {np.shape(output)}, expected (1, 1)")
+
+def smoke_image(bundle):
+    output = bundle.pipeline.predict_batch(np.zeros((1,) + bundle.pipeline.size + (3,), dtype=np.uint8))
+    if np.shape(output) != (1, 1):
+        raise ValueError(f"Image model returned shape {np.shape(output)}, expected (1, 1)")
+
+prediction_cache = PredictionCache(
+    PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_URL
+) if PREDICTION_CACHE_ENABLED else None
+# Identical predictions already running (same encoded row or image bytes) are awaited, not repeated
+prediction_flights = SingleFlight()
+
+registry = ModelRegistry(MODEL_DIR, base_version=os.getenv('MODEL_VERSION'))
+
+def register_model(name, files, loader, smoke):
+    # Families of disabled subsystems are never registered, so they are neither warmed nor preloaded
+    if MODEL_SUBSYSTEMS[name] in SUBSYSTEMS:
+        registry.register(name, files, loader, smoke)
+
+register_model(
+    'disease', ['xgb_model_streamlined.pkl', 'top_features.pkl', 'label_encoder.pkl'],
+    load_disease_bundle, smoke_disease)
+register_model(
+    'diabetes', [served_model_file('diabetes_best_model.h5'), 'diabetes_scaler.pkl', 'diabetes_label_encoder.pkl'],
+    make_risk_bundle_loader('diabetes', served_model_file('diabetes_best_model.h5'), 'diabetes_scaler.pkl',
+                            'diabetes_label_encoder.pkl', DiabetesEncoder),
+    smoke_risk)
+register_model(
+    'heart_disease', [served_model_file('heart_disease_best_model.h5'), 'heart_disease_scaler.pkl', 'heart_disease_label_encoder.pkl'],
+    make_risk_bundle_loader('heart_disease', served_model_file('heart_disease_best_model.h5'), 'heart_disease_scaler.pkl',
+                            'heart_disease_label_encoder.pkl', HeartDiseaseEncoder),
+    smoke_risk)
+register_model(
+    'mental_health', [served_model_file('mental_health_best_model.h5'), 'mental_health_scaler.pkl', 'mental_health_label_encoders.pkl'],
+    make_risk_bundle_loader('mental_health', served_model_file('mental_health_best_model.h5'), 'mental_health_scaler.pkl',
+                            'mental_health_label_encoders.pkl', MentalHealthEncoder,
+                            lookup_table=MENTAL_HEALTH_LOOKUP_TABLE),
+    smoke_risk)
+register_model(
+    'skin_lesion', [served_model_file('skin_lesion_inceptionv3_model.h5')],
+    make_image_bundle_loader('skin_lesion', served_model_file('skin_lesion_inceptionv3_model.h5')), smoke_image)
+register_model(
+    'chest_xray', [served_model_file('chest_xray_model.h5')],
+    make_image_bundle_loader('chest_xray', served_model_file('chest_xray_model.h5')), smoke_image)
+
+def warm_up_model(name):
+    try:
+        registry.warm(name)
+    except Exception as e:
+        logger.error(f"Failed to warm up {name}: {str(e)}")
+
+def warm_up_models():
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix='warmup') as pool:
+        list(pool.map(warm_up_model, registry.families))
+    logger.info(f"Model warm-up finished in {time.perf_counter() - started:.2f}s")
+
+def preload_models(names):
+    started = time.perf_counter()
+    for name in names:
+        try:
+            registry.preload(name)
+        except Exception as e:
+            logger.error(f"Failed to preload {name}: {str(e)}")
+    logger.info(f"Preloaded models in {time.perf_counter() - started:.2f}s, memory: {process_memory()}")
+
+def init_worker():
+    # Called in each gunicorn worker after fork when the app was preloaded in the master;
+    # background threads started in the master do not exist in the forked workers
+    registry.start_watcher(MODEL_WATCH_INTERVAL)
+    if EAGER_LOAD:
+        threading.Thread(target=warm_up_models, name='warmup', daemon=True).start()
+
+def model_response(result, bundle):
+    if isinstance(result, dict):
+        result = {**result, 'model_version': bundle.version}
+    with stage('serialize'):
+        response = jsonify(result)
+    response.headers['X-Model-Version'] = bundle.version
+    return response
+
+@app.before_request
+def start_request_metrics():
+    g.route = request.endpoint or 'unmatched'
+    g.request_started = time.perf_counter()
+    g.in_flight = True
+    metrics.bind(g.route)
+    metrics.inc('requests_in_flight', route=g.route)
+
+@app.after_request
+def record_request_metrics(response):
+    if 'route' in g:
+        metrics.histogram('request_seconds', route=g.route, method=request.method,
+                          status=str(response.status_code)).observe(time.perf_counter() - g.request_started)
+    return response
+
+@app.before_request
+def check_subsystem():
+    subsystem = ROUTE_SUBSYSTEMS.get(request.endpoint)
+    if request.endpoint == 'predict_batch':
+        subsystem = MODEL_SUBSYSTEMS.get((request.view_args or {}).get('model_name'))
+    if subsystem is not None and subsystem not in SUBSYSTEMS:
+        return jsonify({'error': f'The {subsystem} subsystem is disabled on this server'}), 404
+    return None
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    # Runs a second time after a stream_with_context response finishes; count the request once
+    if g.pop('in_flight', False):
+        metrics.inc('requests_in_flight', -1, route=g.route)
+    metrics.bind(None)
 
 # Health check endpoint for Render
 @app.route('/health', methods=['GET'])
@@ -197,349 +431,634 @@ def health_check():
     logger.info("Health check requested")
     return jsonify({"status": "healthy"}), 200
 
+# Readiness for the load balancer: 503 until every model has finished loading
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    model_status = registry.status()
+    if not EAGER_LOAD:
+        return jsonify({'status': 'lazy', 'models': model_status}), 200
+    states = {status['state'] for status in model_status.values()}
+    if states & {'pending', 'loading', 'warming'}:
+        return jsonify({'status': 'loading', 'models': model_status}), 503
+    return jsonify({'status': 'degraded' if 'failed' in states else 'ready', 'models': model_status}), 200
+
+# Per-worker memory, to compare RSS against PSS when models are preloaded and shared
+@app.route('/debug/memory', methods=['GET'])
+def memory_stats():
+    return jsonify({
+        'pid': os.getpid(),
+        'memory_kb': process_memory(),
+        'cpu': cpu.layout(),
+        'models': {name: status['version'] for name, status in registry.status().items()}
+    })
+
+# How long this worker took to import and which heavy frameworks it has loaded since
+@app.route('/debug/startup', methods=['GET'])
+def startup_stats():
+    return jsonify({
+        'pid': os.getpid(),
+        'import_seconds': SERVER_IMPORT_SECONDS,
+        'subsystems': sorted(SUBSYSTEMS),
+        'models': list(registry.families),
+        'deferred_imports_seconds': frameworks.IMPORT_SECONDS,
+        'frameworks_loaded': frameworks.loaded()
+    })
+
+@app.route('/batching/stats', methods=['GET'])
+def batching_stats():
+    return jsonify({
+        name: family.current.batcher.stats()
+        for name, family in registry.families.items()
+        if family.current is not None and hasattr(family.current, 'batcher')
+    })
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'predictions': prediction_cache.stats() if prediction_cache is not None else None,
+        'coalescing': prediction_flights.stats(),
+        'lookup_tables': {
+            name: family.current.lookup.stats()
+            for name, family in registry.families.items()
+            if family.current is not None and getattr(family.current, 'lookup', None) is not None
+        }
+    })
+
+@app.route('/admission/stats', methods=['GET'])
+def admission_stats():
+    return jsonify(admission_control.stats())
+
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+def component_metrics():
+    # Numbers the components already keep, read at scrape time
+    for name, status in registry.status().items():
+        yield 'model_load_seconds', 'gauge', 'Load time of the serving model version.', {'model': name}, status['load_seconds']
+        yield 'model_warmup_seconds', 'gauge', 'Smoke test time of the serving model version.', {'model': name}, status['warmup_seconds']
+    for name, family in registry.families.items():
+        bundle = family.current
+        if bundle is None:
+            continue
+        if hasattr(bundle, 'batcher'):
+            yield 'batch_size', 'histogram', 'Requests per micro-batch.', {'model': name}, bundle.batcher.batch_sizes
+            yield 'batch_queue_wait_seconds', 'histogram', 'Time queued before a micro-batch ran.', {'model': name}, bundle.batcher.queue_wait
+            yield 'batch_expired_total', 'counter', 'Queued rows dropped because their deadline passed.', {'model': name}, bundle.batcher.expired
+        if isinstance(getattr(bundle, 'model', None), RemoteModel):
+            yield 'inference_remote_calls_total', 'counter', 'Forward passes sent to an inference process.', {'model': name}, bundle.model.calls
+            yield 'inference_remote_errors_total', 'counter', 'Failed forward passes in an inference process.', {'model': name}, bundle.model.errors
+        if getattr(bundle, 'lookup', None) is not None:
+            yield 'lookup_table_hits_total', 'counter', 'Precomputed lookup table hits.', {'model': name}, bundle.lookup.hits
+            yield 'lookup_table_misses_total', 'counter', 'Precomputed lookup table misses.', {'model': name}, bundle.lookup.misses
+    for route, gate in admission_control.gates.items():
+        labels = {'route': route}
+        yield 'admission_active', 'gauge', 'Requests holding an admission slot.', labels, gate.active
+        yield 'admission_waiting', 'gauge', 'Requests queued for an admission slot.', labels, gate.waiting
+        yield 'admission_queue_wait_seconds', 'histogram', 'Time queued for an admission slot.', labels, gate.queue_wait
+        for reason, count in gate.rejected.items():
+            yield 'admission_rejected_total', 'counter', 'Requests shed by admission control.', {**labels, 'reason': reason}, count
+    if prediction_cache is not None:
+        cache = prediction_cache.stats()
+        yield 'prediction_cache_hits_total', 'counter', 'Prediction cache hits.', {'tier': 'local'}, cache['local']['hits']
+        yield 'prediction_cache_misses_total', 'counter', 'Prediction cache misses.', {'tier': 'local'}, cache['local']['misses']
+        if cache['shared'] is not None:
+            yield 'prediction_cache_hits_total', 'counter', 'Prediction cache hits.', {'tier': 'shared'}, cache['shared']['hits']
+            yield 'prediction_cache_misses_total', 'counter', 'Prediction cache misses.', {'tier': 'shared'}, cache['shared']['misses']
+            yield 'prediction_cache_errors_total', 'counter', 'Shared prediction cache errors.', {}, cache['shared']['errors']
+        yield 'prediction_cache_hit_ratio', 'gauge', 'Share of predictions served from the cache.', {}, cache['hit_ratio']
+    for name, flights in (('predictions', prediction_flights), ('hospitals', hospital_finder.flights),
+                          ('hospitals_async', hospital_finder.async_flights)):
+        stats = flights.stats()
+        yield 'coalesced_total', 'counter', 'Calls that waited for an identical call in flight.', {'kind': name}, stats['coalesced']
+        yield 'coalesce_executed_total', 'counter', 'Calls run by the single-flight layer.', {'kind': name}, stats['executed']
+    hospitals = hospital_finder.stats()
+    yield 'hospital_cache_hit_ratio', 'gauge', 'Share of hospital cell lookups served from the cache.', {}, hospitals['cache']['hit_ratio']
+    for provider in hospital_finder.providers:
+        labels = {'provider': provider.name}
+        yield 'hospital_provider_seconds', 'histogram', 'Upstream hospital provider latency.', labels, provider.latency
+        yield 'hospital_provider_errors_total', 'counter', 'Failed upstream calls.', labels, provider.errors
+        yield 'hospital_provider_timeouts_total', 'counter', 'Timed out upstream calls.', labels, provider.timeouts
+        yield 'hospital_provider_skipped_total', 'counter', 'Calls skipped by an open circuit.', labels, provider.skipped
+        yield 'hospital_provider_circuit_state', 'gauge', '0 closed, 1 half-open, 2 open.', labels, CIRCUIT_STATES[provider.breaker.state]
+    memory = process_memory()
+    for field in ('VmRSS', 'Pss'):
+        if field in memory:
+            yield 'process_memory_bytes', 'gauge', 'Worker memory from /proc.', {'type': field}, memory[field] * 1024
+
+metrics.add_collector(component_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def require_admin():
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled'}), 403
+    if request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Invalid admin token'}), 401
+    return None
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({'models': registry.status(), 'active_versions': registry.active_versions()})
+
+@app.route('/admin/models/<name>/reload', methods=['POST'])
+def admin_reload_model(name):
+    denied = require_admin()
+    if denied:
+        return denied
+    if name not in registry.families:
+        return jsonify({'error': f'Unknown model: {name}'}), 404
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    future = registry.reload_async(name, version)
+    if not data.get('wait'):
+        logger.info(f"Reloading {name} (version {version or 'base'}) in the background")
+        return jsonify({'status': 'reloading', 'model': name, 'version': version}), 202
+    try:
+        bundle = future.result()
+    except Exception as e:
+        return jsonify({'error': f'Reload failed: {str(e)}', 'models': registry.status()}), 500
+    return jsonify({'status': 'ready', 'model': name, 'version': bundle.version})
+
+@app.route('/admin/models/<name>/rollback', methods=['POST'])
+def admin_rollback_model(name):
+    denied = require_admin()
+    if denied:
+        return denied
+    if name not in registry.families:
+        return jsonify({'error': f'Unknown model: {name}'}), 404
+    try:
+        bundle = registry.rollback(name)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'status': 'ready', 'model': name, 'version': bundle.version})
+
+@app.route('/admin/profiler', methods=['GET'])
+def admin_profiler_status():
+    denied = require_admin()
+    if denied:
+        return denied
+    if request.args.get('format') == 'folded':
+        return Response(profiler.folded(), mimetype='text/plain')
+    return jsonify(profiler.status())
+
+@app.route('/admin/profiler/start', methods=['POST'])
+def admin_profiler_start():
+    denied = require_admin()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        interval = float(data.get('interval_ms', 10)) / 1000.0
+        seconds = float(data['seconds']) if 'seconds' in data else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'interval_ms and seconds must be numbers'}), 400
+    if interval <= 0 or (seconds is not None and seconds <= 0):
+        return jsonify({'error': 'interval_ms and seconds must be positive'}), 400
+    if not profiler.start(interval, seconds):
+        return jsonify({'error': 'Profiler is already running', **profiler.status()}), 409
+    logger.info(f"Sampling profiler started in worker {os.getpid()} (interval {interval}s)")
+    return jsonify(profiler.status())
+
+@app.route('/admin/profiler/stop', methods=['POST'])
+def admin_profiler_stop():
+    denied = require_admin()
+    if denied:
+        return denied
+    folded = profiler.stop()
+    logger.info(f"Sampling profiler stopped in worker {os.getpid()}: {profiler.sample_count} samples")
+    return Response(folded, mimetype='text/plain')
+
+def top_diseases(prediction, label_encoder, k=3):
+    top_indices = np.argsort(prediction)[-k:][::-1]
+    diseases = label_encoder.inverse_transform(top_indices)
+    return [
+        {'disease': disease, 'confidence': float(prediction[idx])}
+        for disease, idx in zip(diseases, top_indices)
+    ]
+
+def risk_result(confidence):
+    confidence = float(confidence)
+    return {'risk': 'High' if confidence > 0.5 else 'Low', 'confidence': confidence}
+
+def model_key(bundle, row):
+    # The file signature as well as the label: a pinned MODEL_VERSION keeps its label across file swaps
+    return PredictionCache.key(bundle.name, f'{bundle.version}-{bundle.signature[:12]}', row)
+
+def cached_confidence(bundle, row):
+    # Returns (confidence or None, cache key to store a computed confidence under)
+    if bundle.lookup is not None:
+        confidence = bundle.lookup.get(row)
+        if confidence is not None:
+            return confidence, None
+    if prediction_cache is None:
+        return None, None
+    key = model_key(bundle, row)
+    with stage('cache'):
+        return prediction_cache.get(key), key
+
+def compute_risk(bundle, row, key):
+    confidence = float(bundle.batcher.predict(row, deadline=current_deadline())[0])
+    if key is not None:
+        prediction_cache.set(key, confidence)
+    return confidence
+
+def predict_risk(bundle, row):
+    confidence, key = cached_confidence(bundle, row)
+    if confidence is None:
+        with stage('predict'):
+            confidence = prediction_flights.do(key or model_key(bundle, row), compute_risk, bundle, row, key)
+    return confidence
+
+def predict_disease_row(bundle, input_data):
+    check_deadline()
+    return top_diseases(predict_symptoms(bundle.booster, bundle.encoder, input_data)[0], bundle.label_encoder)
+
 @app.route('/predict/disease', methods=['POST'])
+@admission
 def predict_disease():
     try:
-        model = load_xgb_model()
-        label_encoder = load_label_encoder()
-        top_features = load_top_features()
+        bundle = registry.get('disease')
     except Exception as e:
         logger.error(f"Failed to load disease prediction resources: {str(e)}")
         return jsonify({'error': 'Disease prediction resources not loaded'}), 503
 
     try:
-        # Map frontend symptoms to model feature names
-        symptom_mapping = {
-            'fever': 'fever',
-            'headache': 'headache',
-            'cough': 'cough',
-            'diarrhea': 'diarrhea',
-            'vomiting': 'vomiting',
-            'shortnessofbreath': 'shortness_of_breath',
-            'painchest': 'pain_chest',
-            'fatigue': 'asthenia',
-            'chills': 'chill',
-            'soretotouch': 'sore_to_touch'
-        }
-        input_data = np.zeros(len(top_features))
-        for symptom in request.form:
-            mapped_symptom = symptom_mapping.get(symptom, symptom)
-            if mapped_symptom in top_features:
-                idx = top_features.index(mapped_symptom)
-                input_data[idx] = 1
-            else:
-                logger.warning(f"Received unexpected symptom: {symptom} (mapped to {mapped_symptom})")
+        with stage('parse'):
+            symptoms = list(request.form)
+        with stage('encode'):
+            input_data, _, unknown = bundle.encoder.encode([symptoms])
+        for symptom in unknown:
+            logger.warning(f"Received unexpected symptom: {symptom}")
         logger.debug(f"Input data: {input_data}")
-        dmatrix = xgb.DMatrix([input_data], feature_names=top_features)
-        prediction = model.predict(dmatrix)[0]
-        top_indices = np.argsort(prediction)[-3:][::-1]
-        diseases = label_encoder.inverse_transform(top_indices)
-        confidences = prediction[top_indices]
-        result = [
-            {'disease': disease, 'confidence': float(confidence)}
-            for disease, confidence in zip(diseases, confidences)
-        ]
+        row = input_data.toarray() if hasattr(input_data, 'toarray') else input_data
+        with stage('predict'):
+            result = prediction_flights.do(model_key(bundle, row), predict_disease_row, bundle, input_data)
         logger.info(f"Disease prediction: {result}")
-        return jsonify(result)
+        return model_response(result, bundle)
+    except Overloaded as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Disease prediction failed: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/predict/diabetes', methods=['POST'])
+@admission
 def predict_diabetes():
     try:
-        diabetes_model = load_diabetes_model()
-        diabetes_scaler = load_diabetes_scaler()
-        diabetes_le = load_diabetes_label_encoder()
+        bundle = registry.get('diabetes')
     except Exception as e:
         logger.error(f"Failed to load diabetes resources: {str(e)}")
         return jsonify({'error': 'Diabetes resources not loaded'}), 503
 
     try:
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         logger.debug(f"Received diabetes data: {data}")
-        required_fields = ['age', 'bmi', 'skin_thickness', 'glucose', 'physical_activity']
-        if not all(field in data for field in required_fields):
-            logger.error(f"Missing required fields: {required_fields}")
-            return jsonify({'error': 'Missing required fields'}), 400
-        age = float(data.get('age', 0))
-        bmi = float(data.get('bmi', 0))
-        skin_thickness = float(data.get('skin_thickness', 0))
-        family_history = 1 if float(data.get('glucose', 0)) > 120 else 0
-        physical_activity = data.get('physical_activity', 'Moderate')
+        with stage('encode'):
+            input_data, errors = bundle.encoder.fill([data])
+        with stage('scale'):
+            bundle.encoder.scale_rows(input_data)
+        if errors[0]:
+            logger.error(f"Invalid diabetes input: {errors[0]}")
+            return jsonify({'error': errors[0]}), 400
 
-        try:
-            physical_activity = diabetes_le.transform([physical_activity])[0]
-        except ValueError as ve:
-            logger.error(f"Invalid physical_activity value: {physical_activity}")
-            return jsonify({'error': 'Invalid physical_activity value'}), 400
-
-        input_data = pd.DataFrame({
-            'Age': [age],
-            'BMI': [bmi],
-            'SkinThickness': [skin_thickness],
-            'FamilyHistory': [family_history],
-            'PhysicalActivity': [physical_activity]
-        })
-        input_data[['Age', 'BMI', 'SkinThickness']] = diabetes_scaler.transform(input_data[['Age', 'BMI', 'SkinThickness']])
-        input_data_reshaped = input_data.values
-
-        confidence = float(diabetes_model.predict(input_data_reshaped, verbose=0)[0][0])
-        risk = 'High' if confidence > 0.5 else 'Low'
-        logger.info(f"Diabetes prediction: {risk}, confidence: {confidence}")
-        return jsonify({'risk': risk, 'confidence': confidence})
+        result = risk_result(predict_risk(bundle, input_data[0]))
+        logger.info(f"Diabetes prediction: {result['risk']}, confidence: {result['confidence']}")
+        return model_response(result, bundle)
+    except Overloaded as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Diabetes prediction failed: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/predict/heart_disease', methods=['POST'])
+@admission
 def predict_heart_disease():
     try:
-        heart_disease_model = load_heart_disease_model()
-        heart_disease_scaler = load_heart_disease_scaler()
-        heart_disease_le = load_heart_disease_label_encoder()
+        bundle = registry.get('heart_disease')
     except Exception as e:
         logger.error(f"Failed to load heart disease resources: {str(e)}")
         return jsonify({'error': 'Heart disease resources not loaded'}), 503
 
     try:
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         logger.debug(f"Received heart disease data: {data}")
-        required_fields = ['age', 'blood_pressure', 'smoking', 'bmi', 'chest_pain']
-        if not all(field in data for field in required_fields):
-            missing = [field for field in required_fields if field not in data]
-            logger.error(f"Missing required fields: {missing}")
-            return jsonify({'error': f'Missing required fields: {missing}'}), 400
-        
-        try:
-            age = float(data.get('age', 0))
-            blood_pressure = float(data.get('blood_pressure', 120))
-            smoking = float(data.get('smoking', 0))
-            bmi = float(data.get('bmi', 27))
-            chest_pain = data.get('chest_pain', 'Typical Angina')
-        except ValueError as ve:
-            logger.error(f"Invalid numeric input: {data}")
-            return jsonify({'error': f'Invalid numeric input: {str(ve)}'}), 400
-
-        family_history = 1 if blood_pressure > 140 else 0
-
-        chest_pain_mapping = {
-            'Typical Angina': 1.0,
-            'Atypical Angina': 2.0,
-            'Non-anginal Pain': 3.0,
-            'Asymptomatic': 4.0
-        }
-        
-        if chest_pain not in chest_pain_mapping:
-            valid_values = list(chest_pain_mapping.keys())
-            logger.error(f"Invalid chest_pain value: {chest_pain}. Valid values: {valid_values}")
-            return jsonify({'error': f'Invalid chest_pain value: {chest_pain}. Valid values: {valid_values}'}), 400
-        
-        chest_pain_numeric = chest_pain_mapping[chest_pain]
+        with stage('encode'):
+            input_data, errors = bundle.encoder.fill([data])
+        with stage('scale'):
+            bundle.encoder.scale_rows(input_data)
+        if errors[0]:
+            logger.error(f"Invalid heart disease input: {errors[0]}")
+            return jsonify({'error': errors[0]}), 400
+        logger.debug(f"Input data after scaling: {input_data}")
 
-        try:
-            valid_chest_pains = heart_disease_le.classes_.tolist()
-            if chest_pain_numeric not in valid_chest_pains:
-                logger.error(f"Invalid encoded chest_pain value: {chest_pain_numeric}. Valid values: {valid_chest_pains}")
-                return jsonify({'error': f'Invalid encoded chest_pain value: {chest_pain_numeric}. Valid values: {valid_chest_pains}'}), 400
-            chest_pain_encoded = heart_disease_le.transform([chest_pain_numeric])[0]
-        except ValueError as ve:
-            logger.error(f"Chest pain encoding failed: {str(ve)}")
-            return jsonify({'error': f'Chest pain encoding failed: {str(ve)}'}), 400
-
-        input_data = pd.DataFrame({
-            'Age': [age],
-            'BloodPressure': [blood_pressure],
-            'Smoking': [smoking],
-            'FamilyHistory': [family_history],
-            'BMI': [bmi],
-            'ChestPain': [chest_pain_encoded]
-        })
-        logger.debug(f"Input data before scaling: {input_data}")
-        input_data[['Age', 'BloodPressure', 'BMI']] = heart_disease_scaler.transform(input_data[['Age', 'BloodPressure', 'BMI']])
-        input_data_reshaped = input_data.values
-        logger.debug(f"Input data after scaling: {input_data_reshaped}")
-
-        confidence = float(heart_disease_model.predict(input_data_reshaped, verbose=0)[0][0])
-        risk = 'High' if confidence > 0.5 else 'Low'
-        logger.info(f"Heart disease prediction: {risk}, confidence: {confidence}")
-        return jsonify({'risk': risk, 'confidence': confidence})
+        result = risk_result(predict_risk(bundle, input_data[0]))
+        logger.info(f"Heart disease prediction: {result['risk']}, confidence: {result['confidence']}")
+        return model_response(result, bundle)
+    except Overloaded as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Heart disease prediction failed: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/predict/mental_health', methods=['POST'])
+@admission
 def predict_mental_health():
     try:
-        mental_health_model = load_mental_health_model()
-        mental_health_scaler = load_mental_health_scaler()
-        mental_health_les = load_mental_health_label_encoders()
+        bundle = registry.get('mental_health')
     except Exception as e:
         logger.error(f"Failed to load mental health resources: {str(e)}")
         return jsonify({'error': 'Mental health resources not loaded'}), 503
 
     try:
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         logger.debug(f"Received mental health data: {data}")
-        required_fields = ['age', 'sleep_quality', 'mood_frequency', 'social_activity', 'mental_health_history']
-        if not all(field in data for field in required_fields):
-            logger.error(f"Missing required fields: {required_fields}")
-            return jsonify({'error': 'Missing required fields'}), 400
-        age = float(data.get('age', 0))
-        sleep_quality = data.get('sleep_quality', 'Fair')
-        mood_frequency = data.get('mood_frequency', 'Rarely')
-        social_activity = data.get('social_activity', 'Moderate')
-        mental_health_history = float(data.get('mental_health_history', 0))
+        with stage('encode'):
+            input_data, errors = bundle.encoder.fill([data])
+        with stage('scale'):
+            bundle.encoder.scale_rows(input_data)
+        if errors[0]:
+            logger.error(f"Invalid mental health input: {errors[0]}")
+            return jsonify({'error': errors[0]}), 400
 
-        try:
-            sleep_quality = mental_health_les['sleep'].transform([sleep_quality])[0]
-            mood_frequency = mental_health_les['mood'].transform([mood_frequency])[0]
-            social_activity = mental_health_les['social'].transform([social_activity])[0]
-        except (KeyError, ValueError) as e:
-            logger.error(f"Invalid categorical value: {str(e)}")
-            return jsonify({'error': 'Invalid categorical value'}), 400
-
-        input_data = pd.DataFrame({
-            'Age': [age],
-            'SleepQuality': [sleep_quality],
-            'MoodFrequency': [mood_frequency],
-            'SocialActivity': [social_activity],
-            'MentalHealthHistory': [mental_health_history]
-        })
-        input_data[['Age']] = mental_health_scaler.transform(input_data[['Age']])
-        input_data_reshaped = input_data.values
-
-        confidence = float(mental_health_model.predict(input_data_reshaped, verbose=0)[0][0])
-        risk = 'High' if confidence > 0.5 else 'Low'
-        logger.info(f"Mental health prediction: {risk}, confidence: {confidence}")
-        return jsonify({'risk': risk, 'confidence': confidence})
+        result = risk_result(predict_risk(bundle, input_data[0]))
+        logger.info(f"Mental health prediction: {result['risk']}, confidence: {result['confidence']}")
+        return model_response(result, bundle)
+    except Overloaded as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Mental health prediction failed: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/hospitals', methods=['POST'])
-def find_hospitals():
+# Batch prediction: one encoded matrix, one scaler transform and one model call per chunk
+def predict_disease_chunk(bundle, records):
+    input_data, errors, unknown = bundle.encoder.encode(records)
+    if unknown:
+        logger.warning(f"Received {len(unknown)} unexpected symptoms in batch")
+    predictions = predict_symptoms(bundle.booster, bundle.encoder, input_data)
+    return [
+        {'error': error} if error else {'predictions': top_diseases(prediction, bundle.label_encoder)}
+        for prediction, error in zip(predictions, errors)
+    ]
+
+def predict_risk_chunk(bundle, records):
+    input_data, errors = bundle.encoder.encode(records)
+    results = [{'error': error} for error in errors]
+    misses = []
+    keys = []
+    for i, error in enumerate(errors):
+        if error is None:
+            confidence, key = cached_confidence(bundle, input_data[i])
+            if confidence is None:
+                misses.append(i)
+                keys.append(key)
+            else:
+                results[i] = risk_result(confidence)
+    if misses:
+        confidences = bundle.model.predict_on_batch(input_data[misses])
+        for i, key, confidence in zip(misses, keys, confidences):
+            results[i] = risk_result(confidence[0])
+            if key is not None:
+                prediction_cache.set(key, results[i]['confidence'])
+    return results
+
+BATCH_PREDICTORS = {
+    'disease': predict_disease_chunk,
+    'diabetes': predict_risk_chunk,
+    'heart_disease': predict_risk_chunk,
+    'mental_health': predict_risk_chunk
+}
+
+def read_ndjson_records(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield InvalidInput(f'Malformed JSON: {str(e)}')
+
+def iter_batch_results(predict_chunk, bundle, records):
+    index = 0
+    for chunk in iter(lambda: list(islice(records, BATCH_CHUNK_SIZE)), []):
+        check_deadline()
+        for result in predict_chunk(bundle, chunk):
+            yield {'index': index, **result}
+            index += 1
+
+@app.route('/predict/<model_name>/batch', methods=['POST'])
+@admission
+def predict_batch(model_name):
+    if model_name not in BATCH_PREDICTORS:
+        return jsonify({'error': f'Unknown model: {model_name}'}), 404
+    predict_chunk = BATCH_PREDICTORS[model_name]
+
+    # One bundle for the whole request, so every chunk is scored by the same model version
     try:
-        data = request.get_json()
-        lat = float(data.get('lat'))
-        lon = float(data.get('lon'))
-
-        response = requests.get(
-            'https://overpass-api.de/api/interpreter',
-            params={
-                'data': f'[out:json][timeout:25];node["amenity"="hospital"](around:5000,{lat},{lon});out body;'
-            },
-            timeout=10
-        )
-        response.raise_for_status()
-        hospitals = response.json().get('elements', [])
-
-        hospital_list = []
-        for h in hospitals:
-            tags = h.get('tags', {})
-            name = tags.get('name', 'Unknown')
-            address = tags.get('addr:street', '') or tags.get('addr:full', '')
-            phone = tags.get('phone', '') or tags.get('contact:phone', '')
-            distance = ((lat - h['lat'])**2 + (lon - h['lon'])**2)**0.5 * 111
-
-            if address and address != 'No address' and phone and phone != 'No phone':
-                hospital_list.append({
-                    'name': name,
-                    'address': address,
-                    'phone': phone,
-                    'distance': round(distance, 2)
-                })
-
-        hospital_list = sorted(hospital_list, key=lambda x: x['distance'])[:5]
-
-        if len(hospital_list) < 5:
-            nominatim_url = 'https://nominatim.openstreetmap.org/search'
-            params = {
-                'q': 'hospital',
-                'format': 'json',
-                'limit': 10,
-                'viewbox': f'{lon-0.05},{lat+0.05},{lon+0.05},{lat-0.05}',
-                'bounded': 1
-            }
-            headers = {'User-Agent': 'HealthBot/1.0'}
+        bundle = registry.get(model_name)
+    except Exception as e:
+        logger.error(f"Failed to load {model_name} batch resources: {str(e)}")
+        return jsonify({'error': f'{model_name} resources not loaded'}), 503
+
+    content_type = request.headers.get('Content-Type', '').lower()
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        records = read_ndjson_records(request.stream)
+        deadline = current_deadline()
+
+        def generate():
+            # Runs after the view returns; admission() holds the slot until the response closes
             try:
-                nom_response = requests.get(nominatim_url, params=params, headers=headers, timeout=10)
-                nom_response.raise_for_status()
-                nom_hospitals = nom_response.json()
-                for h in nom_hospitals:
-                    if len(hospital_list) >= 5:
-                        break
-                    name = h.get('display_name', '').split(',')[0]
-                    address = h.get('display_name', '')
-                    lat_h = float(h.get('lat'))
-                    lon_h = float(h.get('lon'))
-                    distance = ((lat - lat_h)**2 + (lon - lon_h)**2)**0.5 * 111
-                    phone = h.get('phone', 'Not listed')
-                    if phone == 'Not listed':
-                        continue
-                    if address and name not in [x['name'] for x in hospital_list]:
-                        hospital_list.append({
-                            'name': name,
-                            'address': address,
-                            'phone': phone,
-                            'distance': round(distance, 2)
-                        })
-                hospital_list = sorted(hospital_list, key=lambda x: x['distance'])[:5]
+                with deadline_scope(deadline):
+                    for result in iter_batch_results(predict_chunk, bundle, records):
+                        yield json.dumps(result) + '\n'
             except Exception as e:
-                logger.warning(f"Nominatim fallback failed: {e}")
+                logger.error(f"{model_name} batch prediction failed: {str(e)}", exc_info=True)
+                yield json.dumps({'error': str(e)}) + '\n'
+
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        response.headers['X-Model-Version'] = bundle.version
+        return response
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('records')
+    if not isinstance(data, list):
+        logger.error("Batch request must be a JSON array or NDJSON stream")
+        return jsonify({'error': 'Expected a JSON array of records or an NDJSON stream'}), 400
+
+    try:
+        with stage('predict'):
+            results = list(iter_batch_results(predict_chunk, bundle, iter(data)))
+        errors = sum(1 for result in results if 'error' in result)
+        logger.info(f"{model_name} batch prediction: {len(results)} records, {errors} errors")
+        return model_response({'results': results, 'count': len(results), 'errors': errors}, bundle)
+    except Overloaded as e:
+        return shed_response(e)
+    except Exception as e:
+        logger.error(f"{model_name} batch prediction failed: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+hospital_finder = HospitalFinder()
+
+def hospital_query(data):
+    """Returns ``((lat, lon, radius, limit), None)`` or ``(None, error)`` for a 400."""
+    if not isinstance(data, dict):
+        return None, 'Expected a JSON object with lat and lon'
+    try:
+        lat = float(data['lat'])
+        lon = float(data['lon'])
+    except (KeyError, TypeError, ValueError):
+        return None, 'lat and lon are required and must be numbers'
+    # float() accepts "nan" and "inf", which would reach the grid index and the Overpass query
+    if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, 'lat must be in [-90, 90] and lon in [-180, 180]'
+    try:
+        radius = float(data.get('radius', SEARCH_RADIUS_KM))
+        limit = int(data.get('limit', SEARCH_LIMIT))
+    except (TypeError, ValueError):
+        return None, 'radius and limit must be numbers'
+    if not 0 < radius <= HOSPITAL_MAX_RADIUS_KM or not 1 <= limit <= HOSPITAL_MAX_LIMIT:
+        return None, (f'radius must be in (0, {HOSPITAL_MAX_RADIUS_KM}] km '
+                      f'and limit in [1, {HOSPITAL_MAX_LIMIT}]')
+    return (lat, lon, radius, limit), None
+
+def hospital_headers(source):
+    return {
+        'X-Cache': 'HIT' if source in ('cache', 'offline') else 'MISS',
+        'Cache-Control': f'private, max-age={int(HOSPITAL_CACHE_TTL)}'
+    }
 
-        logger.info(f"Found {len(hospital_list)} valid hospitals")
-        return jsonify({'hospitals': hospital_list})
+@app.route('/hospitals', methods=['POST'])
+@admission
+def find_hospitals():
+    try:
+        query, error = hospital_query(request.get_json(silent=True))
+        if error:
+            return jsonify({'error': error}), 400
+
+        with stage('search'):
+            hospital_list, source = hospital_finder.search(*query)
+        logger.info(f"Found {len(hospital_list)} valid hospitals ({source})")
+        response = jsonify({'hospitals': hospital_list})
+        response.headers.update(hospital_headers(source))
+        return response
+    except HospitalSearchError as e:
+        logger.error(f"Hospital search failed: {str(e)}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Hospital search failed: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/hospitals/stats', methods=['GET'])
+def hospital_stats():
+    return jsonify(hospital_finder.stats())
+
+def image_uploads():
+    # Form uploads under "file" (repeatable) or "files", or a zip/tar archive as the request body
+    files = request.files.getlist('file') + request.files.getlist('files')
+    if files:
+        return [(file.filename or '', file.mimetype, file.stream) for file in files]
+    if is_archive(content_type=request.content_type):
+        return [('', request.content_type, request.stream)]
+    return []
+
+def study_summary(results, positive, negative):
+    confidences = [confidence for _, confidence, error in results if error is None]
+    positives = sum(1 for confidence in confidences if confidence > 0.5)
+    return {
+        'images': len(results),
+        'scored': len(confidences),
+        'failed': len(results) - len(confidences),
+        'positive_images': positives,
+        'disease': (positive if positives else negative) if confidences else None,
+        'max_confidence': max(confidences) if confidences else None,
+        'mean_confidence': float(np.mean(confidences)) if confidences else None
+    }
+
+def predict_image_bytes(bundle, data):
+    with stage('decode'):
+        image = decode_image(BytesIO(data), bundle.pipeline.size)
+    with stage('predict'):
+        return float(bundle.pipeline.batcher.predict(image, deadline=current_deadline())[0])
+
+def predict_image_upload(bundle, positive, negative, label):
+    uploads = image_uploads()
+    if not uploads:
+        logger.error("No file uploaded")
+        return jsonify({'error': 'No file uploaded'}), 400
+
+    filename, content_type, stream = uploads[0]
+    if len(uploads) == 1 and not is_archive(filename, content_type):
+        with stage('read'):
+            data = stream.read()
+        # Re-uploads of the same image (retries, double submits) share one decode and model call
+        key = f'image:{bundle.name}:{bundle.version}-{bundle.signature[:12]}:{hashlib.blake2b(data, digest_size=16).hexdigest()}'
+        try:
+            confidence = prediction_flights.do(key, predict_image_bytes, bundle, data)
+        except (UnidentifiedImageError, ValueError, OSError) as e:
+            logger.error(f"Invalid image upload: {str(e)}")
+            return jsonify({'error': 'Invalid image file'}), 400
+        disease = positive if confidence > 0.5 else negative
+        logger.info(f"{label} prediction: {disease}, confidence: {confidence}")
+        return model_response({'disease': disease, 'confidence': confidence}, bundle)
+
+    check_deadline()
+    try:
+        with stage('study'):
+            results = bundle.pipeline.predict_study(iter_study_images(uploads))
+    except InvalidUpload as e:
+        logger.error(f"Invalid {label} study upload: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    if not results:
+        return jsonify({'error': 'No images found in upload'}), 400
+    images = [
+        {'index': i, 'filename': name, 'error': error} if error else
+        {'index': i, 'filename': name, 'disease': positive if confidence > 0.5 else negative,
+         'confidence': confidence}
+        for i, (name, confidence, error) in enumerate(results)
+    ]
+    study = study_summary(results, positive, negative)
+    logger.info(f"{label} study prediction: {study['images']} images, {study['positive_images']} {positive}, "
+                f"{study['failed']} failed")
+    return model_response({'images': images, 'study': study}, bundle)
+
 @app.route('/predict/chest_xray', methods=['POST'])
+@admission
 def predict_chest_disease():
     try:
-        chest_xray_model = load_chest_xray_model()
+        bundle = registry.get('chest_xray')
     except Exception as e:
         logger.error(f"Failed to load chest X-ray model: {str(e)}")
         return jsonify({'error': 'Chest X-ray model not loaded'}), 503
 
     try:
-        if 'file' not in request.files:
-            logger.error("No file uploaded")
-            return jsonify({'error': 'No file uploaded'}), 400
-        file = request.files['file']
-        img = load_img(file, target_size=(224, 224))
-        img_array = img_to_array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        prediction = chest_xray_model.predict(img_array)[0][0]
-        confidence = float(prediction)
-        disease = 'Pneumonia' if confidence > 0.5 else 'Normal'
-        logger.info(f"Chest X-ray prediction: {disease}, confidence: {confidence}")
-        return jsonify({'disease': disease, 'confidence': confidence})
+        return predict_image_upload(bundle, 'Pneumonia', 'Normal', 'Chest X-ray')
+    except Overloaded as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Chest X-ray prediction failed: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/predict/cancer', methods=['POST'])
+@admission
 def predict_cancer():
     try:
-        skin_lesion_model = load_skin_lesion_model()
+        bundle = registry.get('skin_lesion')
     except Exception as e:
         logger.error(f"Failed to load skin lesion model: {str(e)}")
         return jsonify({'error': 'Skin lesion model not loaded'}), 503
 
     try:
-        if 'file' not in request.files:
-            logger.error("No file uploaded")
-            return jsonify({'error': 'No file uploaded'}), 400
-        file = request.files['file']
-        img = load_img(file, target_size=(224, 224))
-        img_array = img_to_array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        prediction = skin_lesion_model.predict(img_array)[0][0]
-        confidence = float(prediction)
-        disease = 'Melanoma' if confidence > 0.5 else 'Benign'
-        logger.info(f"Skin lesion prediction: {disease}, confidence: {confidence}")
-        return jsonify({'disease': disease, 'confidence': confidence})
+        return predict_image_upload(bundle, 'Melanoma', 'Benign', 'Skin lesion')
+    except Overloaded as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Skin lesion prediction failed: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
@@ -573,6 +1092,25 @@ def translate():
         logger.error(f"Translation failed: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+SERVER_IMPORT_SECONDS = round(time.perf_counter() - SERVER_IMPORT_STARTED, 3)
+logger.info(f"Server imported in {SERVER_IMPORT_SECONDS:.2f}s; subsystems: {sorted(SUBSYSTEMS)}; "
+            f"frameworks loaded: {frameworks.loaded()}")
+
+if PRELOADED_MODELS:
+    # Importing in the gunicorn master (preload_app is set from the same list): the workers
+    # run init_worker() from post_fork, and __main__ below runs it for the dev server
+    preload_models(PRELOADED_MODELS)
+else:
+    init_worker()
+
 if __name__ == '__main__':
+    if PRELOADED_MODELS:
+        init_worker()
+    # Under gunicorn the master runs the inference processes (gunicorn.conf.py)
+    inference_processes = InferencePool(INFERENCE_PROCESSES).start() if INFERENCE_PROCESSES else None
     port = int(os.environ.get('PORT', 5001))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    try:
+        app.run(host='0.0.0.0', port=port)
+    finally:
+        if inference_processes is not None:
+            inference_processes.stop()
\ No newline at end of file
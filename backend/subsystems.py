@@ -0,0 +1,61 @@
+"""Subsystems, model families and preloading, resolved from the environment without importing the app.
+
+gunicorn.conf.py decides ``preload_app`` from ``PRELOADED_MODELS`` before the app is imported,
+and server.py preloads exactly that list, so the two cannot disagree.
+"""
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from inference_pool import INFERENCE_PROCESSES
+
+logger = logging.getLogger(__name__)
+
+# The same .env server.py reads; gunicorn.conf.py gets here first
+load_dotenv()
+
+# Route families this server answers; the others return 404 and their models and frameworks
+# are never loaded, so e.g. SUBSYSTEMS=hospitals boots without TensorFlow or XGBoost
+SUBSYSTEMS = {name.strip() for name in os.getenv('SUBSYSTEMS', 'disease,tabular,images,hospitals,llm').split(',')
+              if name.strip()}
+MODEL_SUBSYSTEMS = {
+    'disease': 'disease',
+    'diabetes': 'tabular',
+    'heart_disease': 'tabular',
+    'mental_health': 'tabular',
+    'skin_lesion': 'images',
+    'chest_xray': 'images'
+}
+# Families of disabled subsystems are never registered, so they are neither warmed nor preloaded
+MODEL_FAMILIES = [name for name, subsystem in MODEL_SUBSYSTEMS.items() if subsystem in SUBSYSTEMS]
+
+# 'keras' serves the .h5 files; 'tflite' serves the <name>.tflite files written by export_models.py
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras').lower()
+
+# Load models in the gunicorn master before fork so workers share them copy-on-write:
+# "1"/"all" for every fork-safe model, or a comma-separated list such as "disease"
+PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', '0')
+
+# TensorFlow is not fork-safe once its runtime is up: Keras models loaded in the master hang
+# on their first predict in a forked worker, so only these families can be preloaded.
+# TFLite models are safe: each worker thread creates its own interpreter over the shared file.
+FORK_SAFE_MODELS = ['disease'] if INFERENCE_BACKEND != 'tflite' else list(MODEL_FAMILIES)
+
+
+def preload_model_names():
+    if PRELOAD_MODELS.lower() in ('', '0', 'false', 'no'):
+        return []
+    if PRELOAD_MODELS.lower() in ('1', 'true', 'yes', 'all'):
+        names = list(MODEL_FAMILIES)
+    else:
+        names = [name.strip() for name in PRELOAD_MODELS.split(',') if name.strip() in MODEL_FAMILIES]
+    skipped = [name for name in names if name not in FORK_SAFE_MODELS]
+    if skipped:
+        logger.warning(f"Not preloading {skipped}: TensorFlow models are loaded in each worker")
+    # Out-of-process families hold no model in the web workers, and their processes start after preloading
+    return [name for name in names if name in FORK_SAFE_MODELS and name not in INFERENCE_PROCESSES]
+
+
+# Empty unless some family can actually be preloaded; only then does the master import the app
+PRELOADED_MODELS = preload_model_names()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import server
+from admission import AdmissionGate, DeadlineExceeded, Overloaded, current_deadline
+
+
+class FakeBundle:
+    version = 'test'
+
+
+@pytest.fixture
+def stream_client(monkeypatch):
+    seen = []
+
+    def predict_chunk(bundle, chunk):
+        gate = server.admission_control.gates['predict_batch']
+        seen.append((gate.active, current_deadline()))
+        return [{'prediction': record['value']} for record in chunk]
+
+    monkeypatch.setattr(server.registry, 'get', lambda name: FakeBundle())
+    monkeypatch.setitem(server.BATCH_PREDICTORS, 'diabetes', predict_chunk)
+    monkeypatch.setattr(server, 'BATCH_CHUNK_SIZE', 1)
+    return server.app.test_client(), seen
+
+
+def ndjson(count):
+    return ''.join(json.dumps({'value': value}) + '\n' for value in range(count))
+
+
+def test_ndjson_stream_holds_its_admission_slot(stream_client):
+    client, seen = stream_client
+    gate = server.admission_control.gates['predict_batch']
+    response = client.post('/predict/diabetes/batch', data=ndjson(3), content_type='application/x-ndjson',
+                           headers={'X-Request-Timeout-Ms': '10000'}, buffered=False)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.iter_encoded()]
+    assert gate.active == 1
+    response.close()
+
+    assert [line['prediction'] for line in lines] == [0, 1, 2]
+    assert gate.active == 0
+    # Every chunk ran inside the gate and under the request deadline
+    assert len(seen) == 3
+    assert all(active == 1 for active, _ in seen)
+    assert all(deadline is not None and deadline > time.monotonic() for _, deadline in seen)
+
+
+def test_ndjson_stream_is_shed_when_the_gate_is_full(stream_client, monkeypatch):
+    client, _ = stream_client
+    gate = server.admission_control.gates['predict_batch']
+    monkeypatch.setattr(gate, 'active', gate.limit)
+    monkeypatch.setattr(gate, 'waiting', gate.queue)
+    response = client.post('/predict/diabetes/batch', data=ndjson(1), content_type='application/x-ndjson')
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+
+
+def test_json_batch_releases_its_slot(stream_client):
+    client, _ = stream_client
+    response = client.post('/predict/diabetes/batch', json=[{'value': 5}])
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [{'index': 0, 'prediction': 5}]
+    assert server.admission_control.gates['predict_batch'].active == 0
+
+
+def test_async_waiter_takes_the_slot_a_release_frees():
+    gate = AdmissionGate('test', limit=1, queue=1, max_wait=5)
+
+    async def scenario():
+        held = await gate.acquire_async()
+        waiter = asyncio.ensure_future(gate.acquire_async())
+        await asyncio.sleep(0.01)
+        assert gate.waiting == 1 and not waiter.done()
+        with pytest.raises(Overloaded) as shed:
+            await gate.acquire_async()
+        assert shed.value.status == 429
+        gate.release(held)
+        gate.release(await asyncio.wait_for(waiter, 1))
+
+    asyncio.run(scenario())
+    assert (gate.active, gate.waiting, gate.admitted) == (0, 0, 2)
+
+
+def test_async_waiter_gives_up_at_its_deadline():
+    gate = AdmissionGate('test', limit=1, queue=1, max_wait=5)
+
+    async def scenario():
+        held = await gate.acquire_async()
+        with pytest.raises(DeadlineExceeded):
+            await gate.acquire_async(time.monotonic() + 0.05)
+        gate.release(held)
+
+    asyncio.run(scenario())
+    assert gate.waiting == 0 and gate.rejected['deadline'] == 1
+
+
+@pytest.fixture
+def asgi_client(monkeypatch):
+    asgi = pytest.importorskip('asgi')
+    from starlette.testclient import TestClient
+
+    search = {'seconds': 0, 'active': []}
+
+    async def search_async(lat, lon, radius_km, limit):
+        search['active'].append(server.admission_control.gates['find_hospitals'].active)
+        await asyncio.sleep(search['seconds'])
+        return [{'name': 'General'}], 'live'
+
+    monkeypatch.setattr(server.hospital_finder, 'search_async', search_async)
+    return TestClient(asgi.app), search
+
+
+def test_async_hospitals_route_is_gated(asgi_client, monkeypatch):
+    client, search = asgi_client
+    gate = server.admission_control.gates['find_hospitals']
+    response = client.post('/hospitals', json={'lat': 1.0, 'lon': 2.0})
+    assert response.status_code == 200
+    assert search['active'] == [1] and gate.active == 0
+
+    monkeypatch.setattr(gate, 'active', gate.limit)
+    monkeypatch.setattr(gate, 'waiting', gate.queue)
+    response = client.post('/hospitals', json={'lat': 1.0, 'lon': 2.0})
+    assert response.status_code == 429
+    assert response.json()['reason'] == 'queue_full'
+    assert 'Retry-After' in response.headers
+    assert search['active'] == [1]
+
+
+def test_async_hospitals_route_stops_at_the_deadline(asgi_client):
+    client, search = asgi_client
+    search['seconds'] = 1
+    started = time.monotonic()
+    response = client.post('/hospitals', json={'lat': 1.0, 'lon': 2.0}, headers={'X-Request-Timeout-Ms': '50'})
+    assert response.status_code == 503
+    assert response.json()['reason'] == 'deadline'
+    assert time.monotonic() - started < 0.9
+    assert server.admission_control.gates['find_hospitals'].active == 0
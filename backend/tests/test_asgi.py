@@ -0,0 +1,50 @@
+import pytest
+
+import server
+
+asgi = pytest.importorskip('asgi')
+from starlette.testclient import TestClient  # noqa: E402
+
+
+class FakePool:
+    instances = []
+
+    def __init__(self, families):
+        self.families = families
+        self.running = False
+        FakePool.instances.append(self)
+
+    def start(self):
+        self.running = True
+        return self
+
+    def stop(self):
+        self.running = False
+
+
+def test_lifespan_initializes_the_worker_and_runs_the_inference_pool(monkeypatch):
+    started = []
+    FakePool.instances = []
+    monkeypatch.setattr(server, 'PRELOADED_MODELS', ['disease'])
+    monkeypatch.setattr(server, 'INFERENCE_PROCESSES', ['chest_xray'])
+    monkeypatch.setattr(server, 'InferencePool', FakePool)
+    monkeypatch.setattr(server, 'init_worker', lambda: started.append(True))
+
+    with TestClient(asgi.app):
+        assert started == [True]
+        [pool] = FakePool.instances
+        assert pool.families == ['chest_xray'] and pool.running
+    assert not pool.running
+
+
+def test_lifespan_skips_what_is_not_configured(monkeypatch):
+    started = []
+    FakePool.instances = []
+    monkeypatch.setattr(server, 'PRELOADED_MODELS', [])
+    monkeypatch.setattr(server, 'INFERENCE_PROCESSES', [])
+    monkeypatch.setattr(server, 'InferencePool', FakePool)
+    monkeypatch.setattr(server, 'init_worker', lambda: started.append(True))
+
+    with TestClient(asgi.app):
+        pass
+    assert started == [] and FakePool.instances == []
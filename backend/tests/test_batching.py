@@ -0,0 +1,115 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from admission import DeadlineExceeded
+from batching import MicroBatcher
+
+
+class GatedModel:
+    """Doubles its input; the first call blocks until ``release`` is set so others pile up."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.batches = []
+
+    def predict_on_batch(self, batch):
+        first = not self.batches
+        self.batches.append(len(batch))
+        if first:
+            self.started.set()
+            self.release.wait(5)
+        if self.fail:
+            raise RuntimeError('model failed')
+        return batch * 2
+
+
+def wait_in_flight(batcher, rows):
+    for _ in range(500):
+        if batcher._in_flight >= rows:
+            return
+        time.sleep(0.01)
+    raise AssertionError('rows were not submitted')
+
+
+def run_concurrently(batcher, model, values):
+    results = {}
+
+    def call(value):
+        try:
+            results[value] = batcher.predict(np.array([value], dtype=np.float32), timeout=5)
+        except Exception as e:
+            results[value] = e
+
+    first = threading.Thread(target=call, args=(values[0],))
+    first.start()
+    assert model.started.wait(5)
+    others = [threading.Thread(target=call, args=(value,)) for value in values[1:]]
+    for thread in others:
+        thread.start()
+    wait_in_flight(batcher, len(values))
+    model.release.set()
+    for thread in [first] + others:
+        thread.join(5)
+    return results
+
+
+def test_single_caller_does_not_wait_for_window():
+    batcher = MicroBatcher('single', lambda batch: batch * 2, max_wait_ms=2000)
+    try:
+        started = time.monotonic()
+        for value in range(3):
+            assert batcher.predict(np.array([value], dtype=np.float32), timeout=5)[0] == value * 2
+        assert time.monotonic() - started < 1.0
+        assert batcher.stats()['immediate'] == 3
+        assert batcher._worker is None or batcher._queue.qsize() == 0
+    finally:
+        batcher.close()
+
+
+def test_concurrent_callers_are_batched_in_order():
+    model = GatedModel()
+    batcher = MicroBatcher('ordered', model.predict_on_batch, max_wait_ms=2000)
+    try:
+        values = [1.0, 2.0, 3.0, 4.0, 5.0]
+        started = time.monotonic()
+        results = run_concurrently(batcher, model, values)
+        # The queued rows run as one batch as soon as the running row finishes, not after the window
+        assert time.monotonic() - started < 1.0
+        assert model.batches == [1, 4]
+        assert {value: float(output[0]) for value, output in results.items()} == {v: v * 2 for v in values}
+    finally:
+        batcher.close()
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    model = GatedModel(fail=True)
+    batcher = MicroBatcher('failing', model.predict_on_batch, max_wait_ms=2000)
+    try:
+        results = run_concurrently(batcher, model, [1.0, 2.0, 3.0])
+        assert model.batches == [1, 2]
+        assert all(isinstance(e, RuntimeError) for e in results.values())
+        # A failed batch does not leave rows counted as in flight
+        assert batcher._in_flight == 0
+        immediate = batcher.stats()['immediate']
+        with pytest.raises(RuntimeError):
+            batcher.predict(np.array([1.0], dtype=np.float32), timeout=5)
+        assert batcher.stats()['immediate'] == immediate + 1
+    finally:
+        batcher.close()
+
+
+def test_expired_row_is_not_run():
+    calls = []
+    batcher = MicroBatcher('expired', lambda batch: calls.append(len(batch)) or batch)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            batcher.predict(np.array([1.0]), timeout=5, deadline=time.monotonic() - 1)
+        assert calls == []
+        assert batcher.stats()['expired'] == 1
+    finally:
+        batcher.close()
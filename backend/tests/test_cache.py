@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+
+from admission import DeadlineExceeded, check_deadline, deadline_scope
+from cache import SingleFlight
+
+
+class BlockingCall:
+    """fn for SingleFlight.do: the first call blocks until ``release`` is set, later calls return at once."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        if self.calls == 1:
+            self.started.set()
+            self.release.wait(5)
+            check_deadline()
+            if self.error is not None:
+                raise self.error
+        return value * 2
+
+
+def wait_for_followers(flights, count):
+    for _ in range(500):
+        if flights.coalesced >= count:
+            return
+        time.sleep(0.01)
+    raise AssertionError('followers did not join the flight')
+
+
+def run(flights, fn, results, name, deadline=None):
+    def call():
+        with deadline_scope(deadline):
+            try:
+                results[name] = flights.do('key', fn, 21)
+            except Exception as e:
+                results[name] = e
+    thread = threading.Thread(target=call)
+    thread.start()
+    return thread
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    fn = BlockingCall()
+    results = {}
+    threads = [run(flights, fn, results, 'leader')]
+    assert fn.started.wait(5)
+    threads += [run(flights, fn, results, f'follower{index}') for index in range(3)]
+    wait_for_followers(flights, 3)
+    fn.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert fn.calls == 1
+    assert set(results.values()) == {42}
+    assert flights.stats()['in_flight'] == 0
+    assert (flights.executed, flights.coalesced) == (1, 3)
+
+
+def test_leader_error_reaches_every_follower():
+    flights = SingleFlight()
+    fn = BlockingCall(RuntimeError('model failed'))
+    results = {}
+    threads = [run(flights, fn, results, 'leader')]
+    assert fn.started.wait(5)
+    threads += [run(flights, fn, results, f'follower{index}') for index in range(2)]
+    wait_for_followers(flights, 2)
+    fn.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert fn.calls == 1
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) for result in results.values())
+    # The failed flight is gone, so the next caller runs again
+    assert flights.do('key', fn, 1) == 2
+
+
+def test_follower_with_time_left_reruns_after_the_leaders_deadline():
+    flights = SingleFlight()
+    fn = BlockingCall()
+    results = {}
+    leader = run(flights, fn, results, 'leader', deadline=time.monotonic() + 0.05)
+    assert fn.started.wait(5)
+    follower = run(flights, fn, results, 'follower', deadline=time.monotonic() + 10)
+    wait_for_followers(flights, 1)
+    time.sleep(0.06)
+    fn.release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert isinstance(results['leader'], DeadlineExceeded)
+    assert results['follower'] == 42
+    assert fn.calls == 2
+
+
+def test_follower_stops_waiting_at_its_own_deadline():
+    flights = SingleFlight()
+    fn = BlockingCall()
+    results = {}
+    leader = run(flights, fn, results, 'leader')
+    assert fn.started.wait(5)
+    started = time.monotonic()
+    with deadline_scope(time.monotonic() + 0.05):
+        with pytest.raises(DeadlineExceeded):
+            flights.do('key', fn, 21)
+    assert time.monotonic() - started < 1.0
+    fn.release.set()
+    leader.join(5)
+    assert results['leader'] == 42 and fn.calls == 1
+
+
+def test_leader_timeout_error_is_not_mistaken_for_the_followers_deadline():
+    flights = SingleFlight()
+    fn = BlockingCall(TimeoutError('upstream timed out'))
+    results = {}
+    threads = [run(flights, fn, results, 'leader')]
+    assert fn.started.wait(5)
+    threads.append(run(flights, fn, results, 'follower', deadline=time.monotonic() + 10))
+    wait_for_followers(flights, 1)
+    fn.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert type(results['follower']) is TimeoutError
+    assert fn.calls == 1
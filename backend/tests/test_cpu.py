@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Records the thread settings in the environment at the moment NumPy is first imported
+PROBE = '''
+import builtins, os, runpy, sys
+seen = []
+real_import = builtins.__import__
+def probe(name, *args, **kwargs):
+    if name == 'numpy' and 'numpy' not in sys.modules and not seen:
+        seen.append((os.environ.get('OMP_NUM_THREADS'), os.environ.get('TF_ENABLE_ONEDNN_OPTS')))
+    return real_import(name, *args, **kwargs)
+builtins.__import__ = probe
+{load}
+print(seen[0] if seen else None)
+'''
+
+
+@pytest.mark.parametrize('load', [
+    "runpy.run_path('gunicorn.conf.py')",
+    "import inference_pool",
+])
+def test_thread_settings_are_exported_before_numpy_loads(load):
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('OMP_NUM_THREADS', 'TF_ENABLE_ONEDNN_OPTS', 'INFERENCE_PROCESSES')}
+    env.update(CPU_THREADS='3', ONEDNN_ENABLED='0')
+    output = subprocess.run([sys.executable, '-c', PROBE.format(load=load)], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=60, check=True).stdout
+    assert output.strip().splitlines()[-1] == "('3', '0')"
@@ -0,0 +1,49 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    searches = []
+
+    def search(lat, lon, radius, limit):
+        searches.append((lat, lon, radius, limit))
+        return [], 'cache'
+
+    monkeypatch.setattr(server.hospital_finder, 'search', search)
+    test_client = server.app.test_client()
+    test_client.searches = searches
+    return test_client
+
+
+@pytest.mark.parametrize('body', [
+    {'lon': 13.4},
+    {'lat': 52.5},
+    {'lat': None, 'lon': 13.4},
+    {'lat': 'north', 'lon': 13.4},
+    {'lat': 'nan', 'lon': 13.4},
+    {'lat': 52.5, 'lon': 'inf'},
+    {'lat': 91, 'lon': 13.4},
+    {'lat': 52.5, 'lon': -180.5},
+    {'lat': 52.5, 'lon': 13.4, 'radius': 'nan'},
+    {'lat': 52.5, 'lon': 13.4, 'limit': 0},
+    [52.5, 13.4],
+])
+def test_invalid_queries_are_rejected(client, body):
+    response = client.post('/hospitals', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert not client.searches
+
+
+def test_body_that_is_not_json_is_rejected(client):
+    response = client.post('/hospitals', data='lat=52.5', content_type='text/plain')
+    assert response.status_code == 400
+
+
+def test_valid_query_reaches_the_search(client):
+    response = client.post('/hospitals', json={'lat': '52.5', 'lon': 13.4, 'radius': 5, 'limit': 3})
+    assert response.status_code == 200
+    assert response.get_json() == {'hospitals': []}
+    assert client.searches == [(52.5, 13.4, 5.0, 3)]
@@ -0,0 +1,144 @@
+import io
+import tarfile
+import threading
+import time
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from admission import DeadlineExceeded, deadline_scope
+from imaging import ImagePipeline, iter_study_images
+
+
+def png_bytes(value=128):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), (value, value, value)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def study_members():
+    return {
+        'study/001.png': png_bytes(),
+        'study/readme.txt': b'Exported by the PACS viewer\n',
+        'study/report.json': b'{"patient": "anonymous"}',
+        'study/002': png_bytes(64),
+        'study/003.jpg': b'not really a jpeg',
+    }
+
+
+def zip_upload(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return ('study.zip', 'application/zip', buffer)
+
+
+def tar_upload(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return ('study.tar.gz', 'application/gzip', buffer)
+
+
+@pytest.mark.parametrize('upload', [zip_upload, tar_upload])
+def test_archives_skip_members_that_are_not_images(upload):
+    names = [name for name, _ in iter_study_images([upload(study_members())])]
+    # Image extensions are kept (a broken one still fails later); others only if the bytes are an image
+    assert names == ['study/001.png', 'study/002', 'study/003.jpg']
+
+
+class SlowModel:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.calls = 0
+
+    def predict_on_batch(self, batch):
+        self.calls += 1
+        time.sleep(self.seconds)
+        return np.full((len(batch), 1), 0.5, dtype=np.float32)
+
+
+def test_study_stops_at_the_deadline_between_chunks():
+    model = SlowModel(0.1)
+    pipeline = ImagePipeline('test', model, max_batch_size=1, size=(32, 32))
+    images = [(f'{index}.png', io.BytesIO(png_bytes())) for index in range(6)]
+
+    with deadline_scope(time.monotonic() + 0.05):
+        with pytest.raises(DeadlineExceeded):
+            pipeline.predict_study(images)
+    assert model.calls == 1
+
+
+def test_study_scores_every_image_within_the_deadline():
+    pipeline = ImagePipeline('test', SlowModel(0), max_batch_size=2, size=(32, 32))
+    images = [(f'{index}.png', io.BytesIO(png_bytes())) for index in range(3)] + [('bad.png', io.BytesIO(b'x'))]
+
+    with deadline_scope(time.monotonic() + 10):
+        results = pipeline.predict_study(images)
+    assert [(name, error) for name, _, error in results] == [
+        ('0.png', None), ('1.png', None), ('2.png', None), ('bad.png', 'Invalid image file')
+    ]
+
+
+class MeanModel:
+    """Returns each image's mean pixel; the first call blocks until ``release`` is set."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.batches = []
+
+    def predict_on_batch(self, batch):
+        if not self.batches:
+            self.started.set()
+            self.release.wait(5)
+        self.batches.append(len(batch))
+        return batch.reshape(len(batch), -1).mean(axis=1, keepdims=True)
+
+
+def test_single_image_does_not_wait_for_batch_window():
+    pipeline = ImagePipeline('test', SlowModel(0), max_wait_ms=2000, size=(32, 32))
+    try:
+        started = time.monotonic()
+        assert pipeline.predict(io.BytesIO(png_bytes()))[0] == pytest.approx(0.5)
+        assert time.monotonic() - started < 1.0
+    finally:
+        pipeline.batcher.close()
+
+
+def test_images_arriving_while_one_runs_share_a_batch():
+    model = MeanModel()
+    pipeline = ImagePipeline('test', model, max_wait_ms=2000, size=(32, 32))
+    values = [32, 64, 128, 192, 255]
+    results = {}
+
+    def call(value):
+        results[value] = float(pipeline.predict(io.BytesIO(png_bytes(value)))[0])
+
+    try:
+        threads = [threading.Thread(target=call, args=(value,)) for value in values]
+        threads[0].start()
+        assert model.started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        for _ in range(500):
+            if pipeline.batcher._in_flight == len(values):
+                break
+            time.sleep(0.01)
+        started = time.monotonic()
+        model.release.set()
+        for thread in threads:
+            thread.join(5)
+        assert time.monotonic() - started < 1.0
+        assert model.batches == [1, 4]
+        assert results == {value: pytest.approx(value / 255.0) for value in values}
+    finally:
+        pipeline.batcher.close()
@@ -0,0 +1,123 @@
+import threading
+from multiprocessing.connection import Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from inference_pool import RemoteModel, attach
+
+
+class FakeInferenceProcess:
+    """Answers forward passes like serve() does, with row sums instead of a model."""
+
+    def __init__(self, address):
+        self.listener = Listener(address, family='AF_UNIX', authkey=b'test')
+        self.conns = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        segment = None
+        try:
+            while True:
+                path, name, shape, dtype = conn.recv()
+                if segment is None or segment.name != name:
+                    segment = attach(name)
+                batch = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+                output = batch.sum(axis=1, keepdims=True)
+                del batch
+                conn.send(('ok', output))
+        except Exception:
+            # Closed by stop(), like a killed process
+            pass
+
+    def stop(self):
+        self.listener.close()
+        for conn in self.conns:
+            conn.close()
+
+
+@pytest.fixture
+def address(tmp_path, monkeypatch):
+    monkeypatch.setenv('INFERENCE_AUTHKEY', 'test')
+    return str(tmp_path / 'chest_xray.sock')
+
+
+def remote_model(address):
+    model = RemoteModel('chest_xray', 'chest_xray_model.h5', connect_timeout=2)
+    model.address = address
+    return model
+
+
+def segment_exists(name):
+    try:
+        SharedMemory(name=name).close()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def test_reconnects_once_after_the_process_restarts(address):
+    process = FakeInferenceProcess(address)
+    model = remote_model(address)
+    batch = np.ones((2, 3), dtype=np.float32)
+    assert model.predict_on_batch(batch).ravel().tolist() == [3.0, 3.0]
+    stale_segment = model._local.segment.name
+
+    # The supervisor replaced the process; this thread still holds the old socket
+    process.stop()
+    process = FakeInferenceProcess(address)
+    try:
+        assert model.predict_on_batch(batch * 2).ravel().tolist() == [6.0, 6.0]
+    finally:
+        process.stop()
+    assert (model.errors, model.retries, model.reconnects) == (0, 1, 2)
+    # The dropped connection's segment was released, not left for the resource tracker
+    assert not segment_exists(stale_segment)
+    model.close()
+
+
+def test_gives_up_when_the_process_stays_down(address):
+    process = FakeInferenceProcess(address)
+    model = remote_model(address)
+    model.connect_timeout = 0.3
+    model.predict_on_batch(np.ones((1, 3), dtype=np.float32))
+    process.stop()
+
+    with pytest.raises(Exception) as failure:
+        model.predict_on_batch(np.ones((1, 3), dtype=np.float32))
+    assert failure.value.status == 503
+    assert model._local.segment is None
+
+
+def test_close_releases_every_threads_segment(address):
+    process = FakeInferenceProcess(address)
+    model = remote_model(address)
+    names = []
+
+    def call():
+        model.predict_on_batch(np.ones((4, 3), dtype=np.float32))
+        names.append(model._local.segment.name)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(names)) == 3 and all(segment_exists(name) for name in names)
+
+    model.close()
+    assert not any(segment_exists(name) for name in names)
+    # A late call on a closed model opens a new connection instead of using a closed one
+    assert model.predict_on_batch(np.ones((1, 3), dtype=np.float32)).ravel().tolist() == [3.0]
+    model.close()
+    process.stop()
@@ -0,0 +1,74 @@
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import server
+from batching import MicroBatcher
+from encoders import DiabetesEncoder
+
+SAMPLE = re.compile(r'^(\w+)(\{.*\})? (\S+)$')
+
+
+def scrape(client):
+    """(types by family, {(sample name, labels): value}) from a /metrics response."""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    types, samples = {}, {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('# TYPE '):
+            _, _, family, kind = line.split(' ')
+            types[family] = kind
+        elif line and not line.startswith('#'):
+            name, labels, value = SAMPLE.match(line).groups()
+            samples[(name, labels or '')] = float(value)
+    return types, samples
+
+
+@pytest.fixture
+def diabetes_client(monkeypatch):
+    scaler = SimpleNamespace(mean_=np.zeros(3), scale_=np.ones(3))
+    label_encoder = SimpleNamespace(classes_=np.array(['High', 'Low', 'Moderate']))
+    batcher = MicroBatcher('diabetes-metrics', lambda batch: np.full((len(batch), 1), 0.7, dtype=np.float32))
+    bundle = SimpleNamespace(name='diabetes', version='test', signature='metrics-test', lookup=None,
+                             encoder=DiabetesEncoder(scaler, label_encoder), batcher=batcher)
+    monkeypatch.setattr(server.registry, 'get', lambda name: bundle)
+    monkeypatch.setattr(server, 'prediction_cache', None)
+    yield server.app.test_client()
+    batcher.close()
+
+
+def test_metrics_after_one_prediction(diabetes_client):
+    client = diabetes_client
+    _, before = scrape(client)
+
+    response = client.post('/predict/diabetes', json={'age': 50, 'bmi': 30, 'skin_thickness': 20, 'glucose': 140,
+                                                      'physical_activity': 'Low'})
+    assert response.status_code == 200
+    assert response.get_json()['risk'] == 'High'
+    types, after = scrape(client)
+
+    def delta(name, labels):
+        return after.get((name, labels), 0) - before.get((name, labels), 0)
+
+    # Request latency and one stage_seconds series per pipeline stage the route went through
+    assert types['healthbot_request_seconds'] == 'histogram'
+    assert delta('healthbot_request_seconds_count',
+                 '{route="predict_diabetes",method="POST",status="200"}') == 1
+    assert types['healthbot_stage_seconds'] == 'histogram'
+    for stage in ('parse', 'encode', 'scale', 'predict', 'serialize'):
+        labels = f'{{route="predict_diabetes",stage="{stage}"}}'
+        assert delta('healthbot_stage_seconds_count', labels) == 1
+        assert after[('healthbot_stage_seconds_bucket', labels[:-1] + ',le="+Inf"}')] == \
+            after[('healthbot_stage_seconds_count', labels)]
+        assert after[('healthbot_stage_seconds_sum', labels)] >= 0
+
+    # Every *_total family is a counter, and the prediction ran once through the single-flight layer
+    totals = {family for family in types if family.endswith('_total')}
+    assert {'healthbot_coalesced_total', 'healthbot_coalesce_executed_total'} <= totals
+    assert all(types[family] == 'counter' for family in totals)
+    assert delta('healthbot_coalesce_executed_total', '{kind="predictions"}') == 1
+    assert delta('healthbot_coalesced_total', '{kind="predictions"}') == 0
+    assert after[('healthbot_requests_in_flight', '{route="predict_diabetes"}')] == 0
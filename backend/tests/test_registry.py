@@ -0,0 +1,69 @@
+import gc
+import threading
+import weakref
+
+import numpy as np
+
+from batching import MicroBatcher
+from registry import ModelRegistry
+
+
+class FakeModel:
+    def predict_on_batch(self, batch):
+        return np.asarray(batch, dtype=np.float32).sum(axis=1, keepdims=True)
+
+
+def batcher_threads(name):
+    return [thread for thread in threading.enumerate() if thread.name == f'batcher-{name}']
+
+
+def make_registry(tmp_path, models, name):
+    (tmp_path / 'model.bin').write_bytes(b'weights')
+    registry = ModelRegistry(str(tmp_path))
+
+    def load(resolve):
+        resolve('model.bin')
+        model = FakeModel()
+        models.append(weakref.ref(model))
+        return {'model': model, 'batcher': MicroBatcher(name, model.predict_on_batch, max_wait_ms=1)}
+
+    registry.register(name, ['model.bin'], load, smoke=lambda bundle: bundle.batcher.predict([1.0, 2.0]))
+    return registry
+
+
+def test_reload_keeps_batcher_threads_flat(tmp_path):
+    models = []
+    registry = make_registry(tmp_path, models, 'diabetes')
+    registry.get('diabetes')
+    registry.reload('diabetes')
+    baseline = len(batcher_threads('diabetes'))
+    assert baseline == 2
+
+    for _ in range(6):
+        bundle = registry.reload('diabetes')
+        assert float(bundle.batcher.predict([1.0, 2.0])[0]) == 3.0
+
+    assert len(batcher_threads('diabetes')) == baseline
+    gc.collect()
+    # Only the serving bundle and the one kept for rollback hold a model
+    assert sum(ref() is not None for ref in models) == 2
+
+
+def test_rollback_keeps_both_batchers_running(tmp_path):
+    registry = make_registry(tmp_path, [], 'heart')
+    registry.get('heart')
+    registry.reload('heart')
+    registry.rollback('heart')
+    family = registry.families['heart']
+    for bundle in (family.current, family.previous):
+        assert float(bundle.batcher.predict([2.0, 2.0])[0]) == 4.0
+    assert len(batcher_threads('heart')) == 2
+
+
+def test_closed_batcher_runs_late_rows_inline():
+    batcher = MicroBatcher('late', FakeModel().predict_on_batch)
+    assert float(batcher.predict([1.0, 1.0])[0]) == 2.0
+    batcher.close()
+    assert not batcher_threads('late')
+    assert float(batcher.predict([1.0, 4.0])[0]) == 5.0
+    assert not batcher_threads('late')
@@ -0,0 +1,364 @@
+"""Offline load-test and micro-benchmark suite for the backend endpoints.
+
+    python tools/bench.py --output results.json
+    python tools/bench.py --endpoints diabetes,chest_xray --concurrency 1,8,32 --duration 15
+    python tools/bench.py --baseline baseline.json --tolerance 0.15      # exits 1 on a regression
+    python tools/bench.py --micro --output micro.json
+
+The load test generates stand-in models (tools/make_standin_models.py) unless --model-dir
+is given, and serves Overpass/Nominatim from tools/mock_osm.py in-process. It then starts
+gunicorn with result caching off. Each endpoint runs at every concurrency level for
+--duration seconds, recording requests/s, p50/p95/p99 latency, errors and the server's total
+RSS/PSS (master plus workers). --micro times the in-process hot paths (encoders, boosters,
+image decode, hospital ranking, cache keys) without HTTP.
+
+Results are JSON keyed by ``<endpoint>@<concurrency>``. With --baseline, every key present
+in both runs is compared: throughput below or p99 above the baseline by more than
+--tolerance (or micro timings slower by more than it) counts as a regression. Compare
+runs from the same machine only.
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+from PIL import Image
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(TOOLS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from metrics import process_memory  # noqa: E402
+
+DEFAULT_ENDPOINTS = 'disease,diabetes,heart_disease,mental_health,chest_xray,cancer,hospitals,diabetes_batch'
+HOSPITAL_POINTS = 50
+# Symptoms the frontend can send (server.SYMPTOM_FILES); the disease form carries only the selected ones
+SYMPTOMS = ('headache', 'cough', 'diarrhea', 'vomiting', 'shortnessofbreath', 'painchest', 'fatigue', 'chills',
+            'soretotouch')
+
+
+def image_png(size=256, seed=0):
+    image = Image.fromarray(np.random.default_rng(seed).integers(0, 255, (size, size, 3), dtype=np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def symptom_form(rng):
+    # The view treats every form key as a present symptom, whatever its value
+    selected = [symptom for symptom in SYMPTOMS if rng.integers(0, 2)]
+    return {symptom: '1' for symptom in ['fever'] + selected}
+
+
+def diabetes_record(rng):
+    return {'age': int(rng.integers(20, 80)), 'bmi': float(rng.uniform(18, 40)), 'skin_thickness': 20,
+            'glucose': float(rng.uniform(70, 200)), 'physical_activity': 'High'}
+
+
+def endpoint_requests(rng):
+    """name -> function(session, base_url, rng) sending one request; inputs vary so results are not reused.
+
+    ``rng`` here only draws the fixed hospital points. Each call draws its inputs from the rng
+    it is given, one per client thread (a numpy Generator is not thread-safe).
+    """
+    png = image_png()
+    # A fixed set of points, so the hospital cache sees realistic repeats
+    points = [(17.3 + float(rng.uniform(-0.2, 0.2)), 78.4 + float(rng.uniform(-0.2, 0.2))) for _ in range(HOSPITAL_POINTS)]
+    return {
+        'disease': lambda s, url, rng: s.post(f'{url}/predict/disease', data=symptom_form(rng)),
+        'diabetes': lambda s, url, rng: s.post(f'{url}/predict/diabetes', json=diabetes_record(rng)),
+        'heart_disease': lambda s, url, rng: s.post(f'{url}/predict/heart_disease', json={
+            'age': int(rng.integers(20, 80)), 'blood_pressure': float(rng.uniform(90, 180)), 'smoking': 1,
+            'bmi': float(rng.uniform(18, 40)), 'chest_pain': 'Asymptomatic'}),
+        'mental_health': lambda s, url, rng: s.post(f'{url}/predict/mental_health', json={
+            'age': float(rng.uniform(18, 80)), 'sleep_quality': 'Poor', 'mood_frequency': 'Often',
+            'social_activity': 'Low', 'mental_health_history': 1}),
+        'chest_xray': lambda s, url, rng: s.post(f'{url}/predict/chest_xray',
+                                                 files={'file': ('xray.png', png, 'image/png')}),
+        'cancer': lambda s, url, rng: s.post(f'{url}/predict/cancer', files={'file': ('lesion.png', png, 'image/png')}),
+        'hospitals': lambda s, url, rng: s.post(f'{url}/hospitals', json=dict(zip(
+            ('lat', 'lon'), points[int(rng.integers(0, len(points)))]))),
+        'diabetes_batch': lambda s, url, rng: s.post(f'{url}/predict/diabetes/batch',
+                                                     json=[diabetes_record(rng) for _ in range(100)])
+    }
+
+
+def start_server(port, model_dir, env=None, workers=1):
+    server_env = dict(os.environ, PORT=str(port), MODEL_DIR=model_dir, WEB_CONCURRENCY=str(workers), EAGER_LOAD='1',
+                      PREDICTION_CACHE_ENABLED='0', MENTAL_HEALTH_LOOKUP_TABLE='0', **(env or {}))
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+         '--chdir', BACKEND_DIR, 'server:app'],
+        env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def wait_ready(url, endpoints, timeout, attempts=4, seed=0):
+    # Every worker must answer every endpoint before timing starts
+    deadline = time.monotonic() + timeout
+    session = requests.Session()
+    rng = np.random.default_rng(seed)
+    while time.monotonic() < deadline:
+        try:
+            if all(call(session, url, rng).status_code == 200
+                   for call in endpoints.values() for _ in range(attempts)):
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def drive(url, endpoints, concurrency, duration, seed=0):
+    """Round-robin over ``endpoints`` from ``concurrency`` client threads; returns (latencies, errors) per endpoint.
+
+    Client ``i`` draws its request inputs from its own ``default_rng([seed, i])``, so each
+    client's input sequence is the same on every run.
+    """
+    samples = {name: [] for name in endpoints}
+    errors = {name: 0 for name in endpoints}
+    lock = threading.Lock()
+    order = itertools.cycle(endpoints)
+    deadline = time.monotonic() + duration
+
+    def client(client_id):
+        session = requests.Session()
+        rng = np.random.default_rng([seed, client_id])
+        while time.monotonic() < deadline:
+            with lock:
+                name = next(order)
+            started = time.perf_counter()
+            try:
+                ok = endpoints[name](session, url, rng).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    samples[name].append(elapsed)
+                else:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=client, args=(client_id,)) for client_id in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors
+
+
+def summarize(latencies, errors, duration):
+    latencies = np.array(latencies)
+
+    def percentile(q):
+        return round(float(np.percentile(latencies, q)) * 1000, 3) if len(latencies) else None
+
+    return {
+        'requests': int(len(latencies)),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / duration, 2),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99)
+    }
+
+
+def process_tree(pid):
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            for child in f.read().split():
+                pids.extend(process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def server_memory(pid):
+    # Total over the gunicorn master and its workers, in KiB; PSS counts shared pages once
+    totals = {'rss_kb': 0, 'pss_kb': 0}
+    for member in process_tree(pid):
+        memory = process_memory(member)
+        totals['rss_kb'] += memory.get('VmRSS', 0)
+        totals['pss_kb'] += memory.get('Pss', 0)
+    return totals
+
+
+def run_load(args):
+    from mock_osm import serve as serve_osm
+
+    model_dir = args.model_dir
+    if model_dir is None:
+        from make_standin_models import generate
+        model_dir = generate(os.path.join(tempfile.mkdtemp(prefix='healthbot-bench-'), 'models'))
+
+    osm = serve_osm(args.mock_port, delay_ms=args.upstream_delay_ms)
+    threading.Thread(target=osm.serve_forever, daemon=True).start()
+    env = {
+        'OVERPASS_URL': f'http://127.0.0.1:{args.mock_port}/api/interpreter',
+        'NOMINATIM_URL': f'http://127.0.0.1:{args.mock_port}/search',
+        **dict(item.split('=', 1) for item in args.env)
+    }
+    url = f'http://127.0.0.1:{args.port}'
+    available = endpoint_requests(np.random.default_rng(args.seed))
+    endpoints = {name: available[name] for name in args.endpoints.split(',')}
+
+    server = start_server(args.port, model_dir, env, args.workers)
+    results = {}
+    try:
+        if not wait_ready(url, endpoints, args.startup_timeout, seed=args.seed):
+            raise SystemExit('Server did not become ready')
+        for name, concurrency in itertools.product(endpoints, args.concurrency):
+            samples, errors = drive(url, {name: endpoints[name]}, concurrency, args.duration, args.seed)
+            result = summarize(samples[name], errors[name], args.duration)
+            result.update(server_memory(server.pid), endpoint=name, concurrency=concurrency)
+            results[f'{name}@{concurrency}'] = result
+            print(f"{name:>15} @ {concurrency:<3} {result['throughput_rps']:>9} req/s  p50 {result['p50_ms']} ms  "
+                  f"p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  errors {result['errors']}  "
+                  f"PSS {result['pss_kb'] // 1024} MiB", file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait()
+        osm.shutdown()
+    return results
+
+
+def time_calls(fn, iterations, warmup=20):
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(iterations)
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - started
+    return {
+        'iterations': iterations,
+        'mean_us': round(float(timings.mean()) * 1e6, 3),
+        'p50_us': round(float(np.percentile(timings, 50)) * 1e6, 3),
+        'p99_us': round(float(np.percentile(timings, 99)) * 1e6, 3)
+    }
+
+
+def run_micro(args):
+    model_dir = args.model_dir
+    if model_dir is None:
+        from make_standin_models import generate
+        model_dir = generate(os.path.join(tempfile.mkdtemp(prefix='healthbot-bench-'), 'models'))
+    os.environ.update(MODEL_DIR=model_dir, PREDICTION_CACHE_ENABLED='0', MENTAL_HEALTH_LOOKUP_TABLE='0')
+    import server
+    from cache import PredictionCache
+    from hospitals import Candidates, haversine_km, top_k
+    from imaging import decode_image
+
+    rng = np.random.default_rng(args.seed)
+    diabetes = server.registry.get('diabetes')
+    disease = server.registry.get('disease')
+    record = diabetes_record(rng)
+    row = diabetes.encoder.encode([record])[0][0].copy()
+    rows = diabetes.encoder.encode([diabetes_record(rng) for _ in range(512)], out=np.empty((512, diabetes.encoder.width),
+                                                                                           dtype=np.float32))[0]
+    symptoms = disease.encoder.encode([['fever', 'cough', 'headache']])[0]
+    png = image_png()
+    candidates = Candidates([{'name': f'H{i}', 'address': 'a', 'phone': 'p', 'lat': 17 + float(rng.uniform(-0.5, 0.5)),
+                              'lon': 78 + float(rng.uniform(-0.5, 0.5))} for i in range(5000)])
+
+    benchmarks = {
+        'diabetes_encode': lambda: diabetes.encoder.encode([record]),
+        'diabetes_predict_row': lambda: diabetes.model.predict_on_batch(row[None, :]),
+        'diabetes_predict_batch_512': lambda: diabetes.model.predict_on_batch(rows),
+        'disease_encode': lambda: disease.encoder.encode([['fever', 'cough', 'headache']]),
+        'disease_predict': lambda: server.predict_symptoms(disease.booster, disease.encoder, symptoms),
+        'image_decode_224': lambda: decode_image(io.BytesIO(png)),
+        'hospital_rank_5000': lambda: top_k(haversine_km(17.0, 78.0, candidates.lat, candidates.lon), 5),
+        'prediction_cache_key': lambda: PredictionCache.key('diabetes', 'v1', row)
+    }
+    results = {}
+    for name, fn in benchmarks.items():
+        results[name] = time_calls(fn, args.iterations)
+        print(f"{name:>28}  mean {results[name]['mean_us']} us  p99 {results[name]['p99_us']} us", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of regression descriptions for keys present in both runs."""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if 'throughput_rps' in result:
+            if before['throughput_rps'] and result['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+                regressions.append(f"{key}: throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+            if before['p99_ms'] and result['p99_ms'] and result['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+                regressions.append(f"{key}: p99 {before['p99_ms']} -> {result['p99_ms']} ms")
+            if result['errors'] > before['errors']:
+                regressions.append(f"{key}: errors {before['errors']} -> {result['errors']}")
+        elif result['mean_us'] > before['mean_us'] * (1 + tolerance):
+            regressions.append(f"{key}: mean {before['mean_us']} -> {result['mean_us']} us")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load tests and micro-benchmarks for the backend.')
+    parser.add_argument('--micro', action='store_true', help='time in-process hot paths instead of HTTP endpoints')
+    parser.add_argument('--endpoints', default=DEFAULT_ENDPOINTS)
+    parser.add_argument('--concurrency', type=lambda value: [int(c) for c in value.split(',')], default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per endpoint and concurrency level')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=2000, help='calls per micro-benchmark')
+    parser.add_argument('--model-dir', help='serve these models instead of generated stand-ins')
+    parser.add_argument('--upstream-delay-ms', type=float, default=50.0, help='mock Overpass/Nominatim latency')
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--mock-port', type=int, default=8098)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--startup-timeout', type=float, default=180.0)
+    parser.add_argument('--env', action='append', default=[], help='extra server setting, NAME=VALUE (repeatable)')
+    parser.add_argument('--output', help='write the JSON results here as well')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    results = run_micro(args) if args.micro else run_load(args)
+    report = {
+        'suite': 'micro' if args.micro else 'load',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'results': results
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get('results', {}), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Throughput and tail latency of the real endpoints across gunicorn worker x thread layouts.
+
+    python tools/bench_layouts.py --layouts 1x4,2x2,4x1 --concurrency 8 --duration 20
+    python tools/bench_layouts.py --layouts 2x2 --onednn 0,1 --affinity 0,1 --output layouts.json
+
+Each layout starts gunicorn with WEB_CONCURRENCY=<workers> and CPU_THREADS=<threads>, waits
+until the models are loaded, drives a round-robin mix of endpoints from --concurrency client
+threads for --duration seconds and reports requests/s with p50/p99 latency, overall and per
+endpoint. Result caching is turned off so every request reaches a model.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from bench import BACKEND_DIR, drive, endpoint_requests, summarize, wait_ready
+
+
+def start_server(port, workers, threads, onednn, affinity, extra_env):
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), CPU_THREADS=str(threads),
+               ONEDNN_ENABLED=str(onednn), TF_ENABLE_ONEDNN_OPTS=str(onednn), CPU_AFFINITY=str(affinity),
+               EAGER_LOAD='1', PREDICTION_CACHE_ENABLED='0', MENTAL_HEALTH_LOOKUP_TABLE='0', **extra_env)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+         '--chdir', BACKEND_DIR, 'server:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def parse_layouts(value):
+    layouts = []
+    for item in value.split(','):
+        workers, threads = item.lower().split('x')
+        layouts.append((int(workers), int(threads)))
+    return layouts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark gunicorn worker x thread layouts on the real endpoints.')
+    parser.add_argument('--layouts', type=parse_layouts, default=parse_layouts('1x4,2x2,4x1'),
+                        help='comma-separated <workers>x<threads per worker>')
+    parser.add_argument('--onednn', default='1', help='comma-separated oneDNN settings to cross with the layouts')
+    parser.add_argument('--affinity', default='0', help='comma-separated CPU_AFFINITY settings')
+    parser.add_argument('--endpoints', default='disease,diabetes,heart_disease,mental_health,chest_xray')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--startup-timeout', type=float, default=180.0)
+    parser.add_argument('--env', action='append', default=[], help='extra server setting, NAME=VALUE (repeatable)')
+    parser.add_argument('--output', help='write the JSON results here as well')
+    args = parser.parse_args()
+
+    url = f'http://127.0.0.1:{args.port}'
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    rng = np.random.default_rng(0)
+    available = endpoint_requests(rng)
+    endpoints = {name: available[name] for name in args.endpoints.split(',')}
+
+    results = []
+    for (workers, threads), onednn, affinity in itertools.product(
+            args.layouts, args.onednn.split(','), args.affinity.split(',')):
+        layout = {'workers': workers, 'threads': threads, 'onednn': onednn, 'affinity': affinity}
+        server = start_server(args.port, workers, threads, onednn, affinity, extra_env)
+        try:
+            if not wait_ready(url, endpoints, args.startup_timeout):
+                results.append(dict(layout, error='server did not become ready'))
+                continue
+            samples, errors = drive(url, endpoints, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        result = dict(layout, **summarize(list(itertools.chain(*samples.values())), sum(errors.values()), args.duration))
+        result['endpoints'] = {name: summarize(samples[name], errors[name], args.duration) for name in endpoints}
+        results.append(result)
+        print(f"{workers}x{threads} onednn={onednn} affinity={affinity}: {result['throughput_rps']} req/s, "
+              f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms", file=sys.stderr)
+
+    report = {'concurrency': args.concurrency, 'duration_seconds': args.duration, 'cpus': os.cpu_count(),
+              'results': results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
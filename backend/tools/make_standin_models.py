@@ -0,0 +1,108 @@
+"""Generate tiny stand-in models with the same files, inputs and outputs as the real artifacts.
+
+    python tools/make_standin_models.py --output /tmp/standin-models
+    MODEL_DIR=/tmp/standin-models python server.py
+
+The models are untrained and their predictions meaningless. They let the server, benchmarks
+and load tests run offline and quickly. Shapes come from the encoders and the image
+pipeline, so the stand-ins follow them if those change. Generation is seeded, so the same
+files come out every time.
+"""
+import argparse
+import os
+import pickle
+import sys
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import joblib  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from sklearn.preprocessing import LabelEncoder, StandardScaler  # noqa: E402
+
+from encoders import (  # noqa: E402
+    CHEST_PAIN_MAPPING, SYMPTOM_MAPPING, DiabetesEncoder, HeartDiseaseEncoder, MentalHealthEncoder
+)
+from imaging import IMAGE_SIZE  # noqa: E402
+
+DISEASES = ['Flu', 'Cold', 'Covid', 'Asthma', 'Migraine']
+# Besides the mapped symptoms, the real booster has many features the frontend never sends
+EXTRA_SYMPTOM_FEATURES = 68
+
+
+def dense_model(keras, width):
+    return keras.Sequential([
+        keras.Input((width,)),
+        keras.layers.Dense(4, activation='relu'),
+        keras.layers.Dense(1, activation='sigmoid')
+    ])
+
+
+def image_model(keras):
+    return keras.Sequential([
+        keras.Input(IMAGE_SIZE + (3,)),
+        keras.layers.Conv2D(2, 3, strides=8),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(1, activation='sigmoid')
+    ])
+
+
+def fit_scaler(rng, columns, scale):
+    return StandardScaler().fit(pd.DataFrame(rng.rand(20, len(columns)) * scale, columns=columns))
+
+
+def generate(output, seed=0):
+    import keras
+    import xgboost as xgb
+
+    os.makedirs(output, exist_ok=True)
+    keras.utils.set_random_seed(seed)
+    rng = np.random.RandomState(seed)
+
+    dense_model(keras, len(DiabetesEncoder.columns)).save(os.path.join(output, 'diabetes_best_model.h5'))
+    dense_model(keras, len(HeartDiseaseEncoder.columns)).save(os.path.join(output, 'heart_disease_best_model.h5'))
+    dense_model(keras, len(MentalHealthEncoder.columns)).save(os.path.join(output, 'mental_health_best_model.h5'))
+    image_model(keras).save(os.path.join(output, 'chest_xray_model.h5'))
+    image_model(keras).save(os.path.join(output, 'skin_lesion_inceptionv3_model.h5'))
+
+    joblib.dump(fit_scaler(rng, DiabetesEncoder.scaled_columns, 50), os.path.join(output, 'diabetes_scaler.pkl'))
+    joblib.dump(LabelEncoder().fit(['Low', 'Moderate', 'High']), os.path.join(output, 'diabetes_label_encoder.pkl'))
+    joblib.dump(fit_scaler(rng, HeartDiseaseEncoder.scaled_columns, 100), os.path.join(output, 'heart_disease_scaler.pkl'))
+    joblib.dump(LabelEncoder().fit(sorted(CHEST_PAIN_MAPPING.values())),
+                os.path.join(output, 'heart_disease_label_encoder.pkl'))
+    joblib.dump(fit_scaler(rng, MentalHealthEncoder.scaled_columns, 80), os.path.join(output, 'mental_health_scaler.pkl'))
+    joblib.dump({
+        'sleep': LabelEncoder().fit(['Poor', 'Fair', 'Good']),
+        'mood': LabelEncoder().fit(['Rarely', 'Sometimes', 'Often', 'Always']),
+        'social': LabelEncoder().fit(['Low', 'Moderate', 'High'])
+    }, os.path.join(output, 'mental_health_label_encoders.pkl'))
+
+    features = list(SYMPTOM_MAPPING.values()) + [f'feature_{i}' for i in range(EXTRA_SYMPTOM_FEATURES)]
+    # The booster's feature order differs from top_features.pkl, as in the real artifacts
+    booster_order = list(features)
+    rng.shuffle(booster_order)
+    X = (rng.rand(200, len(features)) > 0.8).astype(float)
+    y = rng.randint(0, len(DISEASES), 200)
+    booster = xgb.train({'objective': 'multi:softprob', 'num_class': len(DISEASES), 'seed': seed},
+                        xgb.DMatrix(X, label=y, feature_names=booster_order), 5)
+    with open(os.path.join(output, 'xgb_model_streamlined.pkl'), 'wb') as f:
+        pickle.dump(booster, f)
+    with open(os.path.join(output, 'top_features.pkl'), 'wb') as f:
+        pickle.dump(np.array(features), f)
+    with open(os.path.join(output, 'label_encoder.pkl'), 'wb') as f:
+        pickle.dump(LabelEncoder().fit(DISEASES), f)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate tiny stand-in models for offline runs.')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.output, args.seed)
+    print(f'Stand-in models written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Local stand-in for the Groq API endpoints the chat apps call.
+
+    python tools/mock_groq.py --port 8091 [--delay-ms 300] [--tokens-per-second 200]
+    GROQ_BASE_URL=http://127.0.0.1:8091 GROQ_API_KEY=mock python app.py
+
+Serves chat completions (JSON or streamed, in the OpenAI-compatible format the SDK parses)
+and audio transcriptions. Replies are canned text, delayed like a model: ``--delay-ms``
+before the first token, then ``--tokens-per-second``. ``GET /stats`` returns request counts.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ('Stay hydrated and get plenty of rest. If your symptoms last more than a few days or get worse, '
+         'please see a doctor. Seek urgent care for chest pain or difficulty breathing.')
+
+
+class MockGroq:
+    def __init__(self, delay_ms=0.0, tokens_per_second=0.0):
+        self.delay = delay_ms / 1000.0
+        self.token_interval = 1.0 / tokens_per_second if tokens_per_second else 0.0
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, path):
+        with self.lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    def tokens(self):
+        words = REPLY.split(' ')
+        return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+    def completion(self, model):
+        tokens = self.tokens()
+        time.sleep(self.delay + self.token_interval * len(tokens))
+        return {
+            'id': 'chatcmpl-mock', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': REPLY}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': len(tokens), 'total_tokens': 10 + len(tokens)}
+        }
+
+    def chunks(self, model):
+        time.sleep(self.delay)
+        for token in self.tokens():
+            if self.token_interval:
+                time.sleep(self.token_interval)
+            yield {
+                'id': 'chatcmpl-mock', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+            }
+        yield {
+            'id': 'chatcmpl-mock', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+        }
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self.send_json(200, mock.counts)
+            else:
+                self.send_json(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            mock.count(self.path)
+            if self.path.endswith('/chat/completions'):
+                request = json.loads(body or b'{}')
+                model = request.get('model', 'mock')
+                if not request.get('stream'):
+                    self.send_json(200, mock.completion(model))
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for chunk in mock.chunks(model):
+                    self.write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+                self.write_chunk(b'data: [DONE]\n\n')
+                self.wfile.write(b'0\r\n\r\n')
+            elif self.path.endswith('/audio/transcriptions'):
+                time.sleep(mock.delay)
+                payload = b'I have a headache and a mild fever'
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            else:
+                self.send_json(404, {'error': {'message': 'not found'}})
+
+        def write_chunk(self, data):
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(port=8091, delay_ms=0.0, tokens_per_second=0.0):
+    return Server(('127.0.0.1', port), make_handler(MockGroq(delay_ms, tokens_per_second)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve mock Groq chat and transcription endpoints.')
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--delay-ms', type=float, default=0.0)
+    parser.add_argument('--tokens-per-second', type=float, default=0.0)
+    args = parser.parse_args()
+    server = serve(args.port, args.delay_ms, args.tokens_per_second)
+    print(f'Mock Groq listening on http://127.0.0.1:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Local stand-in for the Overpass and Nominatim APIs used by /hospitals.
+
+    python tools/mock_osm.py --port 8089 [--extract hospitals.json] [--delay-ms 50] [--fail-rate 0.1]
+    OVERPASS_URL=http://localhost:8089/api/interpreter NOMINATIM_URL=http://localhost:8089/search python server.py
+
+Hospitals come from an Overpass JSON extract or, by default, a deterministic synthetic grid
+around the origin of each query. ``GET /stats`` returns per-endpoint request counts.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+AROUND = re.compile(r'around:([\d.]+),(-?[\d.]+),(-?[\d.]+)')
+
+
+def synthetic_hospitals(lat, lon, radius_km, spacing_deg=0.01):
+    # Fixed global lattice, so overlapping queries see the same hospitals with the same ids
+    elements = []
+    span = int(math.ceil(radius_km / 111.0 / spacing_deg)) + 1
+    base_i, base_j = round(lat / spacing_deg), round(lon / spacing_deg)
+    for i in range(base_i - span, base_i + span + 1):
+        for j in range(base_j - span, base_j + span + 1):
+            h_lat, h_lon = i * spacing_deg, j * spacing_deg
+            node_id = (i * 1000003 + j) & 0x7fffffff
+            tags = {'amenity': 'hospital', 'name': f'Hospital {node_id}'}
+            # Some nodes lack contact details, like real OSM data
+            if node_id % 3:
+                tags['addr:street'] = f'{node_id % 97} Main Street'
+            if node_id % 4:
+                tags['phone'] = f'+1 555 {node_id % 10000:04d}'
+            elements.append({'type': 'node', 'id': node_id, 'lat': h_lat, 'lon': h_lon, 'tags': tags})
+    return elements
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+
+class MockOSM:
+    def __init__(self, extract=None, delay_ms=0.0, fail_rate=0.0):
+        self.extract = None
+        if extract:
+            with open(extract) as f:
+                data = json.load(f)
+            self.extract = data.get('elements', []) if isinstance(data, dict) else data
+        self.delay = delay_ms / 1000.0
+        self.fail_rate = fail_rate
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def hospitals(self, lat, lon, radius_km):
+        elements = self.extract if self.extract is not None else synthetic_hospitals(lat, lon, radius_km)
+        return [h for h in elements if haversine_km(lat, lon, h['lat'], h['lon']) <= radius_km]
+
+    def overpass(self, query):
+        match = AROUND.search(query.get('data', [''])[0])
+        if not match:
+            return 400, {'error': 'expected an around: filter'}
+        radius_m, lat, lon = map(float, match.groups())
+        return 200, {'elements': self.hospitals(lat, lon, radius_m / 1000.0)}
+
+    def nominatim(self, query):
+        try:
+            west, north, east, south = map(float, query['viewbox'][0].split(','))
+        except (KeyError, ValueError):
+            return 400, {'error': 'expected viewbox'}
+        limit = int(query.get('limit', ['10'])[0])
+        lat, lon = (north + south) / 2, (west + east) / 2
+        radius_km = haversine_km(lat, lon, north, east)
+        places = []
+        for h in self.hospitals(lat, lon, radius_km):
+            if not (south <= h['lat'] <= north and west <= h['lon'] <= east):
+                continue
+            tags = h.get('tags', {})
+            place = {
+                'lat': str(h['lat']), 'lon': str(h['lon']),
+                'display_name': f"{tags.get('name', 'Unknown')}, {tags.get('addr:street', 'Somewhere')}"
+            }
+            if 'phone' in tags:
+                place['phone'] = tags['phone']
+            places.append(place)
+        return 200, places[:limit]
+
+    def handle(self, path, query):
+        with self.lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+        if path == '/stats':
+            return 200, self.counts
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail_rate and random.random() < self.fail_rate:
+            return 503, {'error': 'injected failure'}
+        if path == '/api/interpreter':
+            return self.overpass(query)
+        if path == '/search':
+            return self.nominatim(query)
+        return 404, {'error': 'not found'}
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, body = mock.handle(url.path, parse_qs(url.query))
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once; the default backlog of 5 drops them
+    request_queue_size = 1024
+
+
+def serve(port=8089, extract=None, delay_ms=0.0, fail_rate=0.0):
+    return Server(('127.0.0.1', port), make_handler(MockOSM(extract, delay_ms, fail_rate)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve mock Overpass and Nominatim endpoints.')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--extract', help='Overpass JSON file to serve instead of synthetic hospitals')
+    parser.add_argument('--delay-ms', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    server = serve(args.port, args.extract, args.delay_ms, args.fail_rate)
+    print(f'Mock OSM listening on http://127.0.0.1:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
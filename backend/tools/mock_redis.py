@@ -0,0 +1,124 @@
+"""Minimal in-memory Redis stand-in for running the shared prediction cache locally.
+
+    python tools/mock_redis.py --port 6390
+    PREDICTION_CACHE_URL=redis://127.0.0.1:6390/0 gunicorn -c gunicorn.conf.py server:app
+
+Speaks enough of the protocol for redis-py's handshake and GET/SET (with EX/PX), DEL, PING,
+FLUSHALL and DBSIZE.
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+store = {}
+lock = threading.Lock()
+
+
+def encode(value, proto=2):
+    if value is None:
+        return b'_\r\n' if proto == 3 else b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, Exception):
+        return b'-ERR %s\r\n' % str(value).encode()
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode(item, proto) for item in value)
+    if isinstance(value, dict):
+        # RESP3 map, only sent as the HELLO 3 reply
+        return b'%%%d\r\n' % len(value) + b''.join(encode(k, 3) + encode(v, 3) for k, v in value.items())
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def read_command(rfile):
+    line = rfile.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        length = int(rfile.readline()[1:])
+        args.append(rfile.read(length + 2)[:-2])
+    return args
+
+
+def get(key):
+    entry = store.get(key)
+    if entry is None:
+        return None
+    value, expires = entry
+    if expires is not None and expires <= time.monotonic():
+        del store[key]
+        return None
+    return value
+
+
+def execute(args):
+    command = args[0].upper()
+    with lock:
+        if command == b'GET':
+            return get(args[1])
+        if command == b'SET':
+            expires = None
+            options = [arg.upper() for arg in args[3:]]
+            for i, option in enumerate(options):
+                if option in (b'EX', b'PX'):
+                    seconds = float(args[3 + i + 1]) / (1000.0 if option == b'PX' else 1.0)
+                    expires = time.monotonic() + seconds
+            store[args[1]] = (args[2], expires)
+            return 'OK'
+        if command == b'DEL':
+            return sum(1 for key in args[1:] if store.pop(key, None) is not None)
+        if command == b'DBSIZE':
+            return len(store)
+        if command == b'FLUSHALL' or command == b'FLUSHDB':
+            store.clear()
+            return 'OK'
+        if command == b'PING':
+            return 'PONG'
+        if command == b'HELLO':
+            proto = int(args[1]) if len(args) > 1 else 2
+            if proto == 2:
+                return [b'server', b'redis', b'version', b'7.0.0', b'proto', 2, b'mode', b'standalone']
+            return {b'server': b'redis', b'version': b'7.0.0', b'proto': proto, b'mode': b'standalone'}
+        if command in (b'CLIENT', b'SELECT'):
+            return 'OK'
+    return ValueError(f"unknown command '{command.decode()}'")
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        proto = 2
+        while True:
+            args = read_command(self.rfile)
+            if not args:
+                return
+            reply = execute(args)
+            if isinstance(reply, dict):
+                proto = reply[b'proto']
+            self.wfile.write(encode(reply, proto))
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def serve(port=6390):
+    return Server(('127.0.0.1', port), Handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a minimal in-memory Redis stand-in.')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    server = serve(args.port)
+    print(f'Mock Redis listening on redis://127.0.0.1:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
 import os
+import re
 from groq import Groq
 from gtts import gTTS
-import tempfile
 import base64
+import hashlib
+from io import BytesIO
+from urllib.parse import quote
 from dotenv import load_dotenv
-import time  # For slight delay if needed
 import json
+from cache import TTLCache
+from tips import TipMatcher
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,39 +27,174 @@ groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
 with open('health_tips.json', 'r') as f:
     health_tips = json.load(f)
 
+# Compiled once; scales to thousands of tips
+tip_matcher = TipMatcher(health_tips)
+
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "llama3-8b-8192")
+
+# Normalized question -> answer, so repeated questions skip the LLM
+response_cache = TTLCache(
+    int(os.environ.get("CHAT_CACHE_SIZE", "2048")),
+    float(os.environ.get("CHAT_CACHE_TTL", "3600"))
+)
+
+# Synthesized MP3 by content hash; canned tips and repeated answers are spoken once
+tts_cache = TTLCache(
+    int(os.environ.get("TTS_CACHE_SIZE", "512")),
+    float(os.environ.get("TTS_CACHE_TTL", "86400"))
+)
+
+# Sentence boundary for streamed speech: terminal punctuation followed by whitespace
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Sentences of a reply are synthesized in parallel while the next tokens are still generated;
+# chat_events sends each stream's audio in sentence order whichever finishes first
+tts_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("TTS_WORKERS", "4")), thread_name_prefix="tts")
+
 def analyze_voice(audio_data):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-        temp_audio.write(audio_data)
-        temp_audio_path = temp_audio.name
-
-    with open(temp_audio_path, "rb") as audio_file:
-        transcription = groq_client.audio.transcriptions.create(
-            model="whisper-large-v3-turbo",
-            file=audio_file,
-            response_format="text"
-        )
-    
-    os.unlink(temp_audio_path)  # Clean up WAV file
-    return transcription
+    # Uploaded straight from memory; the SDK takes a (filename, bytes) pair
+    return groq_client.audio.transcriptions.create(
+        model="whisper-large-v3-turbo",
+        file=("audio.wav", audio_data),
+        response_format="text"
+    )
+
+def normalize_question(text):
+    # Case, spacing and punctuation do not change the question
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
 
-def get_chat_response(text, language='en'):
+def response_cache_key(text, language):
+    return (normalize_question(text), language, CHAT_MODEL)
+
+def chat_messages(text, language):
+    return [
+        {"role": "system", "content": f"You are a health bot. Provide short, clear answers in {language}."},
+        {"role": "user", "content": text}
+    ]
+
+def get_chat_response(text, language='en', client=None):
     # Check for health tips first
-    text_lower = text.lower()
-    for symptom, tip in health_tips.items():
-        if symptom in text_lower:
-            return tip
-    
+    tip = tip_matcher.match(text)
+    if tip is not None:
+        return tip
+
+    key = response_cache_key(text, language)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+
     # Fallback to Groq
-    response = groq_client.chat.completions.create(
-        model="llama3-8b-8192",
-        messages=[
-            {"role": "system", "content": f"You are a health bot. Provide short, clear answers in {language}."},
-            {"role": "user", "content": text}
-        ],
+    response = (client or groq_client).chat.completions.create(
+        model=CHAT_MODEL,
+        messages=chat_messages(text, language),
         temperature=0.7,
         max_tokens=200
     )
-    return response.choices[0].message.content
+    response_text = response.choices[0].message.content
+    response_cache.set(key, response_text)
+    return response_text
+
+def stream_chat_response(text, language='en', client=None):
+    """Yield the response in pieces as the model generates them."""
+    tip = tip_matcher.match(text)
+    if tip is not None:
+        yield tip
+        return
+
+    key = response_cache_key(text, language)
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = (client or groq_client).chat.completions.create(
+        model=CHAT_MODEL,
+        messages=chat_messages(text, language),
+        temperature=0.7,
+        max_tokens=200,
+        stream=True
+    )
+    pieces = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            pieces.append(delta)
+            yield delta
+    # Only a completed stream is cached; an abandoned one never reaches here
+    response_cache.set(key, ''.join(pieces))
+
+def take_sentences(buffer):
+    """Split complete sentences off the front of streamed text; returns (sentences, remainder)."""
+    parts = SENTENCE_END.split(buffer)
+    return [part.strip() for part in parts[:-1] if part.strip()], parts[-1]
+
+def synthesize_audio(text, language='en'):
+    key = hashlib.sha256(f"{language}\0{text}".encode('utf-8')).hexdigest()
+    audio = tts_cache.get(key)
+    if audio is None:
+        buffer = BytesIO()
+        gTTS(text=text, lang=language).write_to_fp(buffer)
+        audio = buffer.getvalue()
+        tts_cache.set(key, audio)
+    return audio
+
+def synthesize_speech(text, language='en'):
+    return base64.b64encode(synthesize_audio(text, language)).decode('utf-8')
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def chat_events(user_input, input_type, language, client=None, synthesize=synthesize_speech):
+    """Server-Sent Events for one chat turn.
+
+    Events: ``transcript`` (voice only), ``token`` for each generated piece, ``audio`` for each
+    synthesized sentence (voice only, in order), then ``done`` with the full text, or ``error``.
+    """
+    speak = input_type == 'voice'
+    pending = []
+
+    def speak_sentences(sentences):
+        for sentence in sentences:
+            pending.append((len(pending), sentence, tts_executor.submit(synthesize, sentence, language)))
+
+    def ready_audio(wait=False):
+        # Send finished sentences in order without holding up the token stream
+        while pending and (wait or pending[0][2].done()):
+            index, sentence, future = pending.pop(0)
+            yield sse_event('audio', {'index': index, 'text': sentence, 'audio': future.result()})
+
+    try:
+        text = user_input
+        if speak:
+            text = analyze_voice(base64.b64decode(user_input))
+            yield sse_event('transcript', {'text': text})
+
+        pieces = []
+        buffer = ''
+        for piece in stream_chat_response(text, language, client):
+            pieces.append(piece)
+            yield sse_event('token', {'text': piece})
+            if speak:
+                sentences, buffer = take_sentences(buffer + piece)
+                speak_sentences(sentences)
+                yield from ready_audio()
+        if speak:
+            speak_sentences([buffer.strip()] if buffer.strip() else [])
+            yield from ready_audio(wait=True)
+
+        yield sse_event('done', {'response_text': ''.join(pieces)})
+    except Exception as e:
+        for _, _, future in pending:
+            future.cancel()
+        yield sse_event('error', {'error': str(e)})
+
+def wants_binary_audio(data):
+    return data.get('audio_format') == 'binary' or 'audio/mpeg' in request.headers.get('Accept', '')
+
+def wants_stream(data):
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -66,35 +206,44 @@ def chat():
     if not user_input:
         return jsonify({'error': 'No input provided'}), 400
 
+    if wants_stream(data):
+        return Response(
+            stream_with_context(chat_events(user_input, input_type, language)),
+            mimetype='text/event-stream',
+            # Stop proxies from buffering the stream
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
     if input_type == 'voice':
         audio_data = base64.b64decode(user_input)
         transcribed_text = analyze_voice(audio_data)
         response_text = get_chat_response(transcribed_text)
 
         # Generate audio response
-        tts = gTTS(text=response_text, lang=language)
-        temp_audio = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-        try:
-            tts.save(temp_audio.name)
-            temp_audio.close()  # Explicitly close the file
-            with open(temp_audio.name, "rb") as audio_file:
-                audio_base64 = base64.b64encode(audio_file.read()).decode('utf-8')
-        finally:
-            # Add slight delay and retry if needed to avoid PermissionError
-            time.sleep(0.1)  # Small delay to release file lock
-            try:
-                os.unlink(temp_audio.name)
-            except PermissionError:
-                print(f"Warning: Could not delete {temp_audio.name} immediately.")
+        if wants_binary_audio(data):
+            # Raw MP3 body, a third smaller than base64; the texts travel URL-encoded in headers
+            return Response(synthesize_audio(response_text, language), mimetype='audio/mpeg', headers={
+                'X-Transcribed-Text': quote(transcribed_text),
+                'X-Response-Text': quote(response_text),
+                'Access-Control-Expose-Headers': 'X-Transcribed-Text, X-Response-Text'
+            })
 
         return jsonify({
             'transcribed_text': transcribed_text,
             'response_text': response_text,
-            'response_audio': audio_base64
+            'response_audio': synthesize_speech(response_text, language)
         })
     else:
         response_text = get_chat_response(user_input)
         return jsonify({'response_text': response_text})
 
+@app.route('/api/chat/stats', methods=['GET'])
+def chat_stats():
+    return jsonify({
+        'health_tips': tip_matcher.stats(),
+        'response_cache': response_cache.stats(),
+        'tts_cache': tts_cache.stats()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
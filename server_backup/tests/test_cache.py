@@ -0,0 +1,40 @@
+import time
+
+from cache import TTLCache
+
+
+def test_entries_expire_after_their_ttl():
+    cache = TTLCache(max_entries=8, ttl=0.05)
+    cache.set('answer', 'cached')
+    cache.set('tip', 'kept', ttl=60)
+    assert cache.get('answer') == 'cached'
+
+    time.sleep(0.06)
+    assert cache.get('answer') is None
+    assert cache.get('tip') == 'kept'
+    assert len(cache) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations']) == (2, 1, 1)
+
+
+def test_least_recently_used_entry_is_evicted_at_the_size_bound():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert len(cache) == 2 and cache.stats()['evictions'] == 1
+
+
+def test_setting_an_existing_key_refreshes_it_without_evicting():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 10)
+    cache.set('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (10, None, 3)
+    assert cache.stats()['evictions'] == 1
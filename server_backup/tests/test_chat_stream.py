@@ -0,0 +1,110 @@
+import importlib
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('groq')
+pytest.importorskip('gtts')
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    # app.py reads health_tips.json from the working directory at import
+    directory = tmp_path_factory.mktemp('tips')
+    (directory / 'health_tips.json').write_text(json.dumps({'headache': 'Drink water and rest.'}))
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(directory)
+        patch.setenv('GROQ_API_KEY', 'test')
+        yield importlib.import_module('app')
+
+
+class FakeGroq:
+    """Streams ``pieces`` the way the Groq SDK does with stream=True."""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        assert kwargs['stream'] is True
+        for piece in self.pieces:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+        yield SimpleNamespace(choices=[])
+
+
+def parse_events(stream):
+    events = []
+    for block in ''.join(stream).split('\n\n'):
+        if block:
+            event, data = block.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def test_take_sentences_keeps_the_unfinished_tail(app_module):
+    assert app_module.take_sentences('One. Two! Three? Fo') == (['One.', 'Two!', 'Three?'], 'Fo')
+    assert app_module.take_sentences('No end yet') == ([], 'No end yet')
+    assert app_module.take_sentences('Dr.Smith said 3.5 mg. ') == (['Dr.Smith said 3.5 mg.'], '')
+
+
+def test_text_stream_sends_tokens_in_order(app_module):
+    app_module.response_cache.clear()
+    pieces = ['Stay', ' hydrated', '. Sleep', ' well.']
+    events = parse_events(app_module.chat_events('how do I stay healthy', 'text', 'en', FakeGroq(pieces)))
+
+    assert [data['text'] for event, data in events if event == 'token'] == pieces
+    assert events[-1] == ('done', {'response_text': 'Stay hydrated. Sleep well.'})
+    assert not [event for event, _ in events if event == 'audio']
+
+
+def test_voice_stream_sends_audio_in_sentence_order(app_module, monkeypatch):
+    app_module.response_cache.clear()
+    monkeypatch.setattr(app_module, 'analyze_voice', lambda audio: 'what should I eat')
+    pieces = ['Eat greens. ', 'Drink', ' water! Walk', ' daily? Sleep', ' early']
+    started = []
+
+    def synthesize(sentence, language):
+        started.append(threading.current_thread().name)
+        # Earlier sentences finish last, so parallel workers complete them out of order
+        time.sleep(0.05 * (4 - len(started)) if len(started) < 4 else 0)
+        return f'{language}:{sentence}'
+
+    events = parse_events(app_module.chat_events('AAAA', 'voice', 'en', FakeGroq(pieces), synthesize))
+
+    assert events[0] == ('transcript', {'text': 'what should I eat'})
+    assert [data['text'] for event, data in events if event == 'token'] == pieces
+    audio = [data for event, data in events if event == 'audio']
+    sentences = ['Eat greens.', 'Drink water!', 'Walk daily?', 'Sleep early']
+    assert [data['index'] for data in audio] == [0, 1, 2, 3]
+    assert [data['text'] for data in audio] == sentences
+    assert [data['audio'] for data in audio] == [f'en:{sentence}' for sentence in sentences]
+    assert events[-1] == ('done', {'response_text': ''.join(pieces)})
+    assert all(name.startswith('tts') for name in started)
+
+
+def test_stream_failure_ends_with_an_error_event(app_module):
+    app_module.response_cache.clear()
+
+    class FailingGroq(FakeGroq):
+        def create(self, **kwargs):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='Partial'))])
+            raise RuntimeError('upstream closed')
+
+    events = parse_events(app_module.chat_events('tell me more', 'text', 'en', FailingGroq([])))
+    assert events == [('token', {'text': 'Partial'}), ('error', {'error': 'upstream closed'})]
+
+
+def test_chat_route_streams_server_sent_events(app_module, monkeypatch):
+    app_module.response_cache.clear()
+    monkeypatch.setattr(app_module, 'groq_client', FakeGroq(['Rest', ' up.']))
+    response = app_module.app.test_client().post('/api/chat', json={'input': 'I feel tired', 'stream': True})
+
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events([response.get_data(as_text=True)])
+    assert [event for event, _ in events] == ['token', 'token', 'done']
+    assert events[-1][1] == {'response_text': 'Rest up.'}
@@ -0,0 +1,109 @@
+import random
+import re
+
+import pytest
+
+from tips import TipMatcher
+
+TIPS = {
+    'pain': 'pain tip',
+    'chest pain': 'chest pain tip',
+    'back pain': 'back pain tip',
+    'head': 'head tip',
+    'headache': 'headache tip',
+    'ache': 'ache tip',
+    'cold': 'cold tip',
+    'cold sweat': 'cold sweat tip',
+    'Sore Throat': 'sore throat tip',
+    'throat': 'throat tip',
+    'fever': 'fever tip',
+    'flu': 'flu tip',
+}
+
+
+def is_boundary(text, index):
+    return index < 0 or index >= len(text) or not re.match(r'\w', text[index])
+
+
+def linear_scan(tips, text):
+    """The old scan over every symptom in turn, held to the matcher's rules.
+
+    A symptom counts only as a whole word, optionally followed by "s"/"es". Of the symptoms
+    found, the one starting earliest wins, then the longest.
+    """
+    text_lower = text.lower()
+    best = None
+    for symptom, tip in tips.items():
+        symptom = symptom.lower()
+        start = text_lower.find(symptom)
+        while start != -1:
+            end = start + len(symptom)
+            whole_word = is_boundary(text_lower, start - 1) and any(
+                text_lower.startswith(suffix, end) and is_boundary(text_lower, end + len(suffix))
+                for suffix in ('', 's', 'es')
+            )
+            if whole_word:
+                if best is None or (start, -len(symptom)) < best[:2]:
+                    best = (start, -len(symptom), tip)
+                break
+            start = text_lower.find(symptom, start + 1)
+    return best[2] if best else None
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('I have a headache', 'headache tip'),
+    ('HEADACHES all week', 'headache tip'),
+    ('My head hurts', 'head tip'),
+    ('my head aches', 'head tip'),
+    ('it aches', 'ache tip'),
+    ('Chest pain and a fever', 'chest pain tip'),
+    ('pain in my chest', 'pain tip'),
+    ('fever, then back pain', 'fever tip'),
+    ('Back Pain since monday', 'back pain tip'),
+    ('woke up in a cold sweat', 'cold sweat tip'),
+    ('a cold, sweaty night', 'cold tip'),
+    ('sore-throat and flu', 'throat tip'),
+    ('SORE THROAT', 'sore throat tip'),
+    ('fevers at night', 'fever tip'),
+    ('feeling feverish', None),
+    ('it is colder today', None),
+    ('influenza season', None),
+    ('painkillers', None),
+    ('', None),
+])
+def test_matches_the_linear_scan(text, expected):
+    assert linear_scan(TIPS, text) == expected
+    assert TipMatcher(TIPS).match(text) == expected
+
+
+def test_matches_the_linear_scan_on_generated_messages():
+    words = [symptom for symptom in TIPS] + [
+        'feverish', 'colder', 'heads', 'headaches', 'painful', 'throats', 'flus', 'sweat', 'chest',
+        'back', 'I', 'have', 'a', 'bad', 'since', 'yesterday', 'my', 'and', 'the',
+    ]
+    separators = [' ', ', ', '. ', '-', '!', ' (', ') ', '_', "'"]
+    rng = random.Random(0)
+    matcher = TipMatcher(TIPS)
+    for _ in range(2000):
+        parts = []
+        for _ in range(rng.randint(0, 8)):
+            word = rng.choice(words)
+            word = rng.choice([word, word.upper(), word.title(), word.lower()])
+            parts.append(word + rng.choice(separators))
+        text = ''.join(parts)
+        assert matcher.match(text) == linear_scan(TIPS, text), text
+
+
+def test_single_whole_word_symptom_agrees_with_the_substring_scan():
+    # Where the old ``symptom in text`` loop was unambiguous, the answer is unchanged
+    tips = {'fever': 'fever tip', 'cough': 'cough tip', 'rash': 'rash tip'}
+    for text in ['I have a Fever', 'bad COUGH today', 'a rash on my arm', 'nothing wrong']:
+        old = next((tip for symptom, tip in tips.items() if symptom in text.lower()), None)
+        assert TipMatcher(tips).match(text) == old
+
+
+def test_counts_matches_and_misses():
+    matcher = TipMatcher(TIPS)
+    matcher.match('a fever')
+    matcher.match('all good')
+    assert matcher.stats() == {'symptoms': len(TIPS), 'matches': 1, 'misses': 1}
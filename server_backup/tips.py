@@ -0,0 +1,58 @@
+import re
+import threading
+
+
+def trie_pattern(words):
+    """Regex alternation for ``words`` factored into a prefix trie.
+
+    A flat ``a|b|c`` alternation retries every word at every position; the trie form shares
+    prefixes, so each position costs roughly one walk down the trie however many words there are.
+    Longer continuations are tried before a word ends, so the longest word wins at a position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        optional = '' in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if optional else '')
+
+    return build(trie)
+
+
+class TipMatcher:
+    """Finds the health tip for a message with one compiled regex over every symptom.
+
+    Symptoms match whole words (plus a plural "s"/"es"), case-insensitively; when several
+    appear, the one earliest in the message wins, and the longest symptom wins at the same
+    position.
+    """
+
+    def __init__(self, tips):
+        self.tips = {symptom.lower(): tip for symptom, tip in tips.items()}
+        self.pattern = re.compile(
+            r'(?<!\w)(' + trie_pattern(self.tips) + r')(?:e?s)?(?!\w)', re.IGNORECASE
+        ) if self.tips else None
+        self._lock = threading.Lock()
+        self.matches = 0
+        self.misses = 0
+
+    def match(self, text):
+        found = self.pattern.search(text) if self.pattern else None
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return None
+            self.matches += 1
+        return self.tips[found.group(1).lower()]
+
+    def stats(self):
+        return {'symptoms': len(self.tips), 'matches': self.matches, 'misses': self.misses}